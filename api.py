@@ -0,0 +1,167 @@
+"""
+Headless RAG service: REST API plus a batch mode for question files.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+    python api.py batch questions.txt --concurrency 8 --output answers.jsonl
+
+Each worker process serves queries from the shared on-disk index, so query
+capacity scales horizontally behind a load balancer.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from dotenv import load_dotenv
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from src.ingest_jobs import IngestJobs
+from src.rag_service import RAGService
+from src.vector_db import VectorDB
+from src.tracing import TraceMetrics
+from src.warmup import Warmup
+
+load_dotenv()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # WARMUP_ON_START=1: each worker preloads the model and index while it starts accepting requests
+    Warmup.start()
+    # Ingestion jobs a restart interrupted resume now, not on the first jobs request
+    IngestJobs.shared()
+    yield
+
+app = FastAPI(title="RAG Document Assistant API", lifespan=lifespan)
+service = RAGService()
+
+class QueryRequest(BaseModel):
+    query: str
+    # Collections to search (merged top-k); default collection when omitted
+    collections: Optional[List[str]] = None
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "documents": len(service.list_documents())}
+
+@app.get("/metrics")
+def metrics():
+    """Per-stage latency aggregates (count / total / max / mean) for ingestion and queries."""
+    return TraceMetrics.snapshot()
+
+@app.get("/collections")
+def list_collections():
+    return {"collections": RAGService.list_collections()}
+
+@app.get("/documents")
+def list_documents(collection: str = None):
+    try:
+        return {"documents": service.list_documents(collection)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/documents/{source}")
+def delete_document(source: str, collection: str = None):
+    try:
+        return {"source": source, "deleted_chunks": service.delete_document(source, collection)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/ingest")
+def ingest(files: List[UploadFile] = File(...), mode: str = "append", collection: str = None):
+    # Sync endpoint: FastAPI runs it in its threadpool, so queries keep flowing during ingestion
+    uploads = [RAGService.as_upload(f.filename, f.file.read()) for f in files]
+    try:
+        return service.ingest(uploads, mode=mode, collection=collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/jobs", status_code=202)
+def submit_job(files: List[UploadFile] = File(...), mode: str = "append", collection: str = None):
+    """Queues a background ingestion job; poll GET /jobs/{id} for progress."""
+    uploads = [RAGService.as_upload(f.filename, f.file.read()) for f in files]
+    try:
+        return {"id": IngestJobs.shared().submit(uploads, mode=mode, collection=collection)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/jobs")
+def list_jobs():
+    return {"jobs": IngestJobs.shared().list_jobs()}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = IngestJobs.shared().status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return job
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    if not IngestJobs.shared().cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job '{job_id}' is not queued or running")
+    return {"id": job_id, "cancelling": True}
+
+@app.post("/query")
+async def query(request: QueryRequest):
+    try:
+        return RAGService.serialize(await service.aquery(request.query, collections=request.collections))
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest):
+    try:
+        if not VectorDB.load_collections(request.collections or [VectorDB.DEFAULT_COLLECTION]):
+            raise HTTPException(status_code=409, detail="Knowledge base is empty; ingest documents first")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(service.astream(request.query, collections=request.collections), media_type="text/plain")
+
+def run_batch(path: str, output: str = None, concurrency: int = None, collections: List[str] = None) -> int:
+    """Answers every non-empty line of `path`; writes one JSON result per line."""
+    with open(path, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+
+    results = asyncio.run(service.abatch(questions, concurrency=concurrency, collections=collections))
+
+    out = open(output, "w", encoding="utf-8") if output else sys.stdout
+    try:
+        for response in results:
+            out.write(json.dumps(RAGService.serialize(response)) + "\n")
+    finally:
+        if output:
+            out.close()
+
+    failed = sum(1 for r in results if "error" in r)
+    logging.info(f"Batch finished: {len(results) - failed} answered, {failed} failed")
+    return 1 if failed else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Run the REST API")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8000")))
+
+    batch = commands.add_parser("batch", help="Answer a file of questions (one per line)")
+    batch.add_argument("questions")
+    batch.add_argument("--output", help="JSONL output file (default: stdout)")
+    batch.add_argument("--concurrency", type=int, default=RAGService.BATCH_CONCURRENCY)
+    batch.add_argument("--collections", nargs="+", help="collections to search (default: the default collection)")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        import uvicorn
+        uvicorn.run(app, host=args.host, port=args.port)
+    else:
+        sys.exit(run_batch(args.questions, args.output, args.concurrency, args.collections))
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,14 @@
 import streamlit as st
-import gc
 from streamlit_option_menu import option_menu
-from langchain.chains import RetrievalQA
-from langchain_core.callbacks.base import BaseCallbackHandler
-from src.pdf_handler import PDFHandler
-from src.vector_db import VectorDB
-from src.rag_chain import RAGChain
 from src.ui_utils import UIUtils
+from src.conversation_store import ConversationStore
+from src.warmup import Warmup
 from dotenv import load_dotenv
+import asyncio
 import os
-
-# --- STREAMING HANDLER ---
-class StreamHandler(BaseCallbackHandler):
-    def __init__(self, container, initial_text=""):
-        self.container = container
-        self.text = initial_text
-
-    def on_llm_new_token(self, token: str, **kwargs) -> None:
-        self.text += token
-        self.container.markdown(self.text + "▌")
+import threading
+import time
+import uuid
 
 # --- CONFIG ---
 st.set_page_config(page_title="RAG Document Assistant", page_icon="🤖", layout="wide")
@@ -31,19 +21,75 @@ load_dotenv()
 if "GOOGLE_API_KEY" in st.secrets:
     os.environ["GOOGLE_API_KEY"] = st.secrets["GOOGLE_API_KEY"]
 
-# --- VALIDATION ---
-if not os.getenv("GOOGLE_API_KEY"):
-    st.error("🚨 Critical Error: GOOGLE_API_KEY not found. Please configure .env or Streamlit Secrets.")
-    st.stop()
+# --- WARM START ---
+# Once per process, in the background: the Home page renders while the model and index load
+Warmup.start()
+
+# Ingestion jobs a restart interrupted resume with the process, not on the first Workspace visit
+@st.cache_resource(show_spinner=False)
+def resume_ingest_jobs():
+    def run():
+        # Imported off the page thread, so Home does not wait for LangChain and FAISS
+        from src.ingest_jobs import IngestJobs
+        IngestJobs.shared()
+    thread = threading.Thread(target=run, name="rag-resume-jobs", daemon=True)
+    thread.start()
+    return thread
+
+resume_ingest_jobs()
 
 # --- STATE ---
-if "messages" not in st.session_state: st.session_state.messages = []
-if "model" not in st.session_state:
-    st.session_state.model, st.session_state.prompt_template = RAGChain.get_conversational_chain()
+# Chat history lives on disk; the conversation id rides in the URL so a reload resumes it
+if "conversation" not in st.session_state:
+    st.session_state.conversation = st.query_params.get("conversation") or uuid.uuid4().hex
+    st.query_params["conversation"] = st.session_state.conversation
+
+# Messages rendered per rerun; older ones are only loaded on demand
+if "history_window" not in st.session_state: st.session_state.history_window = ConversationStore.WINDOW_TURNS * 2
 
-if "vector_store" not in st.session_state: 
-    # Try to load from disk first
-    st.session_state.vector_store = VectorDB.load_vector_store()
+conversations = ConversationStore.shared()
+
+# Resolved on every run from the process-wide index registry (cheap when resident),
+# so idle sessions never pin an index in memory
+vector_store = None
+query_stores = []
+
+# --- INGESTION JOBS ---
+@st.fragment(run_every=1)
+def render_ingest_job(job_id: str):
+    """Polls the background job; only this panel reruns while it is active."""
+    job = IngestJobs.shared().status(job_id)
+    if job is None:
+        st.session_state.ingest_job = None
+        return
+
+    progress = job["progress"]
+    if job["status"] in IngestJobs.ACTIVE:
+        done, total = progress["files_done"], progress["files_total"]
+        label = f"📂 {progress['current_file']}" if progress["current_file"] else "⏳ Queued..."
+        st.progress(done / total if total else 0.0, text=f"{label} · {done}/{total} files · {progress['chunks']} chunks")
+        if st.button("Cancel Ingestion", use_container_width=True):
+            IngestJobs.shared().cancel(job_id)
+        return
+
+    if job["status"] == "completed":
+        message = f"Knowledge Base Updated! {progress['chunks']} chunks from {progress['files_done']} files."
+        if progress["skipped_files"] or progress["skipped_pages"]:
+            message += f" Skipped {progress['skipped_files']} unchanged files and {progress['skipped_pages']} unchanged pages."
+        st.session_state.ingest_result = ("success", message)
+    elif job["status"] == "cancelled":
+        if job["mode"] == "rebuild" or not progress["files_done"]:
+            message = "Ingestion cancelled; the knowledge base is unchanged."
+        else:
+            message = (f"Ingestion cancelled after {progress['files_done']} of {progress['files_total']} files; "
+                       f"those {progress['files_done']} files were added, the rest were not.")
+        st.session_state.ingest_result = ("warning", message)
+    else:
+        st.session_state.ingest_result = ("error", f"Processing Error: {job['error']}")
+
+    st.session_state.ingest_job = None
+    # Full rerun so the sidebar and chat pick up the new index version
+    st.rerun()
 
 # --- SIDEBAR ---
 with st.sidebar:
@@ -75,6 +121,49 @@ with st.sidebar:
     st.markdown("---")
 
     if selected == "Workspace":
+        # Optimization: LangChain, FAISS and the LLM client load on the first Workspace visit, not for Home
+        from src.vector_db import VectorDB
+        from src.rag_chain import RAGChain
+        from src.stream_handler import StreamHandler
+        from src.answer_cache import SemanticAnswerCache
+        from src.llm_backend import LLMBackends
+        from src.tracing import Trace, Tracer
+        from src.ingest_jobs import IngestJobs
+
+        # --- VALIDATION ---
+        if LLMBackends.get().requires_api_key and not os.getenv("GOOGLE_API_KEY"):
+            st.error("🚨 Critical Error: GOOGLE_API_KEY not found. Please configure .env or Streamlit Secrets.")
+            st.stop()
+
+        if "collection" not in st.session_state: st.session_state.collection = VectorDB.DEFAULT_COLLECTION
+
+        st.markdown("### 🗄️ Collection")
+        collections = VectorDB.list_collections()
+        if st.session_state.collection not in collections:
+            collections.append(st.session_state.collection)
+        active_collection = st.selectbox("Collection", collections, key="collection", label_visibility="collapsed")
+
+        new_collection = st.text_input("New collection", placeholder="New collection name (e.g. legal-team)")
+        if new_collection.strip():
+            try:
+                VectorDB.collection_path(new_collection.strip())
+                active_collection = new_collection.strip()
+            except ValueError as e:
+                st.error(str(e))
+
+        index_path = VectorDB.collection_path(active_collection)
+        search_in = st.multiselect(
+            "Search in",
+            [name for name in collections if name != active_collection],
+            help="Also answer from these collections (results are merged)."
+        )
+        try:
+            vector_store = VectorDB.load_vector_store(index_path)
+            query_stores = ([vector_store] if vector_store else []) + VectorDB.load_collections(search_in)
+        except ValueError as e:
+            # e.g. built with another embedding backend: a Rebuild re-embeds it with the active one
+            st.error(str(e))
+
         st.markdown("### 📂 Upload Document")
         
         pdf_docs = st.file_uploader(
@@ -83,42 +172,54 @@ with st.sidebar:
             type=['pdf'], 
             label_visibility="collapsed"
         )
+
+        ingest_mode = st.radio(
+            "Ingestion Mode",
+            ["Append", "Rebuild"],
+            horizontal=True,
+            help="Append embeds only the new files into the existing knowledge base. Rebuild starts from scratch."
+        )
         
         if st.button("Process Document", use_container_width=True):
             if not pdf_docs:
                 st.toast("⚠️ No file selected. Please upload a PDF.")
             else:
                 try:
-                    with st.status("🚀 Initializing Engine...", expanded=True) as status:
-                        
-                        status.write("📂 Extracting Text & Metadata...")
-                        chunked_documents = PDFHandler.get_chunked_documents(pdf_docs)
-                        
-                        if not chunked_documents:
-                            status.update(label="Error: No text found in PDF.", state="error")
-                            st.stop()
-
-                        status.write(f"✂️ Optimized {len(chunked_documents)} chunks...")
-                        
-                        status.write("🧠 Hydrating Vector Database...")
-                        st.session_state.vector_store = VectorDB.create_vector_store(chunked_documents)
-                        
-                        status.write("💾 Persisting Knowledge Base...")
-                        VectorDB.save_vector_store(st.session_state.vector_store)
-                        
-                        # Memory Optimization
-                        del chunked_documents
-                        gc.collect()
-                        
-                        status.update(label="System Ready!", state="complete", expanded=False)
-                        
-                    st.toast("Knowledge Base Updated!", icon="✅")
-                    
+                    # Indexed in a worker process: the workspace stays queryable meanwhile
+                    st.session_state.ingest_job = IngestJobs.shared().submit(
+                        pdf_docs, mode=ingest_mode.lower(), collection=active_collection
+                    )
+                    st.toast("Ingestion job queued", icon="🚀")
                 except Exception as e:
                     st.error(f"Processing Error: {str(e)}")
 
+        if st.session_state.get("ingest_job"):
+            render_ingest_job(st.session_state.ingest_job)
+        if st.session_state.get("ingest_result"):
+            level, message = st.session_state.pop("ingest_result")
+            getattr(st, level)(message)
+
+        # Document management: deletions drop chunks from the chunk store, no re-index
+        indexed_docs = VectorDB.list_documents(vector_store) if vector_store else []
+        if indexed_docs:
+            with st.expander("🗂️ Manage Documents"):
+                to_remove = st.multiselect("Indexed documents", indexed_docs, label_visibility="collapsed")
+                if st.button("Remove Selected", use_container_width=True, disabled=not to_remove):
+                    for source in to_remove:
+                        VectorDB.delete_documents(vector_store, source)
+                    st.toast(f"Removed {len(to_remove)} document(s).", icon="🗑️")
+                    st.rerun()
+
+        answer_cache = SemanticAnswerCache.shared()
+        if answer_cache.hits + answer_cache.misses:
+            st.caption(
+                f"⚡ Answer cache: {answer_cache.hit_rate:.0%} hit rate · "
+                f"{answer_cache.saved_seconds:.1f}s of LLM time saved"
+            )
+
         if st.button("Clear Session", use_container_width=True):
-            st.session_state.messages = []
+            conversations.clear(st.session_state.conversation)
+            st.session_state.history_window = ConversationStore.WINDOW_TURNS * 2
             st.rerun()
 
     # FOOTER
@@ -152,9 +253,15 @@ elif selected == "Workspace":
     """, unsafe_allow_html=True)
 
     # 1. Render History
+    # Optimization: only the newest window is read and rendered, so reruns stay flat as the chat grows
+    history, has_older = conversations.recent(st.session_state.conversation, st.session_state.history_window)
     chat_container = st.container()
     with chat_container:
-        for message in st.session_state.messages:
+        if has_older and st.button("⬆️ Show earlier messages"):
+            st.session_state.history_window += ConversationStore.WINDOW_TURNS * 2
+            st.rerun()
+
+        for message in history:
             # We don't stream history, just render it instantly
             st.markdown(UIUtils.render_message(message["role"], message["content"]), unsafe_allow_html=True)
             
@@ -163,59 +270,86 @@ elif selected == "Workspace":
                     for source in message["sources"]:
                         st.markdown(UIUtils.render_source(source['page'], source['text']), unsafe_allow_html=True)
 
+            if "trace" in message:
+                with st.expander("⏱️ Timing Breakdown"):
+                    st.markdown(UIUtils.render_timings(message["trace"]))
+
     # 2. Handle Input
     if prompt := st.chat_input("Query the knowledge base..."):
         # Add User Message to State
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        conversations.append(st.session_state.conversation, {"role": "user", "content": prompt})
         # Render User Message Immediately
         st.markdown(UIUtils.render_message("user", prompt), unsafe_allow_html=True)
 
-        if not st.session_state.vector_store:
+        if not query_stores:
             st.warning("⚠️ Knowledge Base Empty. Please upload and process a document first.")
         else:
             # Interactive "Thinking" Spinner
             with st.spinner("🧠 Analyzing context vectors..."):
                 try:
-                    qa_chain = RetrievalQA.from_chain_type(
-                        llm=st.session_state.model,
-                        chain_type="stuff",
-                        retriever=st.session_state.vector_store.as_retriever(search_kwargs={"k": 3}),
-                        return_source_documents=True,
-                        chain_type_kwargs={"prompt": st.session_state.prompt_template}
-                    )
-                    
-                    # Execute with streaming
-                    with st.chat_message("assistant", avatar="🤖"):
-                        stream_placeholder = st.empty()
-                        stream_handler = StreamHandler(stream_placeholder)
-                        response = qa_chain.invoke({"query": prompt}, config={"callbacks": [stream_handler]})
-                        
-                        answer = response["result"]
-                        source_docs = response["source_documents"]
-                        
-                        # Remove cursor at the end
-                        stream_placeholder.markdown(answer)
-                    
+                    with Trace("query") as trace:
+                        # Semantic answer cache: near-identical questions against the same index skip the LLM
+                        answer_cache = SemanticAnswerCache.shared()
+                        # One collection is queried directly; several are searched as one and fused
+                        search_target = query_stores[0] if len(query_stores) == 1 else query_stores
+                        index_version = VectorDB.get_index_version(search_target)
+                        with Tracer.stage("answer_cache_lookup"):
+                            query_vector = VectorDB.get_embedding_model().embed_query(prompt)
+                            cached = answer_cache.lookup(prompt, query_vector, index_version)
+
+                        if cached:
+                            answer = cached.answer
+                            source_docs = cached.source_documents
+                            with st.chat_message("assistant", avatar="🤖"):
+                                st.markdown(answer)
+                                st.caption(f"⚡ Served from answer cache (saved ~{cached.latency:.1f}s)")
+                        else:
+                            # Reused across queries and sessions; rebuilt only when the index version changes
+                            query_engine = RAGChain.get_query_engine(search_target, index_version, k=3)
+
+                            # Execute with streaming
+                            started = time.perf_counter()
+                            with st.chat_message("assistant", avatar="🤖"):
+                                stream_handler = StreamHandler(st.container())
+                                # Retrieval and generation run off the script thread; tokens stream back here
+                                response = asyncio.run(query_engine.aquery(prompt, callbacks=[stream_handler]))
+
+                                answer = response["result"]
+                                source_docs = response["source_documents"]
+
+                                # Flush the last frame and remove the cursor
+                                stream_handler.finish()
+
+                            answer_cache.store(prompt, query_vector, index_version, answer, source_docs, time.perf_counter() - started)
+
                     # Formatter
                     formatted_sources = []
                     for doc in source_docs:
                         page = doc.metadata.get("page", "Unknown")
+                        if "page_end" in doc.metadata:
+                            # Chunk continues onto the following page(s)
+                            page = f"{page}-{doc.metadata['page_end']}"
                         source_file = doc.metadata.get("source", "Doc")
                         text = doc.page_content[:150].replace("\n", " ") + "..."
                         formatted_sources.append({"page": f"{page} ({source_file})", "text": text})
                     
                     # --- INTERACTIVE RESPONSE ---
                     # 1. Save to history FIRST
-                    st.session_state.messages.append({
-                        "role": "assistant", 
+                    conversations.append(st.session_state.conversation, {
+                        "role": "assistant",
                         "content": answer,
-                        "sources": formatted_sources
+                        "sources": formatted_sources,
+                        "trace": trace.to_dict()
                     })
                     
                     # 2. Show Citations AFTER streaming finishes
                     with st.expander("🔍 View Verified Citations", expanded=True):
                         for src in formatted_sources:
                             st.markdown(UIUtils.render_source(src['page'], src['text']), unsafe_allow_html=True)
+
+                    # 3. Where the time went: cache lookup, retrieval stages, prompt, first token, streaming
+                    with st.expander("⏱️ Timing Breakdown"):
+                        st.markdown(UIUtils.render_timings(trace.to_dict()))
                             
                 except Exception as e:
                     st.error("Analysis Failed.")
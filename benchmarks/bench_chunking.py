@@ -0,0 +1,143 @@
+"""
+Chunk size / overlap sweep: chunks, index size on disk, ingest time, query latency and
+retrieval hit rate (a retrieved chunk covers the labeled page) for each setting.
+
+The default labeled set is the synthetic corpus: one question per part number, whose
+answer is the page carrying it. Your own set is a JSONL file of
+{"question": ..., "source": "<file name>", "page": <1-based page>} next to --pdfs.
+
+    python -m benchmarks.bench_chunking --sizes 128 192 254 --overlaps 0 24 48 --across-pages both
+    python -m benchmarks.bench_chunking --unit chars --sizes 500 1000 --overlaps 100 200 --fake-embeddings
+    python -m benchmarks.bench_chunking --pdfs docs/*.pdf --questions labeled.jsonl --vector-only
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import numpy as np
+from benchmarks.offline import use_embedding_model
+from benchmarks.synthetic_pdf import make_uploads
+from src.pdf_handler import PDFHandler
+from src.vector_db import VectorDB
+
+def synthetic_set(files: int, pages: int, queries: int, seed: int = 0):
+    uploads = make_uploads(files, pages)
+    labels = [(f"What is the tolerance for part PN-{i:03d}-{p:05d}?", f"synthetic_{i:03d}.pdf", p)
+              for i in range(files) for p in range(1, pages + 1)]
+    return uploads, random.Random(seed).sample(labels, min(queries, len(labels)))
+
+def labeled_set(pdf_paths, questions_path: str):
+    uploads = []
+    for path in pdf_paths:
+        with open(path, "rb") as f:
+            buf = io.BytesIO(f.read())
+        buf.name = os.path.basename(path)  # chunk "source", as for an uploaded file
+        uploads.append(buf)
+    with open(questions_path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return uploads, [(row["question"], row["source"], int(row["page"])) for row in rows]
+
+def covers(doc, source: str, page: int) -> bool:
+    first = doc.metadata.get("page")
+    return doc.metadata.get("source") == source and first <= page <= doc.metadata.get("page_end", first)
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def run(uploads, labels, k: int, workdir: str):
+    """Ingests with the current PDFHandler settings; returns the metrics of one sweep point."""
+    index_path = tempfile.mkdtemp(dir=workdir)
+    for upload in uploads:
+        upload.seek(0)
+
+    # Warm-up: the splitter (and its tokenizer) is built once per process, not per ingest
+    PDFHandler.get_text_splitter().split_text("warm-up")
+    started = time.perf_counter()
+    store = VectorDB.rebuild_vector_store(PDFHandler.iter_chunked_documents(uploads), index_path=index_path)
+    ingest = time.perf_counter() - started
+
+    # Packing off: the hit rate is about the top-k chunks, not how many fit the prompt
+    retriever = VectorDB.get_retriever(store, k=k, rerank=False, packing=False)
+    retriever.invoke(labels[0][0])  # warm-up: first call pays lazy initialization
+    latencies, hits = [], 0
+    for question, source, page in labels:
+        started = time.perf_counter()
+        docs = retriever.invoke(question)[:k]
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += any(covers(doc, source, page) for doc in docs)
+
+    metrics = {
+        "chunks": store.index.ntotal,
+        "index_mb": dir_size(index_path) / 2**20,
+        "ingest_s": ingest,
+        "query_p50_ms": float(np.percentile(latencies, 50)),
+        "query_p95_ms": float(np.percentile(latencies, 95)),
+        "hit_rate": hits / len(labels),
+    }
+    shutil.rmtree(index_path, ignore_errors=True)
+    return metrics
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--unit", choices=["tokens", "chars"],
+                        help=f"default: {PDFHandler.CHUNK_UNIT} (chars with --fake-embeddings)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[128, 192, 254])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[0, 24, 48])
+    parser.add_argument("--across-pages", choices=["off", "on", "both"], default="off")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--files", type=int, default=8, help="synthetic PDFs (default labeled set)")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=100, help="questions sampled from the synthetic set")
+    parser.add_argument("--pdfs", nargs="+", help="your own PDFs (requires --questions)")
+    parser.add_argument("--questions", help="labeled JSONL for --pdfs")
+    parser.add_argument("--vector-only", action="store_true", help="disable BM25 so the hit rate reflects the embeddings")
+    parser.add_argument("--fake-embeddings", action="store_true", help="deterministic embeddings (smoke test; hit rate is lexical only)")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    if bool(args.pdfs) != bool(args.questions):
+        parser.error("--pdfs and --questions go together")
+    if args.fake_embeddings and args.unit == "tokens":
+        parser.error("--fake-embeddings has no tokenizer: chunks are sized in chars")
+    args.unit = args.unit or ("chars" if args.fake_embeddings else PDFHandler.CHUNK_UNIT)
+    if args.pdfs:
+        uploads, labels = labeled_set(args.pdfs, args.questions)
+    else:
+        uploads, labels = synthetic_set(args.files, args.pages, args.queries)
+    if args.vector_only:
+        VectorDB.HYBRID_SEARCH = False
+
+    workdir = tempfile.mkdtemp(prefix="bench_chunking_")
+    modes = {"off": [False], "on": [True], "both": [False, True]}[args.across_pages]
+    results = []
+    print(f"{args.unit:>6} {'overlap':>8} {'across':>7} {'chunks':>7} {'index MB':>9} {'ingest s':>9} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {f'hit@{args.k}':>7}")
+    for size in args.sizes:
+        for overlap in args.overlaps:
+            if overlap >= size:
+                continue
+            for across in modes:
+                # Fresh embedding cache: every setting pays for embedding its own chunks
+                use_embedding_model(fake=args.fake_embeddings)
+                PDFHandler.CHUNK_UNIT, PDFHandler.CHUNK_ACROSS_PAGES = args.unit, across
+                if args.unit == "chars":
+                    PDFHandler.CHUNK_CHARS, PDFHandler.CHUNK_OVERLAP_CHARS = size, overlap
+                else:
+                    PDFHandler.CHUNK_TOKENS, PDFHandler.CHUNK_OVERLAP_TOKENS = size, overlap
+                metrics = run(uploads, labels, args.k, workdir)
+                results.append({"unit": args.unit, "size": size, "overlap": overlap, "across_pages": across, **metrics})
+                print(f"{size:>6} {overlap:>8} {'yes' if across else 'no':>7} {metrics['chunks']:>7} "
+                      f"{metrics['index_mb']:>9.2f} {metrics['ingest_s']:>9.2f} {metrics['query_p50_ms']:>7.2f} "
+                      f"{metrics['query_p95_ms']:>7.2f} {metrics['hit_rate']:>7.0%}")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
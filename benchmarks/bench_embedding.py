@@ -0,0 +1,39 @@
+"""
+Embedding throughput (chunks/sec) on CPU for different batch sizes.
+
+    python -m benchmarks.bench_embedding --chunks 2000 --batch-sizes 8 16 32 64 128 --threads 4
+"""
+import argparse
+import time
+from benchmarks.synthetic_pdf import make_uploads
+from src.embedding_engine import EmbeddingEngine
+from src.pdf_handler import PDFHandler
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 16, 32, 64, 128, 256])
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = default)")
+    args = parser.parse_args()
+
+    texts = []
+    files = 1
+    while len(texts) < args.chunks:
+        texts = [c.page_content for c in PDFHandler.get_chunked_documents(make_uploads(files, 20), workers=1)]
+        files *= 2
+    texts = texts[:args.chunks]
+
+    engine = EmbeddingEngine(num_threads=args.threads)
+    engine.encode(texts[:32])  # warm-up: first call pays lazy model initialization
+
+    print(f"{'batch':>6} {'seconds':>9} {'chunks/s':>9}")
+    for batch_size in args.batch_sizes:
+        engine.batch_size = batch_size
+        start = time.perf_counter()
+        vectors = engine.encode(texts)
+        elapsed = time.perf_counter() - start
+        assert vectors.flags["C_CONTIGUOUS"] and vectors.dtype.name == "float32"
+        print(f"{batch_size:>6} {elapsed:>9.2f} {len(texts) / elapsed:>9.1f}")
+
+if __name__ == "__main__":
+    main()
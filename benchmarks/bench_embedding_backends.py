@@ -0,0 +1,119 @@
+"""
+Quality and throughput of ONNX / int8 embedding models against the torch reference:
+cosine agreement per chunk, top-k retrieval agreement on sample questions, and chunks/sec.
+Exits non-zero when a candidate's mean cosine agreement is below --min-cosine.
+
+    python -m src.embedding_engine export-onnx models/all-MiniLM-L6-v2-onnx
+    python -m benchmarks.bench_embedding_backends --onnx-dir models/all-MiniLM-L6-v2-onnx \\
+        --onnx-files onnx/model.onnx onnx/model_quint8_avx2.onnx
+    python -m benchmarks.bench_embedding_backends --pdfs docs/*.pdf --questions questions.txt
+
+Synthetic PDFs and part-number questions by default. With --pdfs, your own documents are
+chunked as on upload; --questions is a file of one question per line (without it, the
+opening words of sampled chunks stand in for questions).
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import numpy as np
+from benchmarks.synthetic_pdf import make_uploads
+from src.embedding_engine import EmbeddingEngine
+from src.pdf_handler import PDFHandler
+
+def read_uploads(paths):
+    uploads = []
+    for path in paths:
+        with open(path, "rb") as f:
+            buf = io.BytesIO(f.read())
+        buf.name = os.path.basename(path)  # chunk "source", as for an uploaded file
+        uploads.append(buf)
+    return uploads
+
+def synthetic_set(chunks: int, queries: int):
+    texts, files = [], 1
+    while len(texts) < chunks:
+        texts = [c.page_content for c in PDFHandler.get_chunked_documents(make_uploads(files, 20), workers=1)]
+        files *= 2
+    questions = [f"What is the tolerance for part PN-{i % files:03d}-{i % 20 + 1:05d}?" for i in range(queries)]
+    return texts[:chunks], questions
+
+def pdf_set(pdf_paths, questions_path: str, chunks: int, queries: int, seed: int = 0):
+    texts = [c.page_content for c in PDFHandler.get_chunked_documents(read_uploads(pdf_paths), workers=1)][:chunks]
+    if questions_path:
+        with open(questions_path, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        sample = random.Random(seed).sample(texts, min(queries, len(texts)))
+        questions = [" ".join(text.split()[:12]) for text in sample]
+    return texts, questions[:queries]
+
+def measure(engine: EmbeddingEngine, texts, questions):
+    """Corpus vectors, query vectors, chunks/sec and single-query p50 latency (ms)."""
+    engine.encode(texts[:32])  # warm-up: first call pays lazy initialization
+    started = time.perf_counter()
+    vectors = engine.encode(texts)
+    throughput = len(texts) / (time.perf_counter() - started)
+
+    query_vectors, latencies = [], []
+    for question in questions:
+        started = time.perf_counter()
+        query_vectors.append(engine.encode([question])[0])
+        latencies.append((time.perf_counter() - started) * 1000)
+    return vectors, np.stack(query_vectors), throughput, float(np.percentile(latencies, 50))
+
+def top_k(query_vectors: np.ndarray, vectors: np.ndarray, k: int) -> np.ndarray:
+    # Vectors are normalized, so the inner product is the cosine similarity FAISS ranks by
+    return np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :k]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reference", default=EmbeddingEngine.MODEL_NAME, help="torch model name or local path")
+    parser.add_argument("--onnx-dir", default=EmbeddingEngine.ONNX_MODEL_DIR)
+    parser.add_argument("--onnx-files", nargs="+", default=[EmbeddingEngine.ONNX_FILE])
+    parser.add_argument("--chunks", type=int, default=1000, help="chunks embedded (at most)")
+    parser.add_argument("--queries", type=int, default=50, help="questions used (at most)")
+    parser.add_argument("--pdfs", nargs="+", help="your own PDFs instead of the synthetic corpus")
+    parser.add_argument("--questions", help="questions for --pdfs, one per line")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = default)")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="mean cosine agreement required to pass")
+    args = parser.parse_args()
+
+    if args.questions and not args.pdfs:
+        parser.error("--questions requires --pdfs")
+    if args.pdfs:
+        texts, questions = pdf_set(args.pdfs, args.questions, args.chunks, args.queries)
+        if not texts:
+            parser.error("no text could be extracted from --pdfs")
+    else:
+        texts, questions = synthetic_set(args.chunks, args.queries)
+    args.k = min(args.k, len(texts))
+
+    reference = EmbeddingEngine(args.reference, num_threads=args.threads, backend="torch")
+    ref_vectors, ref_queries, ref_throughput, ref_latency = measure(reference, texts, questions)
+    ref_top = top_k(ref_queries, ref_vectors, args.k)
+
+    print(f"{'model':<48} {'chunks/s':>9} {'speedup':>8} {'query ms':>9} {'cos mean':>9} {'cos min':>8} {f'top-{args.k} agree':>12}")
+    print(f"{reference.identity:<48} {ref_throughput:>9.1f} {1:>7.2f}x {ref_latency:>9.2f} {1:>9.4f} {1:>8.4f} {1:>12.0%}")
+
+    failed = False
+    for onnx_file in args.onnx_files:
+        candidate = EmbeddingEngine(args.onnx_dir, num_threads=args.threads, backend="onnx", onnx_file=onnx_file)
+        vectors, queries, throughput, latency = measure(candidate, texts, questions)
+
+        cosine = np.sum(ref_vectors * vectors, axis=1)
+        cand_top = top_k(queries, vectors, args.k)
+        agreement = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(ref_top, cand_top)])
+        passed = cosine.mean() >= args.min_cosine
+        failed |= not passed
+
+        print(f"{candidate.identity:<48} {throughput:>9.1f} {throughput / ref_throughput:>7.2f}x {latency:>9.2f} "
+              f"{cosine.mean():>9.4f} {cosine.min():>8.4f} {agreement:>12.0%}  {'PASS' if passed else 'FAIL'}")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Serial vs process-pool PDF extraction throughput. Pool timings include starting the
+workers (forked from a forkserver that preloads the PDF stack; spawned where forkserver
+is unavailable), which is what every ingestion pays.
+
+    python -m benchmarks.bench_extraction --files 50 --pages 40 --workers 1 4 8 16
+"""
+import argparse
+import os
+import time
+from benchmarks.synthetic_pdf import make_uploads
+from src.pdf_handler import PDFHandler
+
+def run(uploads, workers: int):
+    start = time.perf_counter()
+    chunks = PDFHandler.get_chunked_documents(uploads, workers=workers)
+    return time.perf_counter() - start, chunks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    uploads = make_uploads(args.files, args.pages, args.words)
+    total_pages = args.files * args.pages
+
+    # Untimed warm-up: the first call pays for imports and loading the tokenizer
+    run(uploads[:1], workers=1)
+    baseline_time, baseline_chunks = run(uploads, workers=1)
+    print(f"{'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8} {'same order':>11}")
+    for workers in sorted(set(args.workers)):
+        elapsed, chunks = (baseline_time, baseline_chunks) if workers == 1 else run(uploads, workers)
+        same = [(c.metadata, c.page_content) for c in chunks] == [(c.metadata, c.page_content) for c in baseline_chunks]
+        print(f"{workers:>8} {elapsed:>9.2f} {total_pages / elapsed:>9.1f} {baseline_time / elapsed:>7.2f}x {str(same):>11}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Recall vs latency of approximate FAISS indexes against the exact flat index.
+
+    python -m benchmarks.bench_index_types --vectors 200000 --queries 500 --k 10
+"""
+import argparse
+import time
+import faiss
+import numpy as np
+from src.index_factory import IndexFactory
+
+def make_vectors(n: int, centers: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Clustered, L2-normalized vectors: closer to real chunk embeddings than uniform noise."""
+    noise = 0.35 * rng.standard_normal((n, centers.shape[1])).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)] + noise
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def measure(index, queries: np.ndarray, k: int, truth: np.ndarray):
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    elapsed = time.perf_counter() - start
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    return recall, 1000 * elapsed / len(queries)
+
+def index_megabytes(index) -> float:
+    return faiss.serialize_index(index).nbytes / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Queries are drawn from the same topics (centers) as the corpus
+    centers = rng.standard_normal((max(10, args.vectors // 500), args.dimension)).astype(np.float32)
+    data = make_vectors(args.vectors, centers, rng)
+    queries = make_vectors(args.queries, centers, rng)
+
+    flat = IndexFactory.build(args.dimension, "flat")
+    flat.add(data)
+    _, truth = flat.search(queries, args.k)
+    _, flat_ms = measure(flat, queries, args.k, truth)
+
+    print(f"{'index':<8} {'param':<12} {'recall@k':>9} {'ms/query':>9} {'size MB':>8} {'build s':>8}")
+    print(f"{'flat':<8} {'-':<12} {1.0:>9.3f} {flat_ms:>9.3f} {index_megabytes(flat):>8.1f} {'-':>8}")
+
+    start = time.perf_counter()
+    hnsw = IndexFactory.build(args.dimension, "hnsw")
+    hnsw.add(data)
+    build_s = time.perf_counter() - start
+    for ef in args.ef_search:
+        IndexFactory.tune(hnsw, ef_search=ef)
+        recall, ms = measure(hnsw, queries, args.k, truth)
+        print(f"{'hnsw':<8} {f'efSearch={ef}':<12} {recall:>9.3f} {ms:>9.3f} {index_megabytes(hnsw):>8.1f} {build_s:>8.1f}")
+
+    start = time.perf_counter()
+    sample = data[rng.choice(len(data), min(len(data), IndexFactory.TRAIN_SAMPLE), replace=False)]
+    ivfpq = IndexFactory.build(args.dimension, "ivfpq", train_vectors=sample)
+    ivfpq.add(data)
+    build_s = time.perf_counter() - start
+    for nprobe in args.nprobe:
+        IndexFactory.tune(ivfpq, nprobe=nprobe)
+        recall, ms = measure(ivfpq, queries, args.k, truth)
+        print(f"{'ivfpq':<8} {f'nprobe={nprobe}':<12} {recall:>9.3f} {ms:>9.3f} {index_megabytes(ivfpq):>8.1f} {build_s:>8.1f}")
+
+if __name__ == "__main__":
+    main()
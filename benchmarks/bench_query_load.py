@@ -0,0 +1,62 @@
+"""
+Concurrent query load test for AsyncQueryEngine with the offline fake LLM backend (no network).
+
+    python -m benchmarks.bench_query_load --queries 400 --concurrency 1 8 32 --llm-latency 0.3
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from typing import List
+import numpy as np
+from benchmarks.offline import use_embedding_model
+from benchmarks.synthetic_pdf import make_uploads
+from src.llm_backend import FakeBackend
+from src.pdf_handler import PDFHandler
+from src.rag_chain import AsyncQueryEngine, RAGPipeline
+from src.vector_db import VectorDB
+
+def percentile(values: List[float], pct: float) -> float:
+    return float(np.percentile(values, pct)) if values else 0.0
+
+async def run_load(engine: AsyncQueryEngine, questions: List[str], concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, ttfts = [], []
+
+    async def one(question: str):
+        async with semaphore:
+            response = await engine.aquery(question)
+            latencies.append(response["timings"]["total"])
+            ttfts.append(response["timings"]["retrieval"] + response["timings"]["time_to_first_token"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in questions))
+    return time.perf_counter() - started, latencies, ttfts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="fake LLM time to first token (s)")
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--fake-embeddings", action="store_true", help="skip the sentence-transformers model (smoke test)")
+    args = parser.parse_args()
+
+    use_embedding_model(fake=args.fake_embeddings)
+
+    VectorDB.INDEX_PATH = tempfile.mkdtemp(prefix="bench_index_")
+    vector_store = VectorDB.rebuild_vector_store(PDFHandler.iter_chunked_documents(make_uploads(args.files, 20)))
+    pipeline = RAGPipeline(vector_store, VectorDB.get_index_version(vector_store), model=FakeBackend(args.llm_latency, args.llm_tokens_per_sec).create_model())
+    engine = AsyncQueryEngine(pipeline)
+
+    questions = [f"What is the tolerance for part PN-{i % args.files:03d}-{i % 20 + 1:05d}?" for i in range(args.queries)]
+    print(f"{'concurrency':>11} {'qps':>8} {'p50 ms':>8} {'p95 ms':>8} {'ttft p50':>9}")
+    for concurrency in args.concurrency:
+        elapsed, latencies, ttfts = asyncio.run(run_load(engine, questions, concurrency))
+        print(f"{concurrency:>11} {len(questions) / elapsed:>8.1f} {percentile(latencies, 50) * 1000:>8.0f} "
+              f"{percentile(latencies, 95) * 1000:>8.0f} {statistics.median(ttfts) * 1000:>9.0f}")
+
+if __name__ == "__main__":
+    main()
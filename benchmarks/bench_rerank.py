@@ -0,0 +1,54 @@
+"""
+Cross-encoder rerank latency on CPU by candidate count and batch size, and how often
+a given time budget forces the fallback to retrieval order.
+
+    python -m benchmarks.bench_rerank --candidates 10 25 50 --batch-sizes 8 16 32 --budget-ms 300
+"""
+import argparse
+import time
+import numpy as np
+from benchmarks.synthetic_pdf import make_uploads
+from src.pdf_handler import PDFHandler
+from src.reranker import CrossEncoderReranker
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=CrossEncoderReranker.MODEL_NAME, help="model name or local path")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 25, 50])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 16, 32, 64])
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--budget-ms", type=float, default=CrossEncoderReranker.TIME_BUDGET_MS)
+    args = parser.parse_args()
+
+    # Real chunk lengths matter: cross-encoder cost grows with tokens per pair
+    chunks = PDFHandler.get_chunked_documents(make_uploads(4, 20), workers=1)
+    questions = [f"What is the tolerance for part PN-{i % 4:03d}-{i % 20 + 1:05d}?" for i in range(args.queries)]
+
+    def candidate_set(i: int, size: int):
+        return [chunks[(i * size + j) % len(chunks)] for j in range(size)]
+
+    reranker = CrossEncoderReranker(model_name=args.model, time_budget_ms=float("inf"))
+    reranker.rerank(questions[0], chunks[:8], k=3)  # warm-up: first call pays lazy initialization
+
+    print(f"{'candidates':>10} {'batch':>6} {'p50 ms':>8} {'p95 ms':>8} {'fallback@' + str(int(args.budget_ms)) + 'ms':>16}")
+    for candidates in args.candidates:
+        for batch_size in args.batch_sizes:
+            reranker.batch_size = batch_size
+            reranker.time_budget_ms = float("inf")
+            samples = []
+            for i, question in enumerate(questions):
+                docs = candidate_set(i, candidates)
+                started = time.perf_counter()
+                reranker.rerank(question, docs, k=3)
+                samples.append((time.perf_counter() - started) * 1000)
+
+            reranker.time_budget_ms = args.budget_ms
+            reranker.fallbacks = 0
+            for i, question in enumerate(questions):
+                reranker.rerank(question, candidate_set(i, candidates), k=3)
+
+            print(f"{candidates:>10} {batch_size:>6} {np.percentile(samples, 50):>8.1f} {np.percentile(samples, 95):>8.1f} "
+                  f"{reranker.fallbacks / len(questions):>16.0%}")
+
+if __name__ == "__main__":
+    main()
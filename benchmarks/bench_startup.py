@@ -0,0 +1,112 @@
+"""
+Startup cost in fresh processes: import-time profile of the Home page and the Workspace,
+and time to the first answer with and without the warm-up (offline fake LLM backend).
+
+    python -m benchmarks.bench_startup --fake-embeddings --runs 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What each page imports before it can render (see app.py)
+HOME_IMPORTS = ["streamlit", "streamlit_option_menu", "src.ui_utils", "src.conversation_store", "src.warmup"]
+WORKSPACE_IMPORTS = HOME_IMPORTS + [
+    "src.vector_db", "src.rag_chain", "src.stream_handler", "src.answer_cache", "src.llm_backend", "src.ingest_jobs",
+]
+
+def spawn(args, cwd: str, env: dict = None, importtime: bool = False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + args
+    env = {**os.environ, "PYTHONPATH": ROOT, "BENCH_SPAWNED_AT": repr(time.time()), **(env or {})}
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, result
+
+def import_profile(modules, cwd: str, top: int):
+    """Wall time of a bare `import` of the modules, and the top-level packages costing the most."""
+    elapsed, result = spawn(["-c", "import " + ", ".join(modules)], cwd, importtime=True)
+    per_package = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        per_package[name.strip().split(".")[0]] += int(self_us)
+    return elapsed, sorted(per_package.items(), key=lambda item: item[1], reverse=True)[:top]
+
+def first_query_child(warm: bool, fake_embeddings: bool):
+    """Runs in the spawned process: one query against the prepared index, timed from process start."""
+    spawned_at = float(os.environ["BENCH_SPAWNED_AT"])
+    timings = {"interpreter_start": time.time() - spawned_at}
+
+    started = time.perf_counter()
+    from benchmarks.offline import use_embedding_model
+    from src.rag_chain import RAGChain
+    from src.vector_db import VectorDB
+    from src.warmup import Warmup
+    timings["imports"] = time.perf_counter() - started
+    use_embedding_model(fake=fake_embeddings)
+
+    if warm:
+        started = time.perf_counter()
+        Warmup.run()
+        timings["warmup"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vector_store = VectorDB.load_vector_store()
+    engine = RAGChain.get_query_engine(vector_store, VectorDB.get_index_version(vector_store), k=3)
+    asyncio.run(engine.aquery("What is the tolerance for part PN-000-00001?"))
+    timings["first_query"] = time.perf_counter() - started
+    timings["to_first_answer"] = time.time() - spawned_at
+    print(json.dumps(timings))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--top", type=int, default=8, help="heaviest packages to list per page")
+    parser.add_argument("--fake-embeddings", action="store_true", help="skip the sentence-transformers model (smoke test)")
+    parser.add_argument("--child", choices=["cold", "warm"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        first_query_child(args.child == "warm", args.fake_embeddings)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    # Prepared in this process, so the children only ever load it
+    from benchmarks.offline import use_embedding_model
+    from benchmarks.synthetic_pdf import make_uploads
+    from src.pdf_handler import PDFHandler
+    from src.vector_db import VectorDB
+    use_embedding_model(fake=args.fake_embeddings)
+    VectorDB.INDEX_PATH = os.path.join(workdir, VectorDB.INDEX_PATH)
+    VectorDB.rebuild_vector_store(PDFHandler.iter_chunked_documents(make_uploads(args.files, 20)))
+
+    for page, modules in (("Home", HOME_IMPORTS), ("Workspace", WORKSPACE_IMPORTS)):
+        samples, heaviest = [], []
+        for _ in range(args.runs):
+            elapsed, heaviest = import_profile(modules, workdir, args.top)
+            samples.append(elapsed)
+        print(f"\n{page} page imports: {statistics.median(samples) * 1000:.0f} ms (process start included)")
+        for package, self_us in heaviest:
+            print(f"  {package:<28} {self_us / 1000:>8.0f} ms")
+
+    env = {"LLM_BACKEND": "fake", "FAKE_LLM_LATENCY": "0", "WARMUP_COLLECTIONS": VectorDB.DEFAULT_COLLECTION}
+    child = ["-m", "benchmarks.bench_startup"] + (["--fake-embeddings"] if args.fake_embeddings else [])
+    print(f"\n{'start':>6} {'imports':>8} {'warm-up':>8} {'1st query':>10} {'to answer':>10}   (median ms)")
+    for mode in ("cold", "warm"):
+        runs = [json.loads(spawn(child + ["--child", mode], workdir, env)[1].stdout.strip().splitlines()[-1])
+                for _ in range(args.runs)]
+        median = lambda key: statistics.median(run.get(key, 0.0) for run in runs) * 1000
+        print(f"{mode:>6} {median('imports'):>8.0f} {median('warmup'):>8.0f} {median('first_query'):>10.0f} {median('to_first_answer'):>10.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Render calls and bytes pushed to the browser per streamed answer: the previous
+per-token full re-render against the throttled, paragraph-incremental StreamHandler.
+
+    python -m benchmarks.bench_stream_render --tokens 1500 --tokens-per-sec 100 200 --frame-ms 50 100
+"""
+import argparse
+import time
+from src.stream_handler import StreamHandler
+
+class RecordingContainer:
+    """Stands in for a Streamlit container; every element reports into the same counters."""
+    def __init__(self):
+        self.renders = 0
+        self.bytes = 0
+        self.largest_frame = 0
+
+    def empty(self):
+        return self
+
+    def markdown(self, text: str):
+        size = len(text.encode("utf-8"))
+        self.renders += 1
+        self.bytes += size
+        self.largest_frame = max(self.largest_frame, size)
+
+class PerTokenHandler:
+    """The original handler: rebuilds the answer and re-renders all of it on every token."""
+    def __init__(self, container):
+        self.container = container.empty()
+        self.text = ""
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.text += token
+        self.container.markdown(self.text + "▌")
+
+    def finish(self):
+        self.container.markdown(self.text)
+
+def answer_tokens(count: int):
+    """Answer-shaped tokens (~4 chars each) with a paragraph break every 60 tokens."""
+    return ["\n\n" if i % 60 == 59 else f" tok{i % 10}" for i in range(count)]
+
+def stream(handler, tokens, tokens_per_second: float) -> float:
+    """Feeds the tokens at the given rate; returns the time spent inside the handler."""
+    spent = 0.0
+    interval = 1 / tokens_per_second
+    next_token = time.perf_counter()
+    for token in tokens:
+        next_token += interval
+        delay = next_token - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        started = time.perf_counter()
+        handler.on_llm_new_token(token)
+        spent += time.perf_counter() - started
+    started = time.perf_counter()
+    handler.finish()
+    return spent + time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=1500)
+    parser.add_argument("--tokens-per-sec", type=float, nargs="+", default=[100, 200])
+    parser.add_argument("--frame-ms", type=float, nargs="+", default=[StreamHandler.FRAME_INTERVAL_MS])
+    parser.add_argument("--frame-chars", type=int, default=StreamHandler.FRAME_CHARS)
+    args = parser.parse_args()
+
+    tokens = answer_tokens(args.tokens)
+    print(f"{'handler':>22} {'tok/s':>6} {'renders':>8} {'KB pushed':>10} {'max frame KB':>13} {'handler ms':>11}")
+    for rate in args.tokens_per_sec:
+        container = RecordingContainer()
+        spent = stream(PerTokenHandler(container), tokens, rate)
+        print(f"{'per-token (before)':>22} {rate:>6.0f} {container.renders:>8} {container.bytes / 1024:>10.1f} "
+              f"{container.largest_frame / 1024:>13.1f} {spent * 1000:>11.1f}")
+
+        for frame_ms in args.frame_ms:
+            container = RecordingContainer()
+            handler = StreamHandler(container, frame_interval_ms=frame_ms, frame_chars=args.frame_chars)
+            spent = stream(handler, tokens, rate)
+            print(f"{f'throttled {frame_ms:.0f} ms':>22} {rate:>6.0f} {container.renders:>8} {container.bytes / 1024:>10.1f} "
+                  f"{container.largest_frame / 1024:>13.1f} {spent * 1000:>11.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""Offline stand-ins shared by the benchmarks (no model download, no network)."""
+import tempfile
+from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+from src.embedding_engine import EmbeddingEngine
+from src.pdf_handler import PDFHandler
+from src.vector_db import VectorDB
+
+def use_embedding_model(fake: bool = False):
+    """
+    Points VectorDB at a model with a private, empty embedding cache so results never
+    depend on what earlier runs cached. fake=True skips sentence-transformers entirely,
+    and with it the tokenizer, so chunks are sized in characters.
+    """
+    cache = EmbeddingCache(tempfile.mktemp(suffix=".sqlite"))
+    if fake:
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        model = CachedEmbeddings(DeterministicFakeEmbedding(size=384), "fake", cache)
+        PDFHandler.CHUNK_UNIT = "chars"
+    else:
+        engine = EmbeddingEngine()  # EMBED_BACKEND selects torch or onnx, as in the app
+        model = CachedEmbeddings(engine, engine.identity, cache)
+    VectorDB.get_embedding_model = staticmethod(lambda: model)
+    return model
@@ -0,0 +1,206 @@
+"""
+End-to-end benchmark of the ingestion and query hot paths, with machine-readable output.
+
+    python -m benchmarks.run_suite --files 20 --pages 40 --output results.json
+    python -m benchmarks.run_suite --fake-embeddings --compare baseline.json
+
+Stages: PDF extraction (pages/s), embedding (chunks/s, cold cache), index build,
+save and load times, retrieval latency percentiles for each k, and full pipeline
+latency with the offline fake LLM. CPU-only; no network needed with --fake-embeddings
+(otherwise the sentence-transformers model must already be in the local cache).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+import numpy as np
+from benchmarks.offline import use_embedding_model
+from benchmarks.synthetic_pdf import make_uploads
+from src.llm_backend import FakeBackend
+from src.pdf_handler import PDFHandler
+from src.rag_chain import AsyncQueryEngine, RAGPipeline
+from src.vector_db import VectorDB
+
+# Metrics where a larger value is better; every other metric is a duration
+HIGHER_IS_BETTER = ("pages_per_sec", "chunks_per_sec", "qps")
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+def bench_extraction(uploads, total_pages: int) -> dict:
+    elapsed, chunks = timed(PDFHandler.get_chunked_documents, uploads)
+    return {"seconds": elapsed, "pages": total_pages, "chunks": len(chunks), "pages_per_sec": total_pages / elapsed}, chunks
+
+def bench_embedding(model, chunks) -> dict:
+    texts = [c.page_content for c in chunks]
+    model.encode(texts[:8])  # warm-up: first call pays lazy model initialization
+    elapsed, _ = timed(model.encode, texts)
+    return {"seconds": elapsed, "chunks": len(texts), "chunks_per_sec": len(texts) / elapsed}
+
+def bench_index(chunks) -> dict:
+    # Embeddings are now cached, so build time is dominated by index + chunk store construction
+    build_seconds, store = timed(VectorDB.create_vector_store, iter(chunks))
+    save_seconds, _ = timed(VectorDB.save_vector_store, store)
+    # First load of this index version: a cold load from disk (later calls hit the shared cache)
+    load_seconds, loaded = timed(VectorDB.load_vector_store)
+    index_bytes = os.path.getsize(os.path.join(VectorDB.INDEX_PATH, "index.faiss"))
+    return {
+        "build_seconds": build_seconds,
+        "save_seconds": save_seconds,
+        "load_seconds": load_seconds,
+        "vectors": loaded.index.ntotal,
+        "index_bytes": index_bytes,
+    }
+
+def bench_retrieval(store, questions: List[str], ks: List[int]) -> dict:
+    results = {}
+    for k in ks:
+        retriever = VectorDB.get_retriever(store, k=k, candidates=max(20, k))
+        retriever.invoke(questions[0])
+        samples = [timed(retriever.invoke, q)[0] for q in questions]
+        results[f"k={k}"] = percentiles(samples)
+    return results
+
+def bench_pipeline(store, questions: List[str], concurrency: int) -> dict:
+    # Zero-latency fake LLM: what remains is retrieval, prompt assembly and orchestration
+    model = FakeBackend(first_token_latency=0.0, tokens_per_second=1e9).create_model()
+    engine = AsyncQueryEngine(RAGPipeline(store, VectorDB.get_index_version(store), model=model))
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(question: str):
+        async with semaphore:
+            response = await engine.aquery(question)
+            samples.append(response["timings"]["total"])
+
+    async def run():
+        await asyncio.gather(*(one(q) for q in questions))
+
+    elapsed, _ = timed(asyncio.run, run())
+    return {"concurrency": concurrency, "qps": len(questions) / elapsed, **percentiles(samples)}
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+def compare(current: dict, baseline: dict, tolerance: float) -> int:
+    """Prints per-metric change against a baseline run; returns the number of regressions."""
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    regressions = 0
+    print(f"\n{'metric':<40} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name in sorted(now.keys() & before.keys()):
+        if not before[name]:
+            continue
+        change = now[name] / before[name] - 1
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        # Only throughput and time metrics can regress; counts and sizes are informational
+        timing = name.endswith(HIGHER_IS_BETTER) or name.endswith(("_ms", "seconds"))
+        flag = ""
+        if timing and worse > tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name:<40} {before[name]:>12.3f} {now[name]:>12.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--words", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 10, 20, 50])
+    parser.add_argument("--concurrency", type=int, default=8, help="in-flight queries for the pipeline stage")
+    parser.add_argument("--fake-embeddings", action="store_true", help="deterministic embeddings instead of sentence-transformers")
+    parser.add_argument("--output", help="write results as JSON (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    model = use_embedding_model(fake=args.fake_embeddings)
+    VectorDB.INDEX_PATH = tempfile.mkdtemp(prefix="bench_index_")
+
+    try:
+        uploads = make_uploads(args.files, args.pages, args.words)
+        extraction, chunks = bench_extraction(uploads, args.files * args.pages)
+        print(f"extraction   {extraction['pages_per_sec']:>10.1f} pages/s  ({extraction['chunks']} chunks)")
+
+        embedding = bench_embedding(model, chunks)
+        print(f"embedding    {embedding['chunks_per_sec']:>10.1f} chunks/s")
+
+        index = bench_index(chunks)
+        print(f"index        build {index['build_seconds']:.2f}s  save {index['save_seconds']:.2f}s  load {index['load_seconds']:.3f}s")
+
+        store = VectorDB.load_vector_store()
+        questions = [f"What is the tolerance for part PN-{i % args.files:03d}-{i % args.pages + 1:05d}?" for i in range(args.queries)]
+        retrieval = bench_retrieval(store, questions, args.k)
+        for k, stats in retrieval.items():
+            print(f"retrieval    {k:<6} p50 {stats['p50_ms']:>7.2f} ms  p95 {stats['p95_ms']:>7.2f} ms  p99 {stats['p99_ms']:>7.2f} ms")
+
+        pipeline = bench_pipeline(store, questions, args.concurrency)
+        print(f"pipeline     {pipeline['qps']:>10.1f} qps      p50 {pipeline['p50_ms']:.2f} ms  p95 {pipeline['p95_ms']:.2f} ms")
+    finally:
+        shutil.rmtree(VectorDB.INDEX_PATH, ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embeddings": model.model_name,
+            "args": vars(args),
+        },
+        "results": {
+            "extraction": extraction,
+            "embedding": embedding,
+            "index": index,
+            "retrieval": retrieval,
+            "pipeline": pipeline,
+        },
+    }
+
+    output = args.output or os.path.join(os.path.dirname(__file__), "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
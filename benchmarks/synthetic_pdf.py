@@ -0,0 +1,70 @@
+import io
+import random
+
+# Small technical vocabulary so chunks look like the PDFs we actually ingest
+VOCABULARY = (
+    "system pressure valve clause section module sensor interface protocol "
+    "warranty supplier invoice compliance audit threshold latency throughput "
+    "assembly torque voltage specification tolerance revision approval"
+).split()
+
+def make_pdf(num_pages: int = 10, words_per_page: int = 400, seed: int = 0) -> bytes:
+    """
+    Writes a minimal, valid multi-page PDF (Helvetica text) without extra dependencies.
+    Each page also carries a unique part number so lexical lookups have exact targets.
+    """
+    rng = random.Random(seed)
+    objects = []  # index 0 -> object 1
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")  # filled in once the page tree exists
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for page_no in range(num_pages):
+        words = [rng.choice(VOCABULARY) for _ in range(words_per_page)]
+        words.insert(0, f"PN-{seed:03d}-{page_no + 1:05d}")
+        lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+
+        stream = ["BT", "/F1 10 Tf", "12 TL", "40 800 Td"]
+        for line in lines:
+            stream.append(f"({line}) Tj T*")
+        stream.append("ET")
+        content = "\n".join(stream).encode("latin-1")
+
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for obj_id, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+
+    xref_offset = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_offset))
+    return out.getvalue()
+
+def make_uploads(num_files: int = 5, num_pages: int = 20, words_per_page: int = 400):
+    """File-like objects with a .name, shaped like Streamlit's UploadedFile."""
+    uploads = []
+    for i in range(num_files):
+        buf = io.BytesIO(make_pdf(num_pages, words_per_page, seed=i))
+        buf.name = f"synthetic_{i:03d}.pdf"
+        uploads.append(buf)
+    return uploads
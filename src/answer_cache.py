@@ -0,0 +1,108 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import FrozenSet, List, Optional
+import numpy as np
+import streamlit as st
+from langchain.docstore.document import Document
+
+@dataclass
+class CachedAnswer:
+    vector: np.ndarray
+    index_version: str
+    key_terms: FrozenSet[str]
+    answer: str
+    source_documents: List[Document]
+    latency: float
+    created: float = field(default_factory=time.time)
+
+class SemanticAnswerCache:
+    """
+    Process-wide answer cache in front of the LLM call.
+    A question whose embedding is within SIMILARITY_THRESHOLD (cosine) of a cached
+    one, asked against the same index version, is answered instantly.
+    Identifiers and numbers must match exactly as well: "PN-001-00003" and "PN-001-00004"
+    embed almost identically but ask about different parts.
+    """
+    SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    # Tokens containing a digit (part numbers, versions, dates, quantities) and upper-case
+    # codes joined by "-" or "_" (e.g. "API-GW", "MAX_RETRIES")
+    KEY_TERM = re.compile(r"[\w.\-/]*\d[\w.\-/]*|\b[A-Z][A-Z0-9]*(?:[-_][A-Z0-9]+)+\b")
+    TTL_SECONDS = 15 * 60
+    MAX_ENTRIES = 512
+
+    def __init__(self, threshold: float = None, ttl: float = None, max_entries: int = None):
+        self.threshold = threshold or SemanticAnswerCache.SIMILARITY_THRESHOLD
+        self.ttl = ttl or SemanticAnswerCache.TTL_SECONDS
+        self.max_entries = max_entries or SemanticAnswerCache.MAX_ENTRIES
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+        # Reporting
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    @st.cache_resource
+    def shared():
+        """One cache per process, so colleagues' sessions benefit from each other's questions."""
+        return SemanticAnswerCache()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def lookup(self, query: str, query_vector, index_version: str) -> Optional[CachedAnswer]:
+        """Best match above the threshold for this index version and the same key terms, or None."""
+        vector = SemanticAnswerCache._normalize(query_vector)
+        key_terms = SemanticAnswerCache.key_terms(query)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            candidates = [(key, e) for key, e in self._entries.items()
+                          if e.index_version == index_version and e.key_terms == key_terms]
+            if candidates:
+                # Vectorized cosine similarity against every live entry
+                similarities = np.stack([e.vector for _, e in candidates]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)  # LRU
+                    self.hits += 1
+                    self.saved_seconds += entry.latency
+                    return entry
+            self.misses += 1
+            return None
+
+    def store(self, query: str, query_vector, index_version: str, answer: str, source_documents: List[Document], latency: float):
+        entry = CachedAnswer(
+            SemanticAnswerCache._normalize(query_vector), index_version, SemanticAnswerCache.key_terms(query),
+            answer, list(source_documents), latency,
+        )
+        with self._lock:
+            self._entries[self._next_key] = entry
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def key_terms(query: str) -> FrozenSet[str]:
+        """Tokens a cached answer must share exactly (case-insensitive, trailing punctuation ignored)."""
+        return frozenset(term.strip(".-/").lower() for term in SemanticAnswerCache.KEY_TERM.findall(query))
+
+    def _expire(self, now: float):
+        expired = [key for key, e in self._entries.items() if now - e.created > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,379 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Set, Tuple, Union
+from langchain.docstore.document import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+class ChunkStore(Docstore, AddableMixin):
+    """
+    SQLite-backed docstore for a saved index.
+    Chunk text and page/source metadata stay on disk, keyed by their global FAISS
+    position, and are read lazily: only the top-k hits of a query are fetched.
+    An FTS5 table over the same chunks (rowid = position) provides BM25 search.
+    Deletion state lives in the file too, so every process sharing it sees the same version.
+    """
+    FILENAME = "chunks.sqlite"
+    BASE_SEGMENT = "base"
+    # Lexical queries are capped so a pasted paragraph can't blow up BM25 latency
+    MAX_QUERY_TERMS = 32
+    # Positions per IN (...) query, well below SQLite's bound-parameter limit
+    READ_BATCH = 500
+    # Terms matching more chunks than this are left out: FTS5 would score every one of
+    # them, while their BM25 weight is close to zero (dense retrieval still covers them)
+    MAX_TERM_CHUNKS = int(os.getenv("BM25_MAX_TERM_CHUNKS", "5000"))
+    STOPWORDS = frozenset(
+        "a an and are as at be by can could did do does for from had has have how i if in into is it its "
+        "me my no not of on or our should so than that the their them then there these they this to was "
+        "we were what when where which who why will with would you your".split()
+    )
+
+    def __init__(self, index_path: str, filename: str = None):
+        self.path = os.path.join(index_path, filename or ChunkStore.FILENAME)
+        # Writes go through one connection under a lock; reads use one connection per thread,
+        # so concurrent sessions never queue behind each other
+        self._lock = threading.Lock()
+        # Dropped with their thread (or this store), which closes them
+        self._local = threading.local()
+        # query term -> chunks matching it (capped at MAX_TERM_CHUNKS + 1)
+        self._term_chunks = {}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "  id TEXT PRIMARY KEY, segment TEXT, position INTEGER,"
+            "  source TEXT, content TEXT NOT NULL, metadata TEXT NOT NULL);"
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_position ON chunks(position);"
+            "CREATE INDEX IF NOT EXISTS idx_source ON chunks(source);"
+            # Each segment owns the FAISS positions [offset, offset + count)
+            "CREATE TABLE IF NOT EXISTS segments (segment TEXT PRIMARY KEY, offset INTEGER, count INTEGER);"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(content);"
+            # Counters: "tombstones" (deleted positions still in FAISS), "deletions" (bumped by every delete)
+            "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+        )
+        # Stores written before the lexical index existed are backfilled once
+        if self._conn.execute("SELECT 1 FROM chunks_fts LIMIT 1").fetchone() is None:
+            self._conn.execute(
+                "INSERT INTO chunks_fts (rowid, content) SELECT position, content FROM chunks WHERE position IS NOT NULL"
+            )
+        if self._counter("tombstones") is None:
+            self._update_tombstones()
+        self._conn.commit()
+        # The file this store was opened on: a save or rebuild swaps a new one in under the
+        # same path, and threads that open their reader later must still read this one
+        self._inode = os.stat(self.path).st_ino
+
+    @property
+    def tombstones(self) -> int:
+        """Deleted positions still in the FAISS index (read from disk: deletes may come from other processes)."""
+        return self._counter("tombstones", self._reader()) or 0
+
+    @property
+    def deletions(self) -> int:
+        """Number of deletes ever applied to this store; part of the index version."""
+        return self._counter("deletions", self._reader()) or 0
+
+    # --- Docstore interface ---
+    def search(self, search: str) -> Union[str, Document]:
+        row = self._reader().execute("SELECT content, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Rows already written by write_segment() are kept as-is."""
+        rows = [(doc_id, doc.metadata.get("source"), doc.page_content, json.dumps(doc.metadata)) for doc_id, doc in texts.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (id, source, content, metadata) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def delete(self, ids: List) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM chunks_fts WHERE rowid = (SELECT position FROM chunks WHERE id = ?)", [(i,) for i in ids]
+            )
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in ids])
+            self._record_deletion()
+            self._conn.commit()
+
+    # --- Positional access (used by the FAISS wrapper) ---
+    def get_by_positions(self, positions: List[int]) -> Dict[int, Document]:
+        """Fetches the hits of one query in a single read. Deleted positions are absent."""
+        if not positions:
+            return {}
+        placeholders = ",".join("?" * len(positions))
+        rows = self._reader().execute(
+            f"SELECT position, content, metadata FROM chunks WHERE position IN ({placeholders})", positions
+        ).fetchall()
+        return {row[0]: Document(page_content=row[1], metadata=json.loads(row[2])) for row in rows}
+
+    def live_positions(self, positions: List[int]) -> List[int]:
+        """The given positions minus deleted ones, in the given order. Reads the position index only."""
+        live = set()
+        for start in range(0, len(positions), ChunkStore.READ_BATCH):
+            batch = positions[start:start + ChunkStore.READ_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            live.update(row[0] for row in self._reader().execute(
+                f"SELECT position FROM chunks WHERE position IN ({placeholders})", batch
+            ))
+        return [p for p in positions if p in live]
+
+    def entries(self, positions: List[int]) -> Tuple[List[Optional[str]], List[Optional[Document]]]:
+        """Ids and chunks at the given positions (None where deleted), for copying a store."""
+        found = {}
+        for start in range(0, len(positions), ChunkStore.READ_BATCH):
+            batch = positions[start:start + ChunkStore.READ_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            for position, doc_id, content, metadata in self._reader().execute(
+                f"SELECT position, id, content, metadata FROM chunks WHERE position IN ({placeholders})", batch
+            ):
+                found[position] = (doc_id, Document(page_content=content, metadata=json.loads(metadata)))
+        rows = [found.get(p, (None, None)) for p in positions]
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def id_at(self, position: int) -> Optional[str]:
+        row = self._reader().execute("SELECT id FROM chunks WHERE position = ?", (position,)).fetchone()
+        return row[0] if row else None
+
+    def bm25_positions(self, query: str, k: int) -> List[int]:
+        """
+        Top-k positions by BM25. Each query term is matched as a quoted phrase, so
+        part numbers and clause IDs (PN-001-00003, 4.2.1) must appear token-for-token.
+        Stopwords and terms found in too many chunks are left out (see _selective_terms).
+        """
+        conn = self._reader()
+        terms = self._selective_terms(conn, re.findall(r"\w[\w.\-/]*\w|\w", query)[:ChunkStore.MAX_QUERY_TERMS])
+        if not terms:
+            return []
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        rows = conn.execute(
+            "SELECT rowid FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY bm25(chunks_fts) LIMIT ?", (match, k)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def _selective_terms(self, conn: sqlite3.Connection, terms: List[str]) -> List[str]:
+        """
+        Optimization: FTS5 scores every row matching any OR-ed term, so a single common
+        word costs a pass over most of the corpus. Each term is probed with a capped count
+        (cost bounded by MAX_TERM_CHUNKS, cached per store) and only selective ones are kept.
+        """
+        selective = []
+        for term in dict.fromkeys(terms):
+            if term.lower() in ChunkStore.STOPWORDS:
+                continue
+            count = self._term_chunks.get(term)
+            if count is None:
+                if len(self._term_chunks) > 10_000:
+                    self._term_chunks.clear()
+                (count,) = conn.execute(
+                    "SELECT COUNT(*) FROM (SELECT 1 FROM chunks_fts WHERE chunks_fts MATCH ? LIMIT ?)",
+                    ('"' + term.replace('"', '""') + '"', ChunkStore.MAX_TERM_CHUNKS + 1),
+                ).fetchone()
+                self._term_chunks[term] = count
+            if 0 < count <= ChunkStore.MAX_TERM_CHUNKS:
+                selective.append(term)
+        return selective
+
+    # --- Segments ---
+    def next_offset(self) -> int:
+        """First FAISS position after every persisted segment."""
+        with self._lock:
+            (offset,) = self._conn.execute("SELECT COALESCE(MAX(offset + count), 0) FROM segments").fetchone()
+        return offset
+
+    def write_segment(self, segment: str, offset: int, ids: List[str], documents: List[Document]):
+        """
+        Stores a segment's chunks at global positions offset, offset + 1, ...
+        Rows and segment are one transaction, so a segment is either fully stored or absent.
+        """
+        with self._lock:
+            self._insert_rows(segment, offset, ids, documents)
+            self._conn.execute("INSERT OR REPLACE INTO segments VALUES (?, ?, ?)", (segment, offset, len(ids)))
+            self._update_tombstones()
+            self._conn.commit()
+
+    def write_segment_rows(self, segment: str, offset: int, ids: List[str], documents: List[Document]):
+        """Appends one slice of a segment, so large saves stream. None ids are skipped (deleted)."""
+        with self._lock:
+            self._insert_rows(segment, offset, ids, documents)
+            self._conn.commit()
+
+    def register_segment(self, segment: str, offset: int, count: int):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO segments VALUES (?, ?, ?)", (segment, offset, count))
+            self._update_tombstones()
+            self._conn.commit()
+
+    def segments(self) -> List[str]:
+        rows = self._reader().execute("SELECT segment FROM segments ORDER BY offset").fetchall()
+        return [row[0] for row in rows]
+
+    def drop_segments(self, segments: List[str]):
+        """Removes segments whose index file was never written (the writer died in between)."""
+        placeholders = ",".join("?" * len(segments))
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM chunks_fts WHERE rowid IN (SELECT position FROM chunks WHERE segment IN ({placeholders}))", segments
+            )
+            self._conn.execute(f"DELETE FROM chunks WHERE segment IN ({placeholders})", segments)
+            self._conn.execute(f"DELETE FROM segments WHERE segment IN ({placeholders})", segments)
+            self._term_chunks.clear()
+            self._update_tombstones()
+            self._conn.commit()
+
+    def rebase(self, count: int):
+        """
+        Compaction: base and deltas become a single base segment of `count` positions.
+        Deltas are replayed in order at load, so global positions are unchanged.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE position IS NULL")
+            self._conn.execute("UPDATE chunks SET segment = ?", (ChunkStore.BASE_SEGMENT,))
+            self._conn.execute("DELETE FROM segments")
+            self._conn.execute("INSERT INTO segments VALUES (?, 0, ?)", (ChunkStore.BASE_SEGMENT, count))
+            self._update_tombstones()
+            self._conn.commit()
+
+    # --- Document management ---
+    def sources(self) -> List[str]:
+        rows = self._reader().execute("SELECT DISTINCT source FROM chunks WHERE source IS NOT NULL ORDER BY source").fetchall()
+        return [row[0] for row in rows]
+
+    def delete_source(self, source: str) -> int:
+        """
+        Removes every chunk of a document. Its vectors stay in FAISS as tombstones
+        (skipped at query time) until the next rebuild, so the index is never rewritten.
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM chunks_fts WHERE rowid IN (SELECT position FROM chunks WHERE source = ?)", (source,)
+            )
+            deleted = self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,)).rowcount
+            if deleted:
+                self._record_deletion()
+            self._conn.commit()
+        return deleted
+
+    def checkpoint_pages(self, source: str, checkpoint: str) -> Set[int]:
+        """Pages of a source stored with the given checkpoint tag (see IngestJobs)."""
+        rows = self._reader().execute(
+            "SELECT DISTINCT json_extract(metadata, '$.page') FROM chunks "
+            "WHERE source = ? AND json_extract(metadata, '$.checkpoint') = ?", (source, checkpoint)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def delete_checkpoint(self, source: str, checkpoint: str) -> int:
+        """Like delete_source, limited to the chunks stored with the given checkpoint tag."""
+        where, args = "source = ? AND json_extract(metadata, '$.checkpoint') = ?", (source, checkpoint)
+        with self._lock:
+            self._conn.execute(f"DELETE FROM chunks_fts WHERE rowid IN (SELECT position FROM chunks WHERE {where})", args)
+            deleted = self._conn.execute(f"DELETE FROM chunks WHERE {where}", args).rowcount
+            if deleted:
+                self._record_deletion()
+            self._conn.commit()
+        return deleted
+
+    def delete_revision(self, source: str, file_hashes: Set[str], page_hashes: Set[str]) -> int:
+        """
+        Like delete_source, for a source replaced by a new upload: keeps the chunks of the
+        new upload (file_hashes) and those of pages it still contains (page_hashes).
+        """
+        rows = self._reader().execute(
+            "SELECT position, json_extract(metadata, '$.file_hash'), json_extract(metadata, '$.page_hash') "
+            "FROM chunks WHERE source = ? AND position IS NOT NULL", (source,)
+        ).fetchall()
+        stale = [(position,) for position, file_hash, page_hash in rows
+                 if file_hash not in file_hashes and page_hash not in page_hashes]
+        if not stale:
+            return 0
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", stale)
+            self._conn.executemany("DELETE FROM chunks WHERE position = ?", stale)
+            self._record_deletion()
+            self._conn.commit()
+        return len(stale)
+
+    def close(self):
+        with self._lock:
+            if getattr(self._local, "conn", None) not in (None, self._conn):
+                self._local.conn.close()
+                self._local.conn = None
+            self._conn.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        """
+        This thread's read connection; it sees every commit, from this process or another,
+        as long as the file at self.path is still the one this store was opened on.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            # Checked after connecting (SQLite opens the file right away), so a swap in between is caught
+            if not self._is_current():
+                # Replaced: the writer connection still holds the old file open, and SQLite
+                # serializes its use across threads. Only stores about to be reloaded get here
+                conn.close()
+                conn = self._conn
+            self._local.conn = conn
+        return conn
+
+    def _is_current(self) -> bool:
+        try:
+            return os.stat(self.path).st_ino == self._inode
+        except FileNotFoundError:
+            return False
+
+    def _insert_rows(self, segment: str, offset: int, ids: List[str], documents: List[Document]):
+        rows = [
+            (doc_id, segment, offset + i, doc.metadata.get("source"), doc.page_content, json.dumps(doc.metadata))
+            for i, (doc_id, doc) in enumerate(zip(ids, documents)) if doc_id is not None
+        ]
+        self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?)", rows)
+        # Lexical index is maintained incrementally alongside the chunks
+        self._conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", [(row[2],) for row in rows])
+        self._conn.executemany("INSERT INTO chunks_fts (rowid, content) VALUES (?, ?)", [(row[2], row[4]) for row in rows])
+
+    def _counter(self, name: str, conn: sqlite3.Connection = None) -> Optional[int]:
+        row = (conn or self._conn).execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _update_tombstones(self):
+        """Recounts after a write; committed in the same transaction as the write itself."""
+        (indexed,) = self._conn.execute("SELECT COALESCE(SUM(count), 0) FROM segments").fetchone()
+        (stored,) = self._conn.execute("SELECT COUNT(*) FROM chunks WHERE position IS NOT NULL").fetchone()
+        self._conn.execute("INSERT OR REPLACE INTO counters VALUES ('tombstones', ?)", (max(0, indexed - stored),))
+
+    def _record_deletion(self):
+        self._term_chunks.clear()
+        self._update_tombstones()
+        self._conn.execute(
+            "INSERT INTO counters VALUES ('deletions', 1) ON CONFLICT(name) DO UPDATE SET value = value + 1"
+        )
+
+class PositionIndex(Mapping):
+    """
+    FAISS position -> chunk id, resolved from the ChunkStore on demand.
+    Stands in for LangChain's index_to_docstore_id dict, so nothing is loaded up front.
+    """
+    def __init__(self, chunk_store: ChunkStore):
+        self.chunk_store = chunk_store
+
+    def __getitem__(self, position) -> str:
+        doc_id = self.chunk_store.id_at(int(position))
+        if doc_id is None:
+            raise KeyError(position)
+        return doc_id
+
+    def __iter__(self):
+        rows = self.chunk_store._reader().execute(
+            "SELECT position FROM chunks WHERE position IS NOT NULL ORDER BY position"
+        ).fetchall()
+        return iter(row[0] for row in rows)
+
+    def __len__(self) -> int:
+        (count,) = self.chunk_store._reader().execute("SELECT COUNT(*) FROM chunks WHERE position IS NOT NULL").fetchone()
+        return count
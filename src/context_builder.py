@@ -0,0 +1,131 @@
+import os
+import re
+from typing import Any, List, Set
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.tracing import Tracer
+
+class ContextBuilder:
+    """
+    Packs ranked chunks into the prompt context under a token budget:
+    overlapping chunks of the same page are stitched back together, near-duplicates
+    are dropped, and the remaining text is added in relevance order until the budget is used.
+    """
+    # Prompt context budget, in (estimated) tokens
+    TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+    # Ranked chunks considered for packing
+    CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+    # Word-shingle Jaccard similarity above which a chunk counts as a duplicate
+    DUPLICATE_THRESHOLD = 0.85
+    # Shortest shared text accepted as a splitter overlap (shorter matches are coincidence)
+    MIN_OVERLAP_CHARS = 30
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self, token_budget: int = None):
+        self.token_budget = token_budget or ContextBuilder.TOKEN_BUDGET
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        # Gemini tokenizes English at roughly 4 characters per token; no remote call needed
+        return max(1, len(text) // ContextBuilder.CHARS_PER_TOKEN)
+
+    def build(self, documents: List[Document]) -> List[Document]:
+        """documents are ranked most relevant first; so is the result."""
+        merged = ContextBuilder._merge_overlapping(documents)
+        unique = ContextBuilder._drop_duplicates(merged)
+        Tracer.count("chunks_merged", len(documents) - len(merged))
+        Tracer.count("chunks_deduped", len(merged) - len(unique))
+
+        packed, used = [], 0
+        for doc in unique:
+            tokens = ContextBuilder.estimate_tokens(doc.page_content)
+            if used + tokens <= self.token_budget:
+                packed.append(doc)
+                used += tokens
+            elif not packed:
+                # The best chunk alone is over budget: keep its head rather than nothing
+                text = doc.page_content[:self.token_budget * ContextBuilder.CHARS_PER_TOKEN]
+                packed.append(Document(page_content=text, metadata=doc.metadata))
+                used = self.token_budget
+            # Otherwise skip it: a smaller, less relevant chunk may still fit
+
+        Tracer.count("context_tokens_est", used)
+        return packed
+
+    @staticmethod
+    def _merge_overlapping(documents: List[Document]) -> List[Document]:
+        """
+        Re-joins chunks the splitter cut from the same page with chunk_overlap.
+        A merged chunk takes the rank of its best part.
+        """
+        merged: List[Document] = []
+        for doc in documents:
+            for i, kept in enumerate(merged):
+                if ContextBuilder._page_key(kept) != ContextBuilder._page_key(doc):
+                    continue
+                text = ContextBuilder._join(kept.page_content, doc.page_content)
+                if text is not None:
+                    parts = kept.metadata.get("merged_chunks", 1) + 1
+                    merged[i] = Document(page_content=text, metadata={**kept.metadata, "merged_chunks": parts})
+                    break
+            else:
+                merged.append(doc)
+        return merged
+
+    @staticmethod
+    def _join(a: str, b: str):
+        """a + b without their shared overlap, if one directly continues the other; else None."""
+        if b in a:
+            return a
+        if a in b:
+            return b
+        for first, second in ((a, b), (b, a)):
+            if len(second) < ContextBuilder.MIN_OVERLAP_CHARS:
+                continue
+            # Longest suffix of `first` that is a prefix of `second`: try each place
+            # the head of `second` occurs in `first`, earliest (longest overlap) first
+            probe = second[:ContextBuilder.MIN_OVERLAP_CHARS]
+            start = first.find(probe)
+            while start != -1:
+                if second.startswith(first[start:]):
+                    return first + second[len(first) - start:]
+                start = first.find(probe, start + 1)
+        return None
+
+    @staticmethod
+    def _drop_duplicates(documents: List[Document]) -> List[Document]:
+        kept, kept_shingles = [], []
+        for doc in documents:
+            shingles = ContextBuilder._shingles(doc.page_content)
+            if any(ContextBuilder._jaccard(shingles, other) >= ContextBuilder.DUPLICATE_THRESHOLD for other in kept_shingles):
+                continue
+            kept.append(doc)
+            kept_shingles.append(shingles)
+        return kept
+
+    @staticmethod
+    def _shingles(text: str, size: int = 3) -> Set[tuple]:
+        words = re.findall(r"\w+", text.lower())
+        return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+    @staticmethod
+    def _jaccard(a: Set[tuple], b: Set[tuple]) -> float:
+        return len(a & b) / len(a | b) if a or b else 1.0
+
+    @staticmethod
+    def _page_key(doc: Document):
+        return doc.metadata.get("source"), doc.metadata.get("page")
+
+class PackedContextRetriever(BaseRetriever):
+    """Wraps a retriever returning ranked candidates and hands back the packed context."""
+    base_retriever: Any
+    builder: Any
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        candidates = self.base_retriever.invoke(query)
+        with Tracer.stage("context_packing"):
+            return self.builder.build(candidates)
@@ -0,0 +1,66 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Tuple
+import streamlit as st
+
+class ConversationStore:
+    """
+    Persistent chat history (SQLite), one row per message.
+    Reads are windowed from the newest message backwards, so the cost of showing a
+    conversation depends on the window, not on how long the conversation has grown.
+    """
+    DB_PATH = os.getenv("CONVERSATION_DB", os.path.join(".cache", "conversations.sqlite"))
+    # Turns (question + answer) shown before "Show earlier messages" is needed
+    WINDOW_TURNS = int(os.getenv("CHAT_WINDOW_TURNS", "10"))
+
+    def __init__(self, path: str = None):
+        self.path = path or ConversationStore.DB_PATH
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Streamlit reruns on different threads, so the connection is shared under a lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, conversation TEXT NOT NULL, role TEXT NOT NULL, "
+            "content TEXT NOT NULL, extra TEXT, created REAL NOT NULL)"
+        )
+        # Optimization: windowed reads are a range scan on this index, newest first
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_conversation ON messages(conversation, id)")
+        self._conn.commit()
+
+    @staticmethod
+    @st.cache_resource
+    def shared():
+        """One connection per process, shared by every session."""
+        return ConversationStore()
+
+    def append(self, conversation: str, message: dict) -> int:
+        """Stores a message dict (role, content, and optionally sources/trace); returns its id."""
+        extra = {key: value for key, value in message.items() if key not in ("role", "content")}
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO messages (conversation, role, content, extra, created) VALUES (?, ?, ?, ?, ?)",
+                (conversation, message["role"], message["content"], json.dumps(extra) if extra else None, time.time()),
+            )
+            self._conn.commit()
+        return cursor.lastrowid
+
+    def recent(self, conversation: str, limit: int) -> Tuple[List[dict], bool]:
+        """The last `limit` messages in chronological order, and whether older ones exist."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, extra FROM messages WHERE conversation = ? ORDER BY id DESC LIMIT ?",
+                (conversation, limit + 1),
+            ).fetchall()
+        messages = [{"role": role, "content": content, **(json.loads(extra) if extra else {})}
+                    for role, content, extra in reversed(rows[:limit])]
+        return messages, len(rows) > limit
+
+    def clear(self, conversation: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE conversation = ?", (conversation,))
+            self._conn.commit()
@@ -0,0 +1,140 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+class EmbeddingCache:
+    """
+    Persistent on-disk cache of chunk embeddings (SQLite).
+    Keys are a digest of the model name plus the normalized chunk text.
+    """
+    CACHE_PATH = os.path.join(".cache", "embeddings.sqlite")
+    # Size bound: least recently used vectors are evicted beyond this count
+    MAX_ENTRIES = 200_000
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = path or EmbeddingCache.CACHE_PATH
+        self.max_entries = max_entries or EmbeddingCache.MAX_ENTRIES
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Streamlit reruns on different threads, so the connection is shared under a lock
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        """Whitespace-normalized so re-extracted pages with cosmetic differences still hit."""
+        normalized = " ".join(text.split())
+        return hashlib.sha256(f"{model_name}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached vectors for the keys that are present."""
+        found = {}
+        now = time.time()
+        with self._lock:
+            # SQLite limits bound parameters, so look up in slices
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [now, *batch]
+                )
+            self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """Stores new vectors and evicts the least recently used ones over the size bound."""
+        now = time.time()
+        rows = [(key, np.asarray(vec, dtype=np.float32).tobytes(), now) for key, vec in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)", (overflow,)
+            )
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model and consults the EmbeddingCache before encoding.
+    Only chunks never seen before (for this model) reach the underlying model.
+    """
+    # Recent query vectors kept in memory (see embed_query)
+    QUERY_MEMO_SIZE = 64
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: EmbeddingCache = None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache or EmbeddingCache()
+        self._queries = OrderedDict()
+        self._queries_lock = threading.Lock()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Returns a (n, dim) float32 array, encoding only cache misses."""
+        keys = [EmbeddingCache.make_key(self.model_name, t) for t in texts]
+        cached = self.cache.get_many(list(set(keys)))
+
+        # Deduplicate within the batch too: identical chunks are encoded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            fresh = dict(zip(missing.keys(), self._encode_uncached(list(missing.values()))))
+            self.cache.put_many(fresh)
+            cached.update(fresh)
+
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.ascontiguousarray(np.stack([cached[key] for key in keys]), dtype=np.float32)
+
+    def _encode_uncached(self, texts: List[str]) -> np.ndarray:
+        # Prefer the engine's vectorized path; fall back to the LangChain interface
+        if hasattr(self.embeddings, "encode"):
+            return self.embeddings.encode(texts)
+        return np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """
+        Optimization: a question is embedded for the answer cache lookup and again by dense
+        retrieval (once per collection searched). A small in-memory memo makes that one
+        forward pass. Queries stay out of the on-disk cache: they would only churn its LRU.
+        """
+        with self._queries_lock:
+            vector = self._queries.get(text)
+            if vector is not None:
+                self._queries.move_to_end(text)
+                return list(vector)
+
+        vector = self.embeddings.embed_query(text)
+        with self._queries_lock:
+            self._queries[text] = vector
+            if len(self._queries) > CachedEmbeddings.QUERY_MEMO_SIZE:
+                self._queries.popitem(last=False)
+        return list(vector)
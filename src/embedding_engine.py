@@ -0,0 +1,153 @@
+import argparse
+import os
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Per-process cache of tokenizers by model (every chunk size builds its own splitter)
+_TOKENIZERS = {}
+
+class EmbeddingEngine(Embeddings):
+    """
+    CPU embedding engine around sentence-transformers with tuned batching.
+    encode() returns contiguous float32 arrays that go straight into FAISS.
+    The torch backend runs the reference model; the onnx backend runs an exported
+    (optionally int8-quantized) copy from a local directory through onnxruntime.
+    """
+    MODEL_NAME = "all-MiniLM-L6-v2"
+    BACKEND = os.getenv("EMBED_BACKEND", "torch")
+    # onnx backend: local model directory (see export_onnx) and the model file inside it
+    ONNX_MODEL_DIR = os.getenv("EMBED_ONNX_DIR", os.path.join("models", f"{MODEL_NAME}-onnx"))
+    ONNX_FILE = os.getenv("EMBED_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+    # Tuned on CPU with benchmarks/bench_embedding.py; override per deployment
+    BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    # torch intra-op threads (0 = leave torch's default of one per core)
+    NUM_THREADS = int(os.getenv("EMBED_NUM_THREADS", "0"))
+    NORMALIZE = True
+    # Word pieces the model reads per input; all-MiniLM-L6-v2 silently truncates beyond 256
+    MAX_SEQ_LENGTH = int(os.getenv("EMBED_MAX_SEQ_LENGTH", "256"))
+
+    def __init__(self, model_name: str = None, batch_size: int = None, num_threads: int = None, normalize: bool = None,
+                 backend: str = None, onnx_file: str = None):
+        # Heavy import deferred until an engine is actually built
+        from sentence_transformers import SentenceTransformer
+
+        self.backend = backend or EmbeddingEngine.BACKEND
+        self.batch_size = batch_size or EmbeddingEngine.BATCH_SIZE
+        self.normalize = EmbeddingEngine.NORMALIZE if normalize is None else normalize
+        num_threads = EmbeddingEngine.NUM_THREADS if num_threads is None else num_threads
+
+        if self.backend == "torch":
+            import torch
+            if num_threads > 0:
+                torch.set_num_threads(num_threads)
+            self.model_name = model_name or EmbeddingEngine.MODEL_NAME
+            self.onnx_file = None
+            self.model = SentenceTransformer(self.model_name, device="cpu")
+
+        elif self.backend == "onnx":
+            self.model_name = model_name or EmbeddingEngine.ONNX_MODEL_DIR
+            self.onnx_file = onnx_file or EmbeddingEngine.ONNX_FILE
+            if not os.path.exists(os.path.join(self.model_name, self.onnx_file)):
+                # Never exported on the fly: that needs the torch weights and takes minutes
+                raise FileNotFoundError(
+                    f"ONNX model {os.path.join(self.model_name, self.onnx_file)} not found; "
+                    f"create it with: python -m src.embedding_engine export-onnx {self.model_name}"
+                )
+            model_kwargs = {"file_name": self.onnx_file, "provider": "CPUExecutionProvider"}
+            if num_threads > 0:
+                import onnxruntime
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = num_threads
+                model_kwargs["session_options"] = options
+            self.model = SentenceTransformer(self.model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+        else:
+            raise ValueError(f"Unknown embedding backend '{self.backend}' (expected torch or onnx)")
+
+    @property
+    def identity(self) -> str:
+        """
+        Names the vectors this engine produces. Recorded with every saved index and used in
+        embedding cache keys: vectors from different backends must never be mixed.
+        """
+        if self.backend == "torch":
+            return self.model_name
+        return f"onnx:{os.path.basename(os.path.normpath(self.model_name))}/{self.onnx_file}"
+
+    @staticmethod
+    def load_tokenizer():
+        """The active model's tokenizer alone (no weights), for sizing chunks in tokens; one per process."""
+        from transformers import AutoTokenizer
+
+        if EmbeddingEngine.BACKEND == "onnx":
+            name = EmbeddingEngine.ONNX_MODEL_DIR
+        else:
+            name = EmbeddingEngine.MODEL_NAME
+            # Short names are resolved the way sentence-transformers resolves them
+            if "/" not in name and not os.path.isdir(name):
+                name = f"sentence-transformers/{name}"
+        if name not in _TOKENIZERS:
+            _TOKENIZERS[name] = AutoTokenizer.from_pretrained(name)
+        return _TOKENIZERS[name]
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encodes texts in batches into a (n, dim) C-contiguous float32 array."""
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize,
+            show_progress_bar=False,
+        )
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+    # LangChain Embeddings interface (used by FAISS for queries)
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+    @staticmethod
+    def export_onnx(output_dir: str, model_name: str = None, quantization: str = "avx2") -> str:
+        """
+        Exports the reference model to ONNX in output_dir and, unless quantization is None,
+        adds a dynamically int8-quantized copy for that CPU instruction set.
+        Returns the model file the onnx backend should load.
+        """
+        from optimum.onnxruntime import AutoQuantizationConfig
+        from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+        # Loading a torch checkpoint with the onnx backend converts it
+        model = SentenceTransformer(model_name or EmbeddingEngine.MODEL_NAME, device="cpu", backend="onnx")
+        model.save(output_dir)
+        if not quantization:
+            return "onnx/model.onnx"
+        config = getattr(AutoQuantizationConfig, quantization)(is_static=False)
+        # Weights are signed or unsigned int8 depending on the instruction set
+        suffix = f"{config.weights_dtype.name.lower()}_{quantization}"
+        export_dynamic_quantized_onnx_model(model, config, output_dir, file_suffix=suffix)
+        return f"onnx/model_{suffix}.onnx"
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding model tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export-onnx", help="Export the model to ONNX (int8-quantized by default)")
+    export.add_argument("output_dir", nargs="?", default=EmbeddingEngine.ONNX_MODEL_DIR)
+    export.add_argument("--model", default=EmbeddingEngine.MODEL_NAME, help="model name or local path")
+    export.add_argument("--quantization", default="avx2", choices=["arm64", "avx2", "avx512", "avx512_vnni", "none"])
+    args = parser.parse_args()
+
+    model_file = EmbeddingEngine.export_onnx(args.output_dir, args.model, None if args.quantization == "none" else args.quantization)
+    print(f"Exported {os.path.join(args.output_dir, model_file)}")
+    print(f"Use it with: EMBED_BACKEND=onnx EMBED_ONNX_DIR={args.output_dir} EMBED_ONNX_FILE={model_file}")
+
+if __name__ == "__main__":
+    main()
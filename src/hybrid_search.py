@@ -0,0 +1,65 @@
+from typing import Any, Dict, List
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.tracing import Tracer
+
+def reciprocal_rank_fusion(rankings: List[List[int]], rrf_k: int = 60) -> List[int]:
+    """
+    Merges ranked id lists: score(d) = sum(1 / (rrf_k + rank)).
+    Rank-based, so BM25 scores and L2 distances never need to be calibrated.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense (FAISS) + sparse (BM25 over the chunk store) retrieval with reciprocal-rank fusion.
+    Catches exact part numbers, clause IDs and acronyms that embeddings blur together.
+    """
+    vector_store: Any
+    k: int = 3
+    # Candidates taken from each list before fusion
+    candidates: int = 20
+    rrf_k: int = 60
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        dense = self.vector_store.dense_positions(query, self.candidates)
+        with Tracer.stage("bm25_search"):
+            sparse = self.vector_store.docstore.bm25_positions(query, self.candidates)
+        fused = reciprocal_rank_fusion([dense, sparse], self.rrf_k)
+
+        # Only the rows that fill k are read: dense and BM25 positions are live, but a delete
+        # may land between the search and the read, in which case the next slice is fetched
+        docs, start = [], 0
+        with Tracer.stage("chunk_fetch"):
+            while len(docs) < self.k and start < len(fused):
+                batch = fused[start:start + self.k - len(docs)]
+                start += len(batch)
+                found = self.vector_store.docstore.get_by_positions(batch)
+                docs.extend(found[p] for p in batch if p in found)
+        return docs
+
+class MultiCollectionRetriever(BaseRetriever):
+    """
+    Searches several collections and fuses their rankings with RRF into one top-k.
+    Each collection ranks with its own retriever, so scores never need to be comparable.
+    """
+    retrievers: List[Any]
+    k: int = 3
+    rrf_k: int = 60
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        results = [retriever.invoke(query) for retriever in self.retrievers]
+        rankings = [[(i, rank) for rank in range(len(docs))] for i, docs in enumerate(results)]
+        fused = reciprocal_rank_fusion(rankings, self.rrf_k)
+        return [results[i][rank] for i, rank in fused[:self.k]]
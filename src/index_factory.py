@@ -0,0 +1,98 @@
+import logging
+import math
+import os
+from typing import List
+import faiss
+import numpy as np
+
+class IndexFactory:
+    """
+    Builds and tunes the FAISS index behind VectorDB.
+    flat = exact search, hnsw = low latency, ivfpq = compressed for memory-constrained nodes.
+    """
+    INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+    INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+    # HNSW graph degree and build/search beam widths
+    HNSW_M = 32
+    HNSW_EF_CONSTRUCTION = 200
+    EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+
+    # IVF-PQ: inverted lists probed per query, PQ sub-quantizers (must divide the dimension).
+    # 48 one-byte codes per vector vs 1.5 KB for flat 384-d float32
+    NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+    PQ_M = 48
+    PQ_BITS = 8
+    # Vectors buffered from the start of the stream to train IVF centroids and PQ codebooks
+    TRAIN_SAMPLE = 20_000
+    # PQ codebooks want ~39 points per centroid (2^8 of them); below that a flat index is exact and cheap
+    MIN_TRAIN = 10_000
+    # Vectors copied per step when deleted ones are dropped on compaction
+    COMPACTION_BATCH = 4096
+
+    @staticmethod
+    def needs_training(index_type: str = None) -> bool:
+        return (index_type or IndexFactory.INDEX_TYPE) == "ivfpq"
+
+    @staticmethod
+    def build(dimension: int, index_type: str = None, train_vectors: np.ndarray = None) -> faiss.Index:
+        """Creates an empty (trained, if required) index of the requested type."""
+        index_type = index_type or IndexFactory.INDEX_TYPE
+        if index_type not in IndexFactory.INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type '{index_type}'. Use one of {IndexFactory.INDEX_TYPES}.")
+
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dimension, IndexFactory.HNSW_M)
+            index.hnsw.efConstruction = IndexFactory.HNSW_EF_CONSTRUCTION
+
+        elif index_type == "ivfpq":
+            sample_size = 0 if train_vectors is None else len(train_vectors)
+            if sample_size < IndexFactory.MIN_TRAIN or dimension % IndexFactory.PQ_M:
+                logging.warning(f"IVF-PQ needs >= {IndexFactory.MIN_TRAIN} training vectors; using a flat index")
+                return faiss.IndexFlatL2(dimension)
+
+            # Rule of thumb: ~4*sqrt(n) lists, with at least 39 training points per centroid
+            nlist = max(1, min(int(4 * math.sqrt(sample_size)), sample_size // 39))
+            quantizer = faiss.IndexFlatL2(dimension)
+            index = faiss.IndexIVFPQ(quantizer, dimension, nlist, IndexFactory.PQ_M, IndexFactory.PQ_BITS)
+            index.train(train_vectors)
+
+        else:
+            index = faiss.IndexFlatL2(dimension)
+
+        IndexFactory.tune(index)
+        return index
+
+    @staticmethod
+    def compacted(index: faiss.Index, keep: List[int]) -> faiss.Index:
+        """
+        A new index holding only the vectors at the `keep` positions, renumbered 0..len-1 in
+        order. Flat and HNSW vectors are copied exactly; IVF-PQ keeps its trained centroids
+        and codebooks and re-encodes each vector from its codes.
+        """
+        keep = np.asarray(keep, dtype=np.int64)
+        try:
+            faiss.extract_index_ivf(index)
+            source = faiss.clone_index(index)
+            # IVF lists are keyed by id; reading vectors back by position needs a direct map
+            faiss.extract_index_ivf(source).make_direct_map()
+            compacted = faiss.clone_index(index)
+            compacted.reset()
+        except RuntimeError:
+            source = index
+            compacted = IndexFactory.build(index.d, "hnsw" if hasattr(index, "hnsw") else "flat")
+        for start in range(0, len(keep), IndexFactory.COMPACTION_BATCH):
+            compacted.add(source.reconstruct_batch(keep[start:start + IndexFactory.COMPACTION_BATCH]))
+        IndexFactory.tune(compacted)
+        return compacted
+
+    @staticmethod
+    def tune(index: faiss.Index, nprobe: int = None, ef_search: int = None):
+        """Applies query-time accuracy/speed knobs; a no-op for flat indexes."""
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = ef_search or IndexFactory.EF_SEARCH
+            return
+        try:
+            faiss.extract_index_ivf(index).nprobe = nprobe or IndexFactory.NPROBE
+        except RuntimeError:
+            pass
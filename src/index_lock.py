@@ -0,0 +1,57 @@
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, writers are only serialized within the process
+    fcntl = None
+
+class IndexWriteLock:
+    """
+    Exclusive writer lock per index directory, held across a whole write sequence
+    (delta or base save, compaction, manifest commit). Delta names and FAISS positions
+    are read from disk before they are written, so two unserialized writers would take
+    the same ones. The lock is a file next to the index, so it also holds across worker
+    processes and survives the directory being swapped by a rebuild.
+    Re-entrant within a thread; readers never take it.
+    """
+    _held = threading.local()
+    _local_locks = {}
+    _local_locks_guard = threading.Lock()
+
+    @staticmethod
+    def path_for(index_path: str) -> str:
+        return os.path.abspath(index_path).rstrip(os.sep) + ".lock"
+
+    @staticmethod
+    @contextmanager
+    def hold(index_path: str):
+        path = IndexWriteLock.path_for(index_path)
+        held = IndexWriteLock._held.__dict__.setdefault("depth", {})
+        if path in held:
+            held[path] += 1
+            try:
+                yield
+            finally:
+                held[path] -= 1
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # flock locks belong to the open file, so threads of one process exclude each other too
+        with IndexWriteLock._process_lock(path), open(path, "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            held[path] = 1
+            try:
+                yield
+            finally:
+                # Closing the file releases the lock
+                del held[path]
+
+    @staticmethod
+    def _process_lock(path: str):
+        if fcntl is not None:
+            return nullcontext()
+        with IndexWriteLock._local_locks_guard:
+            return IndexWriteLock._local_locks.setdefault(path, threading.Lock())
@@ -0,0 +1,95 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable
+import faiss
+
+class IndexRegistry:
+    """
+    Process-wide LRU of loaded indexes, keyed by index directory.
+    An entry is reloaded when its on-disk version changes; cold entries are evicted
+    once more than MAX_RESIDENT are loaded or their estimated size passes the ceiling.
+    Queries already holding an evicted store keep it alive until they finish; cached
+    query engines drop theirs (see RAGChain.get_query_engine).
+    """
+    MAX_RESIDENT = int(os.getenv("MAX_LOADED_INDEXES", "8"))
+    MEMORY_CEILING_MB = float(os.getenv("INDEX_MEMORY_CEILING_MB", "2048"))
+
+    def __init__(self, max_resident: int = None, memory_ceiling_mb: float = None):
+        self.max_resident = max_resident or IndexRegistry.MAX_RESIDENT
+        self.memory_ceiling = (memory_ceiling_mb or IndexRegistry.MEMORY_CEILING_MB) * 1024 * 1024
+        # path -> (version, store, estimated bytes)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per path: a slow load (or a v2.0 migration) only blocks sessions waiting for that index
+        self._loading = {}
+
+        # Reporting
+        self.loads = 0
+        self.evictions = 0
+
+    @property
+    def resident_bytes(self) -> int:
+        return sum(size for _, _, size in self._entries.values())
+
+    def get(self, path: str, version: str, loader: Callable[[str], object]):
+        """Returns the loaded store for path at version, loading it (and evicting) if needed."""
+        path = os.path.abspath(path)
+        store = self._lookup(path, version)
+        if store is not None:
+            return store
+
+        with self._lock:
+            path_lock = self._loading.setdefault(path, threading.Lock())
+        with path_lock:
+            # Another session may have loaded it while this one waited
+            store = self._lookup(path, version)
+            if store is not None:
+                return store
+            # Loaded outside the registry lock, so lookups of resident indexes never wait on it
+            store = loader(path)
+            with self._lock:
+                self.loads += 1
+                self._entries[path] = (version, store, IndexRegistry.estimate_bytes(store))
+                self._entries.move_to_end(path)
+                self._evict(keep=path)
+            return store
+
+    def holds(self, store) -> bool:
+        """True while the store is resident (callers caching derived objects drop them otherwise)."""
+        with self._lock:
+            return any(entry[1] is store for entry in self._entries.values())
+
+    def _lookup(self, path: str, version: str):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(path)
+            return entry[1]
+
+    def _evict(self, keep: str):
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_resident or self.resident_bytes > self.memory_ceiling
+        ):
+            path = next(iter(self._entries))
+            if path == keep:
+                break
+            self._entries.pop(path)
+            self.evictions += 1
+            logging.info(f"Evicted index {path} from memory ({self.resident_bytes / 2**20:.0f} MB still resident)")
+
+    @staticmethod
+    def estimate_bytes(store) -> int:
+        """
+        Memory held by a loaded index. Memory-mapped indexes count too: queries touch
+        most of their pages, which then stay resident in this process.
+        """
+        index = faiss.downcast_index(store.index)
+        # Flat and PQ indexes report their code size; HNSW is its raw vectors plus the graph links
+        per_vector = getattr(index, "code_size", index.d * 4)
+        hnsw = getattr(index, "hnsw", None)
+        if hnsw is not None:
+            per_vector += hnsw.nb_neighbors(0) * 4  # level-0 links (upper levels are small)
+        return index.ntotal * per_vector
@@ -0,0 +1,310 @@
+import io
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import streamlit as st
+from src.index_factory import IndexFactory
+from src.index_lock import IndexWriteLock
+from src.vector_db import VectorDB
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, one process per jobs directory
+    fcntl = None
+
+class JobCancelled(Exception):
+    pass
+
+class IngestJobs:
+    """
+    Background ingestion: uploads are spilled to disk as a job and indexed in a worker
+    process, one file at a time, as delta segments of about CHECKPOINT_CHUNKS chunks.
+    Every chunk is tagged with its job file, and that tag is written with the delta itself,
+    so a job picked up again after a restart skips exactly the pages already on disk, even
+    halfway through a large file. Rebuilds are written to a staging directory and swapped
+    in at the end, so queries keep using the previous index.
+    """
+    JOBS_DIR = os.getenv("INGEST_JOBS_DIR", "ingest_jobs")
+    # Chunks per delta segment (cut at a page boundary): at most this much is redone after a restart
+    CHECKPOINT_CHUNKS = int(os.getenv("INGEST_CHECKPOINT_CHUNKS", "1024"))
+    # Jobs run one at a time per process: every job writes to an index. With more workers,
+    # jobs of different collections run in parallel, while those of one collection still queue
+    WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "1"))
+    ACTIVE = ("queued", "running")
+
+    def __init__(self, jobs_dir: str = None, workers: int = None):
+        self.jobs_dir = jobs_dir or IngestJobs.JOBS_DIR
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        # Spawned, not forked: the parent (Streamlit/uvicorn) runs many threads
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers or IngestJobs.WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._lock = threading.Lock()
+        self.resume()
+
+    @staticmethod
+    @st.cache_resource
+    def shared():
+        """Process-wide job runner shared by every session."""
+        return IngestJobs()
+
+    def submit(self, pdf_docs: List, mode: str = "append", collection: str = None) -> str:
+        """Persists the uploads as a new job and queues it; returns the job id."""
+        if mode not in ("append", "rebuild"):
+            raise ValueError(f"Unknown ingestion mode '{mode}' (expected append or rebuild)")
+        VectorDB.collection_path(collection)  # Rejects invalid names before anything is written
+
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = os.path.join(self.jobs_dir, job_id)
+        os.makedirs(os.path.join(job_dir, "files"))
+
+        files = []
+        for i, pdf in enumerate(pdf_docs):
+            path = os.path.join("files", f"{i:04d}.pdf")
+            data = pdf.getvalue() if hasattr(pdf, "getvalue") else pdf.read()
+            with open(os.path.join(job_dir, path), "wb") as f:
+                f.write(data)
+            files.append({"name": pdf.name, "path": path, "done": False})
+
+        _write_job(job_dir, {
+            "id": job_id,
+            "status": "queued",
+            "mode": mode,
+            "collection": collection,
+            "files": files,
+            "progress": {"files_done": 0, "files_total": len(files), "current_file": None, "chunks": 0,
+                         "skipped_files": 0, "skipped_pages": 0},
+            "created": time.time(),
+            "updated": time.time(),
+            "error": None,
+        })
+        self._start(job_dir)
+        return job_id
+
+    def status(self, job_id: str) -> Optional[dict]:
+        if not job_id.isalnum():
+            return None  # Ids are hex; anything else could point outside the jobs directory
+        return _read_job(os.path.join(self.jobs_dir, job_id))
+
+    def list_jobs(self) -> List[dict]:
+        jobs = [self.status(job_id) for job_id in os.listdir(self.jobs_dir)]
+        return sorted((job for job in jobs if job), key=lambda job: job["created"], reverse=True)
+
+    def cancel(self, job_id: str) -> bool:
+        """Asks the worker to stop at the next batch boundary; the flag is a file, so it crosses processes."""
+        job = self.status(job_id)
+        if job is None or job["status"] not in IngestJobs.ACTIVE:
+            return False
+        open(os.path.join(self.jobs_dir, job_id, "cancel"), "w").close()
+        return True
+
+    def resume(self):
+        """Re-queues jobs that were queued or running when the previous process stopped."""
+        for job in self.list_jobs():
+            if job["status"] in IngestJobs.ACTIVE:
+                logging.info(f"Resuming ingestion job {job['id']} ({job['progress']['files_done']}/{job['progress']['files_total']} files done)")
+                self._start(os.path.join(self.jobs_dir, job["id"]))
+
+    def _start(self, job_dir: str):
+        with self._lock:
+            future = self._pool.submit(run_job, os.path.abspath(job_dir))
+        future.add_done_callback(IngestJobs._log_crash)
+
+    @staticmethod
+    def _log_crash(future):
+        # run_job records its own failures; this only fires if the worker process itself died
+        if future.exception() is not None:
+            logging.error(f"Ingestion worker crashed: {future.exception()}")
+
+def run_job(job_dir: str):
+    """Worker-process entry point: indexes the job's remaining files, checkpointing with every delta."""
+    lock = _acquire(job_dir)
+    if lock is None:
+        return  # Another process is already running this job
+
+    job = _read_job(job_dir)
+    if job is None or job["status"] not in IngestJobs.ACTIVE:
+        return
+
+    # One job per collection at a time: waits here while another worker runs one
+    with _collection_lock(os.path.dirname(job_dir), job["collection"]):
+        _run(job_dir, job)
+
+def _run(job_dir: str, job: dict):
+    # Imported in the worker: PDF parsing and embedding run here, not in the UI process
+    from src.pdf_handler import PDFHandler
+    from src.tracing import Trace
+
+    index_path = VectorDB.collection_path(job["collection"])
+    rebuild = job["mode"] == "rebuild"
+    # Rebuilds go to a staging copy; the live index keeps serving queries until the swap
+    target = f"{index_path}.rebuild-{job['id']}" if rebuild else index_path
+    cancel_flag = os.path.join(job_dir, "cancel")
+    entry = None
+
+    job["status"] = "running"
+    _write_job(job_dir, job)
+
+    def on_batch(batch_no, chunk_count):
+        if os.path.exists(cancel_flag):
+            raise JobCancelled()
+        job["progress"]["chunks"] = chunks_before + chunk_count
+        _write_job(job_dir, job)
+
+    try:
+        with Trace("ingestion", mode=job["mode"], collection=job["collection"], job=job["id"]):
+            for entry in job["files"]:
+                if entry["done"]:
+                    continue
+                if os.path.exists(cancel_flag):
+                    raise JobCancelled()
+
+                job["progress"]["current_file"] = entry["name"]
+                _write_job(job_dir, job)
+
+                with open(os.path.join(job_dir, entry["path"]), "rb") as f:
+                    upload = io.BytesIO(f.read())
+                upload.name = entry["name"]
+
+                checkpoint = _checkpoint_tag(job, entry)
+                # Other writers of this index (API ingests, other workers) wait until the file is in
+                with IndexWriteLock.hold(target):
+                    # Pages a previous run of this job already wrote (the process stopped mid-file)
+                    indexed = VectorDB.checkpoint_pages(target, entry["name"], checkpoint)
+                    manifest = VectorDB.get_manifest(target)
+                    chunk_stream = (
+                        doc for doc in PDFHandler.iter_chunked_documents([upload], manifest=manifest)
+                        if doc.metadata.get("page") not in indexed
+                    )
+                    for segment in _segments(chunk_stream, checkpoint):
+                        chunks_before = job["progress"]["chunks"]
+                        # The checkpoint: chunk rows carry their tag, so this write records the progress too
+                        VectorDB.write_delta(segment, on_batch=on_batch, index_path=target)
+                        job["progress"]["chunks"] = chunks_before + len(segment)
+                        _write_job(job_dir, job)
+                    # Every page of the file is on disk now, including those indexed before a restart
+                    VectorDB.commit_manifest(manifest, target)
+
+                entry["done"] = True
+                job["progress"]["files_done"] += 1
+                job["progress"]["skipped_files"] += manifest.skipped_files
+                job["progress"]["skipped_pages"] += manifest.skipped_pages
+                _write_job(job_dir, job)
+
+            # Queries read a delta-free index memory-mapped; the job's segments are folded in once, here
+            try:
+                VectorDB.compact(target)
+            except Exception as e:
+                # The files are indexed either way; the deltas are folded in by a later compaction
+                logging.warning(f"Compaction after ingestion job {job['id']} failed: {e}")
+
+        if rebuild:
+            _swap_in(target, index_path, job["id"])
+        job["status"] = "completed"
+
+    except JobCancelled:
+        job["status"] = "cancelled"
+        _roll_back(job, entry, target)
+    except Exception as e:
+        logging.error(f"Ingestion job {job['id']} failed: {e}")
+        job["status"], job["error"] = "failed", str(e)
+        _roll_back(job, entry, target)
+
+    job["progress"]["current_file"] = None
+    _write_job(job_dir, job)
+    # Uploads are no longer needed once the job reached a final state
+    shutil.rmtree(os.path.join(job_dir, "files"), ignore_errors=True)
+
+def _checkpoint_tag(job: dict, entry: dict) -> str:
+    # Per job file, not per name: one job may carry two uploads with the same name
+    return f"{job['id']}/{entry['path']}"
+
+def _segments(documents, checkpoint: str):
+    """
+    Groups a file's chunks into delta segments of about CHECKPOINT_CHUNKS, cut where a new
+    page starts, so a page is always entirely on disk or not at all.
+    """
+    limit = IngestJobs.CHECKPOINT_CHUNKS
+    if IndexFactory.needs_training():
+        # The first segment of a new index becomes its base, which is trained on it
+        limit = max(limit, IndexFactory.TRAIN_SAMPLE)
+    segment = []
+    for doc in documents:
+        if len(segment) >= limit and doc.metadata.get("page") != segment[-1].metadata.get("page"):
+            yield segment
+            segment = []
+        doc.metadata["checkpoint"] = checkpoint
+        segment.append(doc)
+    if segment:
+        yield segment
+
+def _roll_back(job: dict, entry: Optional[dict], target: str):
+    """A stopped job keeps only whole files: a partial rebuild, or the unfinished file of an append, is removed."""
+    if job["mode"] == "rebuild":
+        # The previous index stays live
+        shutil.rmtree(target, ignore_errors=True)
+        if os.path.exists(IndexWriteLock.path_for(target)):
+            os.remove(IndexWriteLock.path_for(target))
+    elif entry is not None and not entry["done"]:
+        VectorDB.delete_checkpoint(target, entry["name"], _checkpoint_tag(job, entry))
+
+def _swap_in(staging: str, index_path: str, job_id: str):
+    # The staging index is complete; its lock file is no longer needed
+    if os.path.exists(IndexWriteLock.path_for(staging)):
+        os.remove(IndexWriteLock.path_for(staging))
+    if not os.path.exists(staging):
+        # Nothing was indexed (every file empty or skipped): keep the previous index
+        return
+    retired = f"{index_path}.old-{job_id}"
+    # Not in the middle of another writer's append to the live index
+    with IndexWriteLock.hold(index_path):
+        if os.path.exists(index_path):
+            os.replace(index_path, retired)
+        os.replace(staging, index_path)
+    # Readers holding the old index keep their open files; the directory entry goes now
+    shutil.rmtree(retired, ignore_errors=True)
+
+@contextmanager
+def _collection_lock(jobs_dir: str, collection: Optional[str]):
+    """Exclusive lock per collection across worker processes, held for a whole job."""
+    name = collection or VectorDB.DEFAULT_COLLECTION
+    with open(os.path.join(jobs_dir, f"{name}.collection.lock"), "w") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        # Closing the file releases the lock
+        yield
+
+def _acquire(job_dir: str):
+    """Exclusive per-job lock, released by the OS if the worker dies."""
+    handle = open(os.path.join(job_dir, "lock"), "w")
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+def _read_job(job_dir: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(job_dir, "job.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _write_job(job_dir: str, job: dict):
+    job["updated"] = time.time()
+    tmp_path = os.path.join(job_dir, "job.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(job, f)
+    # Atomic swap so pollers never read a half-written status
+    os.replace(tmp_path, os.path.join(job_dir, "job.json"))
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Set, Tuple
+
+class IngestManifest:
+    """
+    Records the file and page hashes already in the knowledge base, per source file,
+    so unchanged uploads are skipped before extraction and embedding.
+    Dedup never crosses files: a page shared by two files is indexed (and cited) for
+    both, which the embedding cache makes nearly free, and deleting one file cannot
+    remove the other's content.
+    A known source uploaded with a new file hash is a revision: on commit its entries
+    are replaced by the new upload's, and revisions() names the stored pages to drop.
+    """
+    FILENAME = "manifest.json"
+    VERSION = 4
+
+    def __init__(self, index_path: str):
+        self.path = os.path.join(index_path, IngestManifest.FILENAME)
+        # source file name -> hashes ("" holds entries from older manifests without a source)
+        self.files: Dict[str, Set[str]] = {}
+        self.pages: Dict[str, Set[str]] = {}
+        self._pending_files: Dict[str, Set[str]] = {}
+        self._pending_pages: Dict[str, Set[str]] = {}
+        # Known pages a revision kept (skipped rather than re-indexed)
+        self._reused_pages: Dict[str, Set[str]] = {}
+        self.skipped_files = 0
+        self.skipped_pages = 0
+
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == IngestManifest.VERSION:
+                self.files = {source: set(hashes) for source, hashes in data["files"].items()}
+                self.pages = {source: set(hashes) for source, hashes in data["pages"].items()}
+            elif data.get("version") == 3:
+                # v3 chunks carry no page hash, so their pages cannot be kept across a revision
+                self.files = {source: set(hashes) for source, hashes in data["files"].items()}
+            else:
+                self.files = IngestManifest._by_source(data.get("files", {}))
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _by_source(entries) -> Dict[str, Set[str]]:
+        """Older manifests: a bare hash list (v1) or hash -> source (v2). Files only, as in v3."""
+        if isinstance(entries, list):
+            entries = dict.fromkeys(entries)
+        by_source = {}
+        for digest, source in entries.items():
+            by_source.setdefault(source or "", set()).add(digest)
+        return by_source
+
+    @staticmethod
+    def _check(known: Dict[str, Set[str]], pending: Dict[str, Set[str]], digest: str, source: Optional[str]) -> bool:
+        source = source or ""
+        # Entries without a source predate per-file dedup and still match any file
+        if digest in known.get(source, ()) or digest in known.get("", ()) or digest in pending.get(source, ()):
+            return False
+        pending.setdefault(source, set()).add(digest)
+        return True
+
+    def check_file(self, file_hash: str, source: str = None) -> bool:
+        """True unless this source already holds this file; staged so it is recorded on commit()."""
+        if IngestManifest._check(self.files, self._pending_files, file_hash, source):
+            return True
+        self.skipped_files += 1
+        return False
+
+    def check_page(self, page_hash: str, source: str = None) -> bool:
+        """True unless this source already holds this page; staged so it is recorded on commit()."""
+        if IngestManifest._check(self.pages, self._pending_pages, page_hash, source):
+            return True
+        if page_hash in self.pages.get(source or "", ()):
+            self._reused_pages.setdefault(source or "", set()).add(page_hash)
+        self.skipped_pages += 1
+        return False
+
+    def revisions(self) -> Dict[str, Tuple[Set[str], Set[str]]]:
+        """
+        Staged sources that replace an earlier upload: source -> (new file hashes, page hashes
+        of the new upload). Stored chunks of the source matching neither are stale.
+        """
+        return {
+            source: (hashes, self._pending_pages.get(source, set()) | self._reused_pages.get(source, set()))
+            for source, hashes in self._pending_files.items()
+            if source and self.files.get(source)
+        }
+
+    def reset(self):
+        """Forget everything (used when the knowledge base is rebuilt from scratch)."""
+        self.files, self.pages = {}, {}
+
+    def forget_source(self, source: str):
+        """Drops a deleted document's hashes, so re-uploading it is indexed again."""
+        self.files.pop(source, None)
+        self.pages.pop(source, None)
+        self.commit()
+
+    def commit(self):
+        """
+        Persists staged hashes. Call only after the index itself was saved, and after the
+        stale chunks of revisions() were deleted (VectorDB.commit_manifest does both).
+        """
+        for source, (file_hashes, page_hashes) in self.revisions().items():
+            self.files[source], self.pages[source] = set(file_hashes), set(page_hashes)
+            self._pending_files.pop(source)
+            self._pending_pages.pop(source, None)
+        for known, pending in ((self.files, self._pending_files), (self.pages, self._pending_pages)):
+            for source, hashes in pending.items():
+                known.setdefault(source, set()).update(hashes)
+        self._pending_files, self._pending_pages, self._reused_pages = {}, {}, {}
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": IngestManifest.VERSION,
+                "files": {source: sorted(hashes) for source, hashes in self.files.items()},
+                "pages": {source: sorted(hashes) for source, hashes in self.pages.items()},
+            }, f)
+        # Atomic swap so a crash never leaves a half-written manifest
+        os.replace(tmp_path, self.path)
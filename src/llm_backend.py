@@ -0,0 +1,93 @@
+import os
+import time
+from typing import Any, List, Optional
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.language_models.llms import LLM
+
+class LLMBackend:
+    """A generation backend: builds the LangChain model used by the RAG chain."""
+    name = ""
+    # Backends that call a hosted API need GOOGLE_API_KEY (or similar) configured
+    requires_api_key = False
+
+    def create_model(self) -> BaseLanguageModel:
+        raise NotImplementedError
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+    requires_api_key = True
+
+    MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+    def create_model(self) -> BaseLanguageModel:
+        # Imported here so offline backends never load the Google client
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        # Optimization: Temperature 0.1 for high determinism (Fact-focused)
+        return ChatGoogleGenerativeAI(
+            model=GeminiBackend.MODEL_NAME,
+            temperature=0.1,
+            max_retries=2,
+            transport="rest",
+            streaming=True
+        )
+
+class FakeStreamingLLM(LLM):
+    """
+    Offline stand-in for the hosted model: waits `first_token_latency`, then streams
+    `max_tokens` fixed tokens at `tokens_per_second`. Output depends only on the settings,
+    so runs are reproducible and generation cost is fully controlled.
+    """
+    first_token_latency: float = 0.3
+    tokens_per_second: float = 500.0
+    max_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        time.sleep(self.first_token_latency)
+        interval = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+        words = []
+        for i in range(self.max_tokens):
+            token = f"word{i} "
+            words.append(token)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            if interval:
+                time.sleep(interval)
+        return "".join(words)
+
+class FakeBackend(LLMBackend):
+    name = "fake"
+
+    FIRST_TOKEN_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.3"))
+    TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "500"))
+    MAX_TOKENS = int(os.getenv("FAKE_LLM_TOKENS", "60"))
+
+    def __init__(self, first_token_latency: float = None, tokens_per_second: float = None, max_tokens: int = None):
+        self.first_token_latency = FakeBackend.FIRST_TOKEN_LATENCY if first_token_latency is None else first_token_latency
+        self.tokens_per_second = tokens_per_second or FakeBackend.TOKENS_PER_SECOND
+        self.max_tokens = max_tokens or FakeBackend.MAX_TOKENS
+
+    def create_model(self) -> BaseLanguageModel:
+        return FakeStreamingLLM(
+            first_token_latency=self.first_token_latency,
+            tokens_per_second=self.tokens_per_second,
+            max_tokens=self.max_tokens
+        )
+
+class LLMBackends:
+    # Selected with LLM_BACKEND; "fake" runs the whole pipeline offline
+    DEFAULT = os.getenv("LLM_BACKEND", "gemini")
+    REGISTRY = {backend.name: backend for backend in (GeminiBackend, FakeBackend)}
+
+    @staticmethod
+    def get(name: str = None) -> LLMBackend:
+        name = name or LLMBackends.DEFAULT
+        if name not in LLMBackends.REGISTRY:
+            raise ValueError(f"Unknown LLM backend '{name}' (expected one of {sorted(LLMBackends.REGISTRY)})")
+        return LLMBackends.REGISTRY[name]()
@@ -1,55 +1,365 @@
-from typing import List
+import bisect
+import io
+import itertools
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
 from pypdf import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
+from src.embedding_engine import EmbeddingEngine
+from src.ingest_manifest import IngestManifest
+from src.tracing import Tracer
 import logging
 
 # Configure logging for enterprise auditing
 logging.basicConfig(level=logging.INFO)
 
+# Per-process cache of open readers, so a worker parses each file's xref only once
+_WORKER_READERS = {}
+# Per-process cache of text splitters (a token splitter holds a loaded tokenizer)
+_SPLITTERS = {}
+
+def _extract_page_range(path: str, name: str, start: int, stop: int, splitter: Optional[Tuple] = None):
+    """
+    Process-pool task: extracts pages [start, stop) of one PDF, and chunks them with the
+    given splitter settings (unit, size, overlap) if any.
+    Returns (page_hash, page_number, chunks or text) per non-empty page; corrupt pages are skipped.
+    """
+    try:
+        reader = _WORKER_READERS.get(path)
+        if reader is None:
+            reader = _WORKER_READERS[path] = PdfReader(path)
+    except Exception as e:
+        logging.error(f"Failed to read file {name}: {e}")
+        return []
+
+    # Settings come from the parent: forkserver (or spawned) workers don't see its class attributes
+    text_splitter = PDFHandler.get_text_splitter(*splitter) if splitter else None
+    results = []
+    for i in range(start, stop):
+        try:
+            text = reader.pages[i].extract_text()
+            if not text or not text.strip():
+                continue
+            payload = PDFHandler._chunk_page(text, i + 1, name, text_splitter) if text_splitter else text
+            results.append((IngestManifest.hash_text(text), i + 1, payload))
+        except Exception as e:
+            logging.warning(f"Skipping page {i+1} in {name} due to error: {e}")
+    return results
+
 class PDFHandler:
+    # Parallel extraction: number of worker processes (1 = serial, in-process)
+    EXTRACTION_WORKERS = int(os.getenv("PDF_EXTRACTION_WORKERS", "1"))
+    # Pages handed to a worker per task; small enough to balance, large enough to amortize IPC
+    PAGES_PER_TASK = 16
+
+    # "tokens": chunks are measured with the embedding model's tokenizer and never exceed its
+    # window (longer ones would be silently truncated); "chars": the v2.0 character splitter
+    CHUNK_UNIT = os.getenv("CHUNK_UNIT", "tokens")
+    CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", str(EmbeddingEngine.MAX_SEQ_LENGTH)))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "24"))
+    CHUNK_CHARS = 1000
+    CHUNK_OVERLAP_CHARS = 200
+    # Used when no tokenizer can be loaded (e.g. offline): chunks are sized in characters instead
+    CHARS_PER_TOKEN = 4
+    # Let a chunk continue onto the next page; it keeps its first page as "page" (plus "page_end")
+    CHUNK_ACROSS_PAGES = os.getenv("CHUNK_ACROSS_PAGES", "0") == "1"
+    # Consecutive pages joined before splitting, which bounds memory for long files
+    PAGES_PER_RUN = 16
+
+    @staticmethod
+    def get_text_splitter(unit: str = None, size: int = None, overlap: int = None):
+        """Splitter for the configured (or given) unit, chunk size and overlap; one per process."""
+        key = PDFHandler.splitter_settings(unit, size, overlap)
+        if key not in _SPLITTERS:
+            _SPLITTERS[key] = PDFHandler._build_text_splitter(*key)
+        return _SPLITTERS[key]
+
+    @staticmethod
+    def splitter_settings(unit: str = None, size: int = None, overlap: int = None) -> Tuple[str, int, int]:
+        """(unit, size, overlap) with the configured values filled in."""
+        unit = unit or PDFHandler.CHUNK_UNIT
+        if unit == "chars":
+            size = size or PDFHandler.CHUNK_CHARS
+            overlap = PDFHandler.CHUNK_OVERLAP_CHARS if overlap is None else overlap
+        else:
+            size = size or PDFHandler.CHUNK_TOKENS
+            overlap = PDFHandler.CHUNK_OVERLAP_TOKENS if overlap is None else overlap
+        return unit, size, overlap
+
     @staticmethod
-    def get_chunked_documents(pdf_docs: List) -> List[Document]:
+    def _build_text_splitter(unit: str, size: int, overlap: int):
+        separators = ["\n\n", "\n", " ", ""]  # improved splitting logic
+        if unit == "chars":
+            # Optimized splitter: standard chunk size for technical docs
+            return RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap, separators=separators)
+        if unit != "tokens":
+            raise ValueError(f"Unknown chunk unit '{unit}' (expected tokens or chars)")
+
+        # The model adds [CLS] and [SEP] to every input, so 2 positions of the window are taken
+        size = min(size, EmbeddingEngine.MAX_SEQ_LENGTH - 2)
+        try:
+            tokenizer = EmbeddingEngine.load_tokenizer()
+        except Exception as e:
+            logging.warning(f"Tokenizer unavailable ({e}); sizing chunks at ~{PDFHandler.CHARS_PER_TOKEN} characters per token")
+            return RecursiveCharacterTextSplitter(
+                chunk_size=size * PDFHandler.CHARS_PER_TOKEN,
+                chunk_overlap=overlap * PDFHandler.CHARS_PER_TOKEN,
+                separators=separators,
+            )
+        return RecursiveCharacterTextSplitter(
+            chunk_size=size,
+            chunk_overlap=overlap,
+            # Counted without special tokens: the splitter sums the lengths of the pieces it merges
+            length_function=lambda text: len(tokenizer.tokenize(text)),
+            separators=separators,
+        )
+
+    @staticmethod
+    def get_chunked_documents(pdf_docs: List, manifest: IngestManifest = None, workers: int = None) -> List[Document]:
         """
         Robustly processes PDFs page-by-page.
         Skips corrupt pages and logs errors instead of crashing.
+        With a manifest, files and pages already indexed are skipped.
+        With workers > 1, pages are extracted in a process pool (same order as serial).
         """
-        all_chunks = []
-        
-        # Optimized splitter: standard chunk size for technical docs
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            separators=["\n\n", "\n", " ", ""] # improved splitting logic
-        )
+        return list(PDFHandler.iter_chunked_documents(pdf_docs, manifest=manifest, workers=workers))
+
+    @staticmethod
+    def iter_chunked_documents(pdf_docs: List, manifest: IngestManifest = None, workers: int = None) -> Iterator[Document]:
+        """
+        Streaming variant: yields chunks as pages are extracted, so callers
+        can embed in batches without holding the whole corpus in memory.
+        """
+        workers = workers or PDFHandler.EXTRACTION_WORKERS
+        text_splitter = PDFHandler.get_text_splitter()
+        # Across pages, chunking waits for the following pages; otherwise each page is chunked on its own
+        chunk_pages = not PDFHandler.CHUNK_ACROSS_PAGES
 
+        if workers > 1:
+            splitter = PDFHandler.splitter_settings() if chunk_pages else None
+            pages = PDFHandler._iter_pages_parallel(pdf_docs, manifest, workers, splitter)
+        else:
+            pages = PDFHandler._iter_pages(pdf_docs, manifest, text_splitter if chunk_pages else None)
+
+        if not chunk_pages:
+            yield from PDFHandler._chunk_runs(pages, text_splitter)
+            return
+        for _, _, _, page_chunks in pages:
+            if page_chunks:
+                yield from page_chunks
+
+    @staticmethod
+    def _iter_pages(pdf_docs: List, manifest: IngestManifest, text_splitter=None) -> Iterator[Tuple[str, str, int, object]]:
+        """
+        Serial extraction. Yields (source, file_hash, page_number, chunks) per new page, or the
+        page text instead of chunks without a splitter; None marks a page skipped as already indexed.
+        Pages are only skipped when chunked one by one (see _page_dedup).
+        """
         for pdf in pdf_docs:
             try:
-                pdf_reader = PdfReader(pdf)
-                
-                for i, page in enumerate(pdf_reader.pages):
-                    try:
-                        text = page.extract_text()
-                        
-                        # Optimization: Skip empty or whitespace-only pages
-                        if not text or not text.strip():
-                            continue
-                            
-                        # Metadata injection for citation accuracy
-                        page_doc = Document(
-                            page_content=text, 
-                            metadata={"page": i + 1, "source": pdf.name}
-                        )
-                        
-                        page_chunks = text_splitter.split_documents([page_doc])
-                        all_chunks.extend(page_chunks)
-                        
-                    except Exception as e:
-                        logging.warning(f"Skipping page {i+1} in {pdf.name} due to error: {e}")
-                        continue
-                        
+                data = PDFHandler._read_bytes(pdf)
+                file_hash = IngestManifest.hash_bytes(data)
+                pdf_reader = PdfReader(io.BytesIO(data))
+                num_pages = len(pdf_reader.pages)
+
+                # Dedup: the same file was already ingested under this name. Checked once the file
+                # parsed, so an unreadable upload is never recorded as ingested
+                if manifest and not manifest.check_file(file_hash, pdf.name):
+                    logging.info(f"Skipping {pdf.name}: already in knowledge base")
+                    continue
+
             except Exception as e:
                 logging.error(f"Failed to read file {pdf.name}: {e}")
                 continue
+
+            for i in range(num_pages):
+                try:
+                    with Tracer.stage("pdf_extraction"):
+                        text = pdf_reader.pages[i].extract_text()
+                    Tracer.count("pages")
                     
-        return all_chunks
\ No newline at end of file
+                    # Optimization: Skip empty or whitespace-only pages
+                    if not text or not text.strip():
+                        continue
+
+                    # Dedup: unchanged pages of a revised file (same name) are not re-embedded
+                    page_hash = IngestManifest.hash_text(text)
+                    if PDFHandler._page_dedup(manifest, text_splitter) and not manifest.check_page(page_hash, pdf.name):
+                        yield pdf.name, file_hash, i + 1, None
+                        continue
+
+                    if text_splitter is None:
+                        yield pdf.name, file_hash, i + 1, text
+                        continue
+
+                    with Tracer.stage("chunking"):
+                        page_chunks = PDFHandler._chunk_page(text, i + 1, pdf.name, text_splitter)
+                    Tracer.count("chunks", len(page_chunks))
+                    
+                except Exception as e:
+                    logging.warning(f"Skipping page {i+1} in {pdf.name} due to error: {e}")
+                    continue
+
+                yield pdf.name, file_hash, i + 1, PDFHandler._stamp(page_chunks, file_hash, page_hash)
+
+    @staticmethod
+    def _iter_pages_parallel(pdf_docs: List, manifest: IngestManifest, workers: int, splitter: Optional[Tuple] = None) -> Iterator[Tuple[str, int, object]]:
+        """
+        Fans page ranges out to a process pool. Uploads are spilled to a temp dir
+        so workers open files by path instead of receiving the bytes with every task.
+        Only a small window of tasks is in flight, keeping memory bounded.
+        Workers chunk too when given splitter settings (see splitter_settings).
+        Yields the same (source, file_hash, page_number, chunks or text or None) as _iter_pages.
+        """
+        tasks = []
+        file_hashes = {}
+        spill_dir = tempfile.mkdtemp(prefix="rag_extract_")
+
+        try:
+            for file_idx, pdf in enumerate(pdf_docs):
+                try:
+                    data = PDFHandler._read_bytes(pdf)
+                    path = os.path.join(spill_dir, f"{file_idx}.pdf")
+                    with open(path, "wb") as f:
+                        f.write(data)
+
+                    num_pages = len(PdfReader(path).pages)
+                    # Checked once the file parsed (see _iter_pages)
+                    file_hashes[path] = IngestManifest.hash_bytes(data)
+                    if manifest and not manifest.check_file(file_hashes[path], pdf.name):
+                        logging.info(f"Skipping {pdf.name}: already in knowledge base")
+                        continue
+
+                    for start in range(0, num_pages, PDFHandler.PAGES_PER_TASK):
+                        stop = min(start + PDFHandler.PAGES_PER_TASK, num_pages)
+                        tasks.append((path, pdf.name, start, stop, splitter))
+
+                except Exception as e:
+                    logging.error(f"Failed to read file {pdf.name}: {e}")
+                    continue
+
+            with ProcessPoolExecutor(max_workers=workers, mp_context=PDFHandler._pool_context()) as pool:
+                pending = deque()
+                task_iter = iter(tasks)
+
+                # Sliding window: results are consumed in submission order (deterministic)
+                for task in itertools.islice(task_iter, workers * 2):
+                    pending.append((task[1], file_hashes[task[0]], pool.submit(_extract_page_range, *task)))
+
+                while pending:
+                    name, file_hash, future = pending.popleft()
+                    # Workers extract and chunk; here we only see the time spent waiting on them
+                    with Tracer.stage("pdf_extraction"):
+                        page_results = future.result()
+                    for task in itertools.islice(task_iter, 1):
+                        pending.append((task[1], file_hashes[task[0]], pool.submit(_extract_page_range, *task)))
+
+                    Tracer.count("pages", len(page_results))
+                    for page_hash, page_number, payload in page_results:
+                        if PDFHandler._page_dedup(manifest, splitter) and not manifest.check_page(page_hash, name):
+                            yield name, file_hash, page_number, None
+                            continue
+                        if splitter:
+                            Tracer.count("chunks", len(payload))
+                            payload = PDFHandler._stamp(payload, file_hash, page_hash)
+                        yield name, file_hash, page_number, payload
+        finally:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    @staticmethod
+    def _pool_context():
+        """
+        Forkserver, not fork: the callers (Streamlit, uvicorn, job workers running torch) are
+        multithreaded. The server process imports this module once, so workers start fast.
+        """
+        if "forkserver" not in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context("spawn")
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+
+    @staticmethod
+    def _chunk_runs(pages: Iterator[Tuple[str, str, int, Optional[str]]], text_splitter) -> Iterator[Document]:
+        """
+        Chunks runs of consecutive new pages of a file as one text, so a chunk can continue
+        onto the next page. A skipped page, a new file or PAGES_PER_RUN pages end a run.
+        """
+        run, source = [], None
+        for name, file_hash, page_number, text in pages:
+            if run and (text is None or (name, file_hash) != source or len(run) >= PDFHandler.PAGES_PER_RUN):
+                yield from PDFHandler._chunk_run(run, *source, text_splitter)
+                run = []
+            if text is not None:
+                run.append((page_number, text))
+                source = (name, file_hash)
+        if run:
+            yield from PDFHandler._chunk_run(run, *source, text_splitter)
+
+    @staticmethod
+    def _chunk_run(run: List[Tuple[int, str]], source: str, file_hash: str, text_splitter) -> List[Document]:
+        # A line break, not a paragraph break: the splitter may then merge across the page boundary
+        separator = "\n"
+        texts = [text.strip() for _, text in run]
+        # Offset of each page's first character in the joined text
+        starts, offset = [], 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + len(separator)
+
+        with Tracer.stage("chunking"):
+            joined = separator.join(texts)
+            chunks, cursor = [], 0
+            for piece in text_splitter.split_text(joined):
+                # Splitters strip whitespace, so locate each piece to recover its pages
+                position = joined.find(piece, cursor)
+                if position == -1:
+                    position = cursor
+                cursor = position + 1
+                first = run[bisect.bisect_right(starts, position) - 1][0]
+                last = run[bisect.bisect_right(starts, position + len(piece) - 1) - 1][0]
+                metadata = {"page": first, "source": source, "file_hash": file_hash}
+                if last != first:
+                    metadata["page_end"] = last
+                chunks.append(Document(page_content=piece, metadata=metadata))
+        Tracer.count("chunks", len(chunks))
+        return chunks
+
+    @staticmethod
+    def _chunk_page(text: str, page_number: int, source: str, text_splitter) -> List[Document]:
+        # Metadata injection for citation accuracy
+        page_doc = Document(
+            page_content=text, 
+            metadata={"page": page_number, "source": source}
+        )
+        return text_splitter.split_documents([page_doc])
+
+    @staticmethod
+    def _page_dedup(manifest: Optional[IngestManifest], splitter) -> bool:
+        """
+        Known pages are skipped only when pages are chunked one by one. Across pages, a kept
+        chunk could still carry text of a neighbouring page that changed, so a revised file is
+        re-chunked whole (its unchanged chunks are still served from the embedding cache).
+        """
+        return manifest is not None and splitter is not None
+
+    @staticmethod
+    def _stamp(chunks: List[Document], file_hash: str, page_hash: str) -> List[Document]:
+        """Records the upload and page each chunk came from, so a later revision can replace them."""
+        for chunk in chunks:
+            chunk.metadata["file_hash"] = file_hash
+            chunk.metadata["page_hash"] = page_hash
+        return chunks
+
+    @staticmethod
+    def _read_bytes(pdf) -> bytes:
+        """Streamlit uploads expose getvalue(); plain file objects are read from the start."""
+        if hasattr(pdf, "getvalue"):
+            return pdf.getvalue()
+        pdf.seek(0)
+        return pdf.read()
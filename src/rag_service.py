@@ -0,0 +1,190 @@
+import asyncio
+import io
+import logging
+import time
+from typing import AsyncIterator, Iterable, List
+from langchain.docstore.document import Document
+from src.index_lock import IndexWriteLock
+from src.pdf_handler import PDFHandler
+from src.vector_db import VectorDB
+from src.rag_chain import RAGChain
+from src.answer_cache import SemanticAnswerCache
+from src.tracing import Trace, Tracer
+
+class _QueueStream:
+    """Callback that forwards tokens from AsyncQueryEngine.aquery into a queue."""
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+
+    async def on_llm_new_token(self, token: str, **kwargs) -> None:
+        await self.queue.put(token)
+
+class RAGService:
+    """
+    Headless ingestion + query facade over PDFHandler, VectorDB and RAGChain.
+    Used by the REST API and batch mode; holds no per-user state, so any number of
+    service processes can run side by side over the same index directory.
+    """
+    DEFAULT_K = 3
+    BATCH_CONCURRENCY = 8
+
+    def __init__(self, k: int = None):
+        self.k = k or RAGService.DEFAULT_K
+        self.answer_cache = SemanticAnswerCache.shared()
+
+    @staticmethod
+    def vector_store(collection: str = None):
+        # Resolved per call: the shared registry follows index changes made by other processes
+        return VectorDB.load_vector_store(VectorDB.collection_path(collection))
+
+    @staticmethod
+    def list_collections() -> List[str]:
+        return VectorDB.list_collections()
+
+    @staticmethod
+    def as_upload(name: str, data: bytes):
+        """Wraps raw bytes in the file-like shape PDFHandler expects from Streamlit uploads."""
+        upload = io.BytesIO(data)
+        upload.name = name
+        return upload
+
+    def ingest(self, pdf_docs: List, mode: str = "append", collection: str = None) -> dict:
+        """Chunks, embeds and persists uploads into a collection; returns counts for the caller to report."""
+        if mode not in ("append", "rebuild"):
+            raise ValueError(f"Unknown ingestion mode '{mode}' (expected append or rebuild)")
+        index_path = VectorDB.collection_path(collection)
+
+        # One writer per index across every process (API workers and ingestion jobs); readers never wait on it
+        with IndexWriteLock.hold(index_path), Trace("ingestion", mode=mode, collection=collection or VectorDB.DEFAULT_COLLECTION) as trace:
+            started = time.perf_counter()
+            manifest = VectorDB.get_manifest(index_path)
+            if mode == "rebuild":
+                manifest.reset()
+
+            progress = {"batches": 0, "chunks": 0}
+
+            def on_batch(batch_no, chunk_count):
+                progress["batches"], progress["chunks"] = batch_no, chunk_count
+
+            chunk_stream = PDFHandler.iter_chunked_documents(pdf_docs, manifest=manifest)
+            if mode == "append":
+                VectorDB.append_to_vector_store(RAGService.vector_store(collection), chunk_stream, on_batch=on_batch, index_path=index_path)
+            else:
+                VectorDB.rebuild_vector_store(chunk_stream, on_batch=on_batch, index_path=index_path)
+
+            # A revision that only dropped pages embeds nothing but still replaces the old upload
+            if progress["chunks"] or manifest.revisions():
+                VectorDB.commit_manifest(manifest, index_path)
+
+        return {
+            "chunks": progress["chunks"],
+            "batches": progress["batches"],
+            "skipped_files": manifest.skipped_files,
+            "skipped_pages": manifest.skipped_pages,
+            "seconds": time.perf_counter() - started,
+            "trace": trace.to_dict(),
+        }
+
+    def list_documents(self, collection: str = None) -> List[str]:
+        store = RAGService.vector_store(collection)
+        return VectorDB.list_documents(store) if store else []
+
+    def delete_document(self, source: str, collection: str = None) -> int:
+        store = RAGService.vector_store(collection)
+        if not store:
+            return 0
+        return VectorDB.delete_documents(store, source)
+
+    async def aquery(self, query: str, callbacks: list = None, collections: List[str] = None) -> dict:
+        """
+        Answers one question from one or several collections (default: the default collection).
+        The semantic answer cache is consulted first.
+        """
+        stores = VectorDB.load_collections(collections or [VectorDB.DEFAULT_COLLECTION])
+        if not stores:
+            raise LookupError("Knowledge base is empty; ingest documents first")
+        # Several collections are searched as one, with their rankings fused
+        store = stores[0] if len(stores) == 1 else stores
+
+        with Trace("query") as trace:
+            response = await self._aquery(store, query, callbacks)
+        response["trace"] = trace.to_dict()
+        return response
+
+    async def _aquery(self, store, query: str, callbacks: list = None) -> dict:
+        started = time.perf_counter()
+        index_version = VectorDB.get_index_version(store)
+        with Tracer.stage("answer_cache_lookup"):
+            query_vector = await asyncio.to_thread(VectorDB.get_embedding_model().embed_query, query)
+            cached = self.answer_cache.lookup(query, query_vector, index_version)
+        if cached:
+            for handler in callbacks or []:
+                outcome = handler.on_llm_new_token(cached.answer)
+                if asyncio.iscoroutine(outcome):
+                    await outcome
+            return {
+                "query": query,
+                "result": cached.answer,
+                "source_documents": cached.source_documents,
+                "cached": True,
+                "timings": {"total": time.perf_counter() - started},
+            }
+
+        engine = RAGChain.get_query_engine(store, index_version, k=self.k)
+        response = await engine.aquery(query, callbacks=callbacks)
+        self.answer_cache.store(
+            query, query_vector, index_version, response["result"], response["source_documents"], time.perf_counter() - started
+        )
+        response["cached"] = False
+        return response
+
+    async def astream(self, query: str, collections: List[str] = None) -> AsyncIterator[str]:
+        """Yields answer tokens as they are generated (a cached answer arrives as one token)."""
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def run():
+            try:
+                return await self.aquery(query, callbacks=[_QueueStream(queue)], collections=collections)
+            finally:
+                await queue.put(done)
+
+        task = asyncio.create_task(run())
+        while (token := await queue.get()) is not done:
+            yield token
+        # Surfaces query errors to the caller
+        await task
+
+    async def abatch(self, questions: Iterable[str], concurrency: int = None, collections: List[str] = None) -> List[dict]:
+        """
+        Answers a set of questions with at most `concurrency` in flight.
+        Results keep the input order; a failed question carries its error instead of an answer.
+        """
+        limit = asyncio.Semaphore(concurrency or RAGService.BATCH_CONCURRENCY)
+
+        async def answer(question: str) -> dict:
+            async with limit:
+                try:
+                    return await self.aquery(question, collections=collections)
+                except Exception as e:
+                    logging.error(f"Batch question failed: {question!r}: {e}")
+                    return {"query": question, "error": str(e)}
+
+        return await asyncio.gather(*(answer(q) for q in questions))
+
+    @staticmethod
+    def serialize(response: dict) -> dict:
+        """JSON-safe view of a query response."""
+        out = {k: v for k, v in response.items() if k != "source_documents"}
+        out["sources"] = [RAGService._serialize_doc(doc) for doc in response.get("source_documents", [])]
+        return out
+
+    @staticmethod
+    def _serialize_doc(doc: Document) -> dict:
+        return {
+            "source": doc.metadata.get("source"),
+            "page": doc.metadata.get("page"),
+            # Last page for chunks that continue across pages (CHUNK_ACROSS_PAGES)
+            "page_end": doc.metadata.get("page_end", doc.metadata.get("page")),
+            "text": doc.page_content,
+        }
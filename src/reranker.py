@@ -0,0 +1,83 @@
+import logging
+import os
+import time
+from typing import Any, List
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from src.tracing import Tracer
+
+class CrossEncoderReranker:
+    """
+    Reorders retrieval candidates with a small CPU cross-encoder.
+    Candidates are scored in batches against a latency budget; if the budget runs
+    out before every candidate is scored, the original (retrieval) order is kept.
+    """
+    MODEL_NAME = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    # Wall-clock budget per query, in milliseconds
+    TIME_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))
+    # Cross-encoders are quadratic in input length; long chunks are truncated
+    MAX_LENGTH = 512
+
+    def __init__(self, model_name: str = None, batch_size: int = None, time_budget_ms: float = None):
+        # Heavy import deferred until a reranker is actually built
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name or CrossEncoderReranker.MODEL_NAME
+        self.batch_size = batch_size or CrossEncoderReranker.BATCH_SIZE
+        self.time_budget_ms = CrossEncoderReranker.TIME_BUDGET_MS if time_budget_ms is None else time_budget_ms
+        self.model = CrossEncoder(self.model_name, device="cpu", max_length=CrossEncoderReranker.MAX_LENGTH)
+
+        # Reporting
+        self.queries = 0
+        self.fallbacks = 0
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        """Relevance scores for (query, text) pairs, higher is better."""
+        return np.asarray(self.model.predict([(query, t) for t in texts], batch_size=len(texts), show_progress_bar=False))
+
+    def rerank(self, query: str, documents: List[Document], k: int) -> List[Document]:
+        """Top-k documents by cross-encoder score, or the first k unchanged if over budget."""
+        self.queries += 1
+        if len(documents) <= 1:
+            return documents[:k]
+
+        started = time.perf_counter()
+        deadline = started + self.time_budget_ms / 1000
+        scores = []
+        for start in range(0, len(documents), self.batch_size):
+            # Checked between batches: a batch already running is never interrupted
+            if start and time.perf_counter() > deadline:
+                self.fallbacks += 1
+                Tracer.count("rerank_fallbacks")
+                logging.warning(f"Rerank budget of {self.time_budget_ms:.0f} ms exceeded after {start}/{len(documents)} candidates; keeping retrieval order")
+                return documents[:k]
+            batch = documents[start:start + self.batch_size]
+            scores.append(self.score(query, [doc.page_content for doc in batch]))
+
+        if time.perf_counter() > deadline:
+            # Scored, but late: the result is still the better ordering, so keep it
+            logging.info(f"Rerank finished {(time.perf_counter() - deadline) * 1000:.0f} ms over budget")
+
+        # Stable sort: ties keep retrieval order
+        order = np.argsort(-np.concatenate(scores), kind="stable")
+        return [documents[i] for i in order[:k]]
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Wraps a retriever that returns a wide candidate set and keeps the k best after reranking.
+    The prompt still receives k chunks; only recall before the cut improves.
+    """
+    base_retriever: Any
+    reranker: Any
+    k: int = 3
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        candidates = self.base_retriever.invoke(query)
+        with Tracer.stage("rerank"):
+            return self.reranker.rerank(query, candidates, self.k)
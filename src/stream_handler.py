@@ -0,0 +1,82 @@
+import os
+import time
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+class StreamHandler(BaseCallbackHandler):
+    """
+    Renders a streamed answer into a Streamlit container.
+    Tokens are coalesced into frames (one render per FRAME_INTERVAL_MS, or sooner once
+    FRAME_CHARS are pending), and finished paragraphs are written once into their own
+    element, so a frame only re-sends the paragraph still being written.
+    """
+    FRAME_INTERVAL_MS = float(os.getenv("STREAM_FRAME_MS", "100"))
+    FRAME_CHARS = int(os.getenv("STREAM_FRAME_CHARS", "400"))
+    CURSOR = "▌"
+
+    def __init__(self, container, initial_text: str = "", frame_interval_ms: float = None, frame_chars: int = None):
+        self.container = container
+        self.frame_interval = (StreamHandler.FRAME_INTERVAL_MS if frame_interval_ms is None else frame_interval_ms) / 1000
+        self.frame_chars = StreamHandler.FRAME_CHARS if frame_chars is None else frame_chars
+
+        # Paragraphs already rendered for good, and the parts of the one being written
+        self._frozen = []
+        self._tail = [initial_text] if initial_text else []
+        self._pending = 0
+        self._last_frame = 0.0
+        self._live = container.empty()
+        self.finished = False
+
+        # Reporting
+        self.tokens = 0
+        self.renders = 0
+        self.bytes_rendered = 0
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(self._frozen + ["".join(self._tail)])
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        # Optimization: appending to a list is O(1); the string is only joined once per frame
+        self._tail.append(token)
+        self._pending += len(token)
+        self.tokens += 1
+
+        now = time.perf_counter()
+        if self._pending >= self.frame_chars or now - self._last_frame >= self.frame_interval:
+            self._render(StreamHandler.CURSOR)
+            self._last_frame = now
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        self.finish()
+
+    def finish(self):
+        """Flushes whatever is still pending and drops the cursor; safe to call twice."""
+        if not self.finished:
+            self._render("")
+            self.finished = True
+
+    def _render(self, cursor: str):
+        tail = "".join(self._tail)
+        cut = StreamHandler._paragraph_end(tail)
+        if cut != -1:
+            # The finished paragraphs never change again: render them once and move on
+            self._frozen.append(tail[:cut])
+            self._write(self._live, tail[:cut])
+            self._live = self.container.empty()
+            tail = tail[cut + 2:]
+        self._tail = [tail]
+        self._pending = 0
+        self._write(self._live, tail + cursor)
+
+    @staticmethod
+    def _paragraph_end(text: str) -> int:
+        """Last blank line that is safe to split the markdown at (not inside a code fence), or -1."""
+        cut = text.rfind("\n\n")
+        while cut != -1 and text.count("```", 0, cut) % 2:
+            cut = text.rfind("\n\n", 0, cut)
+        return cut
+
+    def _write(self, element, text: str):
+        element.markdown(text)
+        self.renders += 1
+        self.bytes_rendered += len(text.encode("utf-8"))
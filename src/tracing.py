@@ -0,0 +1,188 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# Structured trace records go to their own logger, one JSON object per line
+trace_logger = logging.getLogger("rag.trace")
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("rag_trace", default=None)
+
+def _rss_mb() -> Optional[float]:
+    """Current resident set size; None where /proc is unavailable (memory is simply not reported)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+class _RssSampler:
+    """
+    Samples RSS while any trace is open, so each trace reports the peak reached during it.
+    (ru_maxrss would be the peak of the whole process lifetime, usually set by an earlier ingest.)
+    """
+    INTERVAL = float(os.getenv("TRACE_RSS_SAMPLE_MS", "10")) / 1000
+    _active = set()
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def register(trace: "Trace"):
+        with _RssSampler._lock:
+            _RssSampler._active.add(trace)
+            if _RssSampler._thread is None:
+                _RssSampler._thread = threading.Thread(target=_RssSampler._run, name="rag-rss-sampler", daemon=True)
+                _RssSampler._thread.start()
+
+    @staticmethod
+    def unregister(trace: "Trace"):
+        with _RssSampler._lock:
+            _RssSampler._active.discard(trace)
+
+    @staticmethod
+    def _run():
+        while True:
+            rss = _rss_mb()
+            with _RssSampler._lock:
+                if not _RssSampler._active or rss is None:
+                    # Started again by the next trace
+                    _RssSampler._thread = None
+                    return
+                for trace in _RssSampler._active:
+                    trace.observe_rss(rss)
+            time.sleep(_RssSampler.INTERVAL)
+
+class Trace:
+    """
+    Per-operation record of stage timings, counters and the peak RSS sampled while it ran.
+    Entering a trace makes it current, so instrumented code anywhere below
+    (including thread-pool work started via Tracer.bind) reports into it.
+    Stages accumulate: a stage hit once per batch reports its total time.
+    """
+    def __init__(self, kind: str, **attributes):
+        self.kind = kind
+        self.attributes = attributes
+        self.stages: "OrderedDict[str, float]" = OrderedDict()
+        self.counters: Dict[str, int] = {}
+        self.total = 0.0
+        self._lock = threading.Lock()
+        self._token = None
+
+    def __enter__(self) -> "Trace":
+        self._started = time.perf_counter()
+        self._rss_before = self._rss_peak = _rss_mb()
+        if self._rss_before is not None:
+            _RssSampler.register(self)
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self._token)
+        self.finish(error=repr(exc) if exc else None)
+        return False
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def count(self, counter: str, n: int = 1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def observe_rss(self, rss_mb: float):
+        self._rss_peak = max(self._rss_peak, rss_mb)
+
+    def finish(self, error: str = None):
+        self.total = time.perf_counter() - self._started
+        _RssSampler.unregister(self)
+        if self._rss_before is not None:
+            self.observe_rss(_rss_mb() or self._rss_before)
+        # Process-wide RSS: traces running at the same time see each other's allocations
+        self.peak_rss_mb = self._rss_peak
+        self.peak_rss_growth_mb = (self._rss_peak - self._rss_before) if self._rss_before is not None else None
+        self.error = error
+
+        TraceMetrics.record(self)
+        trace_logger.info(json.dumps(self.to_dict()))
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            **self.attributes,
+            "total_ms": round(self.total * 1000, 2),
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+            "counters": dict(self.counters),
+            "peak_rss_mb": self.peak_rss_mb,
+            "peak_rss_growth_mb": self.peak_rss_growth_mb,
+            **({"error": self.error} if self.error else {}),
+        }
+
+class Tracer:
+    """Instrumentation hooks; all are no-ops when no trace is active."""
+
+    @staticmethod
+    def current() -> Optional[Trace]:
+        return _current_trace.get()
+
+    @staticmethod
+    @contextmanager
+    def stage(name: str):
+        trace = _current_trace.get()
+        if trace is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace.add(name, time.perf_counter() - started)
+
+    @staticmethod
+    def add(name: str, seconds: float):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, seconds)
+
+    @staticmethod
+    def count(counter: str, n: int = 1):
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.count(counter, n)
+
+    @staticmethod
+    def bind(fn: Callable, *args) -> Callable[[], object]:
+        """Zero-arg callable running fn(*args) in the caller's context (for executors)."""
+        context = contextvars.copy_context()
+        return lambda: context.run(fn, *args)
+
+class TraceMetrics:
+    """Process-wide per-stage aggregates of every finished trace (count / total / max)."""
+    _stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def record(trace: Trace):
+        with TraceMetrics._lock:
+            kind = TraceMetrics._stats.setdefault(trace.kind, {})
+            for name, seconds in list(trace.stages.items()) + [("total", trace.total)]:
+                stat = kind.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+                stat["count"] += 1
+                stat["total_s"] += seconds
+                stat["max_s"] = max(stat["max_s"], seconds)
+
+    @staticmethod
+    def snapshot() -> dict:
+        with TraceMetrics._lock:
+            return {
+                kind: {
+                    name: {**stat, "mean_ms": stat["total_s"] / stat["count"] * 1000}
+                    for name, stat in stages.items()
+                }
+                for kind, stages in TraceMetrics._stats.items()
+            }
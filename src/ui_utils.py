@@ -1,4 +1,3 @@
-import requests
 import streamlit as st
 
 class UIUtils:
@@ -7,6 +6,8 @@ class UIUtils:
         """
         Uses the 'requests' library to load Lottie animations.
         """
+        # Deferred: only needed when an animation is actually loaded
+        import requests
         try:
             r = requests.get(url)
             if r.status_code != 200:
@@ -269,4 +270,19 @@ class UIUtils:
             <div class="source-header">Page {page}</div>
             <div class="source-text">"...{text}..."</div>
         </div>
-        """
\ No newline at end of file
+        """
+    @staticmethod
+    def render_timings(trace):
+        """
+        Renders the per-stage timing breakdown of a traced answer (markdown table).
+        """
+        total = trace["total_ms"] or 1
+        rows = ["| Stage | ms | Share |", "| :--- | ---: | ---: |"]
+        for stage, ms in trace["stages_ms"].items():
+            rows.append(f"| {stage.replace('_', ' ')} | {ms:.1f} | {ms / total:.0%} |")
+        rows.append(f"| **total** | **{trace['total_ms']:.1f}** | |")
+
+        details = [f"{name.replace('_', ' ')}: {value}" for name, value in trace["counters"].items()]
+        if trace.get("peak_rss_mb") is not None:
+            details.append(f"peak memory: {trace['peak_rss_mb']:.0f} MB (+{trace['peak_rss_growth_mb']:.0f} MB)")
+        return "\n".join(rows) + ("\n\n" + " · ".join(details) if details else "")
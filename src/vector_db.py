@@ -1,39 +1,621 @@
+import itertools
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import uuid
+from typing import Callable, Iterable, Iterator, List, Set, Tuple
 import streamlit as st
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-# FIX: Import from community (compatible with your current installation)
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from src.chunk_store import ChunkStore, PositionIndex
+from src.context_builder import ContextBuilder, PackedContextRetriever
+from src.embedding_cache import CachedEmbeddings
+from src.embedding_engine import EmbeddingEngine
+from src.hybrid_search import HybridRetriever, MultiCollectionRetriever
+from src.index_factory import IndexFactory
+from src.index_lock import IndexWriteLock
+from src.index_registry import IndexRegistry
+from src.reranker import CrossEncoderReranker, RerankingRetriever
+from src.ingest_manifest import IngestManifest
+from src.tracing import Tracer
+
+class ChunkStoreFAISS(FAISS):
+    """
+    FAISS store backed by a ChunkStore: the top-k hits are fetched in one
+    batched read and chunks of deleted documents are skipped.
+    """
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, filter=None, fetch_k: int = 20, **kwargs):
+        vector = np.array([embedding], dtype=np.float32)
+        if self._normalize_L2:
+            faiss.normalize_L2(vector)
+
+        hits = self._live_search(vector, k if filter is None else fetch_k)
+        with Tracer.stage("chunk_fetch"):
+            found = self.docstore.get_by_positions([position for position, _ in hits])
+
+        filter_func = self._create_filter_func(filter) if filter is not None else None
+        docs = []
+        for position, score in hits:
+            doc = found.get(position)
+            if doc is None:
+                continue
+            if filter_func is None or filter_func(doc.metadata):
+                docs.append((doc, score))
+
+        score_threshold = kwargs.get("score_threshold")
+        if score_threshold is not None:
+            # L2 distance: lower is more similar
+            docs = [(doc, score) for doc, score in docs if score <= score_threshold]
+        return docs[:k]
+
+    def dense_positions(self, query: str, k: int) -> List[int]:
+        """FAISS positions of the k nearest chunks (deleted ones may be included)."""
+        with Tracer.stage("query_embedding"):
+            vector = np.array([self.embedding_function.embed_query(query)], dtype=np.float32)
+        return [position for position, _ in self._live_search(vector, k)]
+
+    def _live_search(self, vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """
+        (position, score) of the k nearest chunks that are not deleted. The first round is
+        sized from the share of deleted positions, and rounds double until k survive, so a
+        large deletion never makes every query fetch (and decode) thousands of extra rows.
+        """
+        ntotal, tombstones = self.index.ntotal, self.docstore.tombstones
+        k = max(k, 1)
+        search_k = min(ntotal, math.ceil(k * ntotal / max(ntotal - tombstones, 1)))
+        while True:
+            with Tracer.stage("vector_search"):
+                scores, indices = self.index.search(vector, max(search_k, 1))
+            hits = [(int(i), score) for i, score in zip(indices[0], scores[0]) if i != -1]
+            if tombstones:
+                # Reads the position index only: no chunk text or metadata
+                live = set(self.docstore.live_positions([position for position, _ in hits]))
+                hits = [(position, score) for position, score in hits if position in live]
+            if len(hits) >= k or search_k >= ntotal:
+                return hits[:k]
+            search_k = min(ntotal, search_k * 2)
 
 class VectorDB:
+    # Index directory of the default collection (also where v2.0 stored its single index)
     INDEX_PATH = "faiss_index"
+    # Named collections live side by side under this directory
+    COLLECTIONS_DIR = os.getenv("COLLECTIONS_DIR", "collections")
+    DEFAULT_COLLECTION = "default"
+    COLLECTION_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}")
+    EMBEDDING_MODEL = EmbeddingEngine.MODEL_NAME
+    # Records which embedding model/backend produced an index's vectors
+    EMBEDDING_FILE = "embedding.json"
+    # Appended uploads are persisted as small delta segments next to the base index
+    DELTA_DIR = "deltas"
+    # Fold deltas back into the base index once this many have accumulated
+    MAX_DELTAS = 20
+    # Streaming ingestion: chunks embedded and added to the index per batch
+    INGEST_BATCH_SIZE = 256
+    # Memory-map the saved index read-only instead of reading it into each process
+    MMAP_INDEX = os.getenv("FAISS_MMAP", "1") == "1"
+    # Fuse BM25 with vector search (exact matches on part numbers, clause IDs, acronyms)
+    HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+    # Cross-encoder reranking of a wider candidate set down to k (off by default: extra model)
+    RERANK = os.getenv("RERANK", "0") == "1"
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+    # Pack merged, de-duplicated chunks up to a token budget instead of a fixed k
+    CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "1") == "1"
 
     @staticmethod
     @st.cache_resource
     def get_embedding_model():
-        # This works with your installed libraries
-        return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        # Batched CPU engine (backend, batch size and threads configurable via env)
+        embeddings = EmbeddingEngine()
+        # Optimization: previously embedded chunks are served from the on-disk cache
+        return CachedEmbeddings(embeddings, model_name=embeddings.identity)
 
     @staticmethod
-    def create_vector_store(documents):
+    @st.cache_resource
+    def get_reranker():
+        # Loaded once per process, and only when reranking is enabled
+        return CrossEncoderReranker()
+
+    @staticmethod
+    @st.cache_resource
+    def get_registry():
+        # One registry per process: every session shares the resident indexes
+        return IndexRegistry()
+
+    @staticmethod
+    def collection_path(name: str = None) -> str:
+        """Index directory of a collection; the default collection keeps the original location."""
+        name = name or VectorDB.DEFAULT_COLLECTION
+        if name == VectorDB.DEFAULT_COLLECTION:
+            return VectorDB.INDEX_PATH
+        if not VectorDB.COLLECTION_NAME.fullmatch(name):
+            raise ValueError(f"Invalid collection name '{name}' (letters, digits, '-' and '_', max 64)")
+        return os.path.join(VectorDB.COLLECTIONS_DIR, name)
+
+    @staticmethod
+    def list_collections() -> List[str]:
+        names = [VectorDB.DEFAULT_COLLECTION]
+        if os.path.isdir(VectorDB.COLLECTIONS_DIR):
+            names += sorted(
+                name for name in os.listdir(VectorDB.COLLECTIONS_DIR)
+                # Staging/retired copies of a rebuild are not valid collection names
+                if VectorDB.COLLECTION_NAME.fullmatch(name)
+                and VectorDB._base_exists(os.path.join(VectorDB.COLLECTIONS_DIR, name))
+            )
+        return names
+
+    @staticmethod
+    def load_collections(names: List[str]) -> list:
+        """Loaded stores of the named collections; empty collections are left out."""
+        stores = [VectorDB.load_vector_store(VectorDB.collection_path(name)) for name in names]
+        return [store for store in stores if store is not None]
+
+    @staticmethod
+    def get_manifest(index_path: str = None):
+        """File/page hashes already ingested into the index on disk."""
+        return IngestManifest(index_path or VectorDB.INDEX_PATH)
+
+    @staticmethod
+    def create_vector_store(documents: Iterable[Document], on_batch: Callable[[int, int], None] = None, index_type: str = None):
         """
         Takes Document objects (with page numbers) and creates the DB.
+        Accepts any iterable: chunks are embedded and indexed one batch at a time,
+        so peak memory is bounded by INGEST_BATCH_SIZE rather than corpus size.
+        Returns None if the iterable yielded no documents.
         """
         embeddings = VectorDB.get_embedding_model()
+        vector_store = None
+        indexed = 0
+
+        # IVF-PQ is trained on a sample, so the head of the stream is buffered until it's large enough
+        pending_docs, pending_vectors = [], []
+        needs_training = IndexFactory.needs_training(index_type)
+
+        for batch_no, batch in enumerate(VectorDB._batched(documents, VectorDB.INGEST_BATCH_SIZE), start=1):
+            # Vectorized: one float32 matrix per batch, no per-vector Python lists
+            with Tracer.stage("embedding"):
+                vectors = embeddings.encode([doc.page_content for doc in batch])
+            Tracer.count("chunks_embedded", len(batch))
+
+            if vector_store is None and needs_training:
+                pending_docs.extend(batch)
+                pending_vectors.append(vectors)
+                if len(pending_docs) >= IndexFactory.TRAIN_SAMPLE:
+                    with Tracer.stage("index_build"):
+                        vector_store = VectorDB._flush_training_buffer(embeddings, index_type, pending_docs, pending_vectors)
+            else:
+                with Tracer.stage("index_build"):
+                    if vector_store is None:
+                        vector_store = VectorDB._empty_store(embeddings, IndexFactory.build(vectors.shape[1], index_type))
+
+                    # This preserves the page numbers we extracted in pdf_handler.py
+                    VectorDB._add_vectors(vector_store, batch, vectors)
+
+            indexed += len(batch)
+            if on_batch:
+                on_batch(batch_no, indexed)
+
+        # Stream ended before the sample filled up: train on what we have
+        if vector_store is None and pending_docs:
+            vector_store = VectorDB._flush_training_buffer(embeddings, index_type, pending_docs, pending_vectors)
         
-        # This preserves the page numbers we extracted in pdf_handler.py
-        vector_store = FAISS.from_documents(documents=documents, embedding=embeddings)
-        
         return vector_store
 
     @staticmethod
-    def save_vector_store(vector_store):
-        """Saves the FAISS index to disk."""
-        vector_store.save_local(VectorDB.INDEX_PATH)
+    def append_to_vector_store(vector_store, documents: Iterable[Document], on_batch: Callable[[int, int], None] = None, index_path: str = None):
+        """
+        Embeds only the new Document objects and writes them to disk as a delta segment.
+        Returns the new version of the store; the given one is left untouched, so queries
+        running on it are unaffected.
+        """
+        index_path = VectorDB._path_of(vector_store, index_path)
+        # Nothing to merge into yet: the new chunks become the base index
+        if vector_store is None or not VectorDB._base_exists(index_path):
+            return VectorDB.rebuild_vector_store(documents, on_batch=on_batch, index_path=index_path)
+
+        if not VectorDB.write_delta(documents, on_batch=on_batch, index_path=index_path):
+            return vector_store
+        # Never add to the loaded store: it is shared by every session of the process, and FAISS
+        # does not support adding while other threads search. The new version is a fresh load
+        return VectorDB.load_vector_store(index_path)
+
+    @staticmethod
+    def write_delta(documents: Iterable[Document], on_batch: Callable[[int, int], None] = None, index_path: str = None) -> int:
+        """
+        Embeds the documents into a new delta segment of the index on disk (its base when
+        there is none yet) and returns the number of chunks written. Nothing is loaded
+        unless compaction is due, so writers such as ingestion jobs stay cheap.
+        """
+        index_path = index_path or VectorDB.INDEX_PATH
+        # Held from the base check to compaction: the delta's name and positions are taken from disk
+        with IndexWriteLock.hold(index_path):
+            if not VectorDB._base_exists(index_path):
+                vector_store = VectorDB.rebuild_vector_store(documents, on_batch=on_batch, index_path=index_path)
+                return vector_store.index.ntotal if vector_store is not None else 0
+
+            # Checked before embedding: vectors from two models in one index would load without error
+            VectorDB._check_embedding(index_path, VectorDB.get_embedding_model())
+            # Deltas are always small exact segments; their vectors are re-added to the base on merge
+            delta_store = VectorDB.create_vector_store(documents, on_batch=on_batch, index_type="flat")
+            if delta_store is None:
+                return 0
+
+            with Tracer.stage("persist"):
+                VectorDB._save_delta(delta_store, index_path)
+
+            # Compaction: keep load time bounded by folding deltas into the base
+            if len(VectorDB._list_deltas(index_path)) > VectorDB.MAX_DELTAS:
+                VectorDB.compact(index_path)
+            return delta_store.index.ntotal
+
+    @staticmethod
+    def compact(index_path: str = None):
+        """
+        Folds the deltas into the base. Any delta keeps the index off the memory-mapped
+        path, so writers that leave many behind (ingestion jobs) compact when they finish.
+        """
+        index_path = index_path or VectorDB.INDEX_PATH
+        with IndexWriteLock.hold(index_path):
+            if not VectorDB._list_deltas(index_path):
+                return
+            with Tracer.stage("compaction"):
+                VectorDB.save_vector_store(VectorDB.load_vector_store(index_path), index_path)
+
+    @staticmethod
+    def rebuild_vector_store(documents: Iterable[Document], on_batch: Callable[[int, int], None] = None, index_path: str = None):
+        """
+        Replaces the knowledge base with the given documents and returns the saved,
+        disk-backed store (None if there were no documents).
+        """
+        vector_store = VectorDB.create_vector_store(documents, on_batch=on_batch)
+        if vector_store is None:
+            return None
+        with Tracer.stage("persist"):
+            VectorDB.save_vector_store(vector_store, index_path)
+        return VectorDB.load_vector_store(index_path)
+
+    @staticmethod
+    def delete_documents(vector_store, source: str) -> int:
+        """
+        Removes a document from the knowledge base without rewriting the index:
+        its chunks are dropped from the chunk store and its vectors become tombstones.
+        """
+        index_path = VectorDB._path_of(vector_store)
+        with IndexWriteLock.hold(index_path):
+            deleted = vector_store.docstore.delete_source(source)
+            VectorDB.get_manifest(index_path).forget_source(source)
+        return deleted
+
+    @staticmethod
+    def commit_manifest(manifest, index_path: str = None):
+        """
+        Commits an ingest's manifest once its chunks are saved. A file uploaded again under
+        its name with new contents replaces the earlier upload: chunks of pages it no longer
+        contains are deleted first, so the old revision is neither served nor cited.
+        """
+        index_path = index_path or VectorDB.collection_path()
+        with IndexWriteLock.hold(index_path):
+            revisions = manifest.revisions()
+            if revisions and VectorDB._base_exists(index_path):
+                chunk_store = ChunkStore(index_path)
+                for source, (file_hashes, page_hashes) in revisions.items():
+                    deleted = chunk_store.delete_revision(source, file_hashes, page_hashes)
+                    if deleted:
+                        logging.info(f"Replaced {deleted} chunks of the previous revision of {source}")
+                chunk_store.close()
+            manifest.commit()
+
+    @staticmethod
+    def checkpoint_pages(index_path: str, source: str, checkpoint: str) -> Set[int]:
+        """Pages of a source already on disk under a checkpoint tag (chunk metadata "checkpoint")."""
+        with IndexWriteLock.hold(index_path):
+            if not VectorDB._base_exists(index_path):
+                return set()
+            VectorDB._drop_orphan_segments(index_path)
+        chunk_store = ChunkStore(index_path)
+        pages = chunk_store.checkpoint_pages(source, checkpoint)
+        chunk_store.close()
+        return pages
+
+    @staticmethod
+    def delete_checkpoint(index_path: str, source: str, checkpoint: str) -> int:
+        """Rolls back the chunks written under a checkpoint tag; their vectors become tombstones."""
+        with IndexWriteLock.hold(index_path):
+            if not VectorDB._base_exists(index_path):
+                return 0
+            chunk_store = ChunkStore(index_path)
+            deleted = chunk_store.delete_checkpoint(source, checkpoint)
+            chunk_store.close()
+        return deleted
+
+    @staticmethod
+    def get_index_version(vector_store) -> str:
+        """Identifies the knowledge base contents (saves, appended deltas and deletions)."""
+        if isinstance(vector_store, (list, tuple)):
+            return "+".join(VectorDB.get_index_version(store) for store in vector_store) or "empty"
+        index_path = VectorDB._path_of(vector_store)
+        if vector_store is None or not VectorDB._base_exists(index_path):
+            return "empty"
+        # Read from the chunk store on every call: a delete made by another worker process changes it too
+        deletions = getattr(vector_store.docstore, "deletions", 0)
+        return f"{os.path.abspath(index_path)}|{VectorDB._index_version(index_path)}|deleted:{deletions}"
+
+    @staticmethod
+    def get_retriever(vector_store, k: int = 3, candidates: int = 20, rerank: bool = None, packing: bool = None):
+        """
+        Hybrid BM25 + vector retriever for saved stores; plain vector search otherwise.
+        With reranking, RERANK_CANDIDATES chunks are retrieved and cut back by the cross-encoder.
+        With context packing, k is only a floor: the token budget decides how much text is returned.
+        A list of stores (several collections) is searched as one, with the rankings fused.
+        """
+        rerank = VectorDB.RERANK if rerank is None else rerank
+        packing = VectorDB.CONTEXT_PACKING if packing is None else packing
+        keep = max(k, ContextBuilder.CANDIDATES) if packing else k
+        fetch_k = max(keep, VectorDB.RERANK_CANDIDATES) if rerank else keep
+
+        stores = vector_store if isinstance(vector_store, (list, tuple)) else [vector_store]
+        retrievers = [VectorDB._base_retriever(store, fetch_k, candidates) for store in stores]
+        if len(retrievers) == 1:
+            retriever = retrievers[0]
+        else:
+            retriever = MultiCollectionRetriever(retrievers=retrievers, k=fetch_k)
+
+        if rerank:
+            retriever = RerankingRetriever(base_retriever=retriever, reranker=VectorDB.get_reranker(), k=keep)
+        if packing:
+            retriever = PackedContextRetriever(base_retriever=retriever, builder=ContextBuilder())
+        return retriever
+
+    @staticmethod
+    def _base_retriever(vector_store, k: int, candidates: int):
+        if VectorDB.HYBRID_SEARCH and isinstance(vector_store, ChunkStoreFAISS):
+            return HybridRetriever(vector_store=vector_store, k=k, candidates=max(candidates, k))
+        return vector_store.as_retriever(search_kwargs={"k": k})
+
+    @staticmethod
+    def list_documents(vector_store) -> List[str]:
+        return vector_store.docstore.sources() if isinstance(vector_store.docstore, ChunkStore) else []
+
+    @staticmethod
+    def save_vector_store(vector_store, index_path: str = None):
+        """
+        Saves the full FAISS index to disk (replaces the base and any deltas), without the
+        vectors of deleted chunks. Chunks go to the SQLite chunk store; use load_vector_store() afterwards
+        to get the lightweight disk-backed (and shared) instance.
+        """
+        index_path = VectorDB._path_of(vector_store, index_path)
+        with IndexWriteLock.hold(index_path):
+            VectorDB._save(vector_store, index_path)
+
+    @staticmethod
+    def _save(vector_store, index_path: str):
+        os.makedirs(index_path, exist_ok=True)
+        chunk_path = os.path.join(index_path, ChunkStore.FILENAME)
+        index = vector_store.index
+        docstore = vector_store.docstore
+        positions = range(index.ntotal)
+        if isinstance(docstore, ChunkStore) and docstore.tombstones:
+            # Deleted vectors are dropped rather than kept as tombstones: live ones are renumbered
+            # 0..n-1 in order (the store itself is shared by readers, so it is not modified)
+            positions = list(vector_store.index_to_docstore_id)
+            index = IndexFactory.compacted(index, positions)
+
+        if isinstance(docstore, ChunkStore) and os.path.abspath(docstore.path) == os.path.abspath(chunk_path) \
+                and len(positions) == vector_store.index.ntotal:
+            # Compaction without deletions: chunks are already on disk at their final positions
+            docstore.rebase(index.ntotal)
+        else:
+            # Written aside and swapped in: stores opened on the old file keep reading it (ChunkStore pins it)
+            if os.path.exists(chunk_path + ".tmp"):
+                os.remove(chunk_path + ".tmp")
+            tmp_store = ChunkStore(index_path, filename=ChunkStore.FILENAME + ".tmp")
+            for start in range(0, len(positions), VectorDB.INGEST_BATCH_SIZE):
+                batch = positions[start:start + VectorDB.INGEST_BATCH_SIZE]
+                if isinstance(docstore, ChunkStore):
+                    batch_ids, batch_docs = docstore.entries(list(batch))
+                else:
+                    batch_ids = [vector_store.index_to_docstore_id.get(i) for i in batch]
+                    batch_docs = [docstore.search(i) if i is not None else None for i in batch_ids]
+                tmp_store.write_segment_rows(ChunkStore.BASE_SEGMENT, start, batch_ids, batch_docs)
+            tmp_store.register_segment(ChunkStore.BASE_SEGMENT, 0, index.ntotal)
+            tmp_store.close()
+            os.replace(tmp_store.path, chunk_path)
+
+        index_file = os.path.join(index_path, "index.faiss")
+        faiss.write_index(index, index_file + ".tmp")
+        os.replace(index_file + ".tmp", index_file)
+
+        with open(os.path.join(index_path, VectorDB.EMBEDDING_FILE), "w", encoding="utf-8") as f:
+            json.dump({"model": VectorDB._embedding_identity(vector_store.embedding_function), "dimension": index.d}, f)
+
+        shutil.rmtree(os.path.join(index_path, VectorDB.DELTA_DIR), ignore_errors=True)
+        # Legacy pickled docstore is superseded by the chunk store
+        if os.path.exists(os.path.join(index_path, "index.pkl")):
+            os.remove(os.path.join(index_path, "index.pkl"))
+
+    @staticmethod
+    def load_vector_store(index_path: str = None):
+        """
+        Loads the FAISS index from disk if it exists, replaying any deltas.
+        One instance per index version is shared by every session in the process;
+        the registry keeps the most recently used indexes resident.
+        """
+        index_path = index_path or VectorDB.INDEX_PATH
+        if not VectorDB._base_exists(index_path):
+            return None
+        # The version keys the entry: a new save/delta produces a new shared instance
+        return VectorDB.get_registry().get(index_path, VectorDB._index_version(index_path), VectorDB._load_from_disk)
+
+    @staticmethod
+    def _load_from_disk(index_path: str):
+        embeddings = VectorDB.get_embedding_model()
+        VectorDB._check_embedding(index_path, embeddings)
+
+        # Migration: v2.0 indexes pickled the docstore next to index.faiss
+        if not os.path.exists(os.path.join(index_path, ChunkStore.FILENAME)):
+            legacy_store = FAISS.load_local(index_path, embeddings, allow_dangerous_deserialization=True)
+            VectorDB.save_vector_store(legacy_store, index_path)
+
+        deltas = VectorDB._list_deltas(index_path)
+        # Optimization: a compacted base is memory-mapped read-only (near-zero load time, shared page cache)
+        memory_mapped = VectorDB.MMAP_INDEX and not deltas
+        flags = VectorDB._mmap_flags() if memory_mapped else 0
+        index = faiss.read_index(os.path.join(index_path, "index.faiss"), flags)
+
+        # Load time is independent of corpus size: no docstore or id map is read up front
+        chunk_store = ChunkStore(index_path)
+        vector_store = ChunkStoreFAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=chunk_store,
+            index_to_docstore_id=PositionIndex(chunk_store),
+        )
+        vector_store.memory_mapped = memory_mapped
+        vector_store.index_path = index_path
+        # nprobe / efSearch are query-time settings, so apply the current configuration
+        IndexFactory.tune(vector_store.index)
+
+        for delta_path in deltas:
+            VectorDB._merge_segment(vector_store, faiss.read_index(delta_path))
+
+        return vector_store
+
+    @staticmethod
+    def _embedding_identity(embeddings) -> str:
+        return getattr(embeddings, "model_name", None) or type(embeddings).__name__
+
+    @staticmethod
+    def _check_embedding(index_path: str, embeddings):
+        """Refuses to query or append to an index with vectors from a different embedding model or backend."""
+        try:
+            with open(os.path.join(index_path, VectorDB.EMBEDDING_FILE), "r", encoding="utf-8") as f:
+                recorded = json.load(f)["model"]
+        except FileNotFoundError:
+            # Saved before the model was recorded: only the reference model existed then
+            recorded = VectorDB.EMBEDDING_MODEL
+        current = VectorDB._embedding_identity(embeddings)
+        if recorded != current:
+            raise ValueError(
+                f"Index '{index_path}' was built with embeddings '{recorded}' but the active model is '{current}'. "
+                f"Rebuild it, or switch EMBED_BACKEND back."
+            )
 
     @staticmethod
-    def load_vector_store():
-        """Loads the FAISS index from disk if it exists."""
-        import os
-        if os.path.exists(VectorDB.INDEX_PATH) and os.path.exists(os.path.join(VectorDB.INDEX_PATH, "index.faiss")):
-            embeddings = VectorDB.get_embedding_model()
-            return FAISS.load_local(VectorDB.INDEX_PATH, embeddings, allow_dangerous_deserialization=True)
-        return None
\ No newline at end of file
+    def _flush_training_buffer(embeddings, index_type: str, documents: List[Document], vectors: List[np.ndarray]):
+        """Trains the index on the buffered sample, then adds the sample itself."""
+        matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+        vector_store = VectorDB._empty_store(embeddings, IndexFactory.build(matrix.shape[1], index_type, train_vectors=matrix))
+        VectorDB._add_vectors(vector_store, documents, matrix)
+        documents.clear()
+        vectors.clear()
+        return vector_store
+
+    @staticmethod
+    def _merge_segment(vector_store, segment_index: faiss.Index):
+        """
+        Folds a flat segment into a store being loaded by re-adding its stored vectors.
+        Unlike FAISS.merge_from this works for HNSW and IVF-PQ bases too (no re-embedding).
+        Positions resolve lazily through the chunk store, so no id map is updated.
+        """
+        if segment_index.ntotal == 0:
+            return
+        vectors = np.ascontiguousarray(segment_index.reconstruct_n(0, segment_index.ntotal), dtype=np.float32)
+        vector_store.index.add(vectors)
+
+    @staticmethod
+    def _empty_store(embeddings, index: faiss.Index):
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={},
+        )
+
+    @staticmethod
+    def _add_vectors(vector_store, documents: List[Document], vectors: np.ndarray):
+        """Adds pre-computed vectors and their documents to the store in one call."""
+        ids = [str(uuid.uuid4()) for _ in documents]
+        offset = vector_store.index.ntotal
+
+        vector_store.index.add(vectors)
+        vector_store.docstore.add(dict(zip(ids, documents)))
+        vector_store.index_to_docstore_id.update({offset + i: doc_id for i, doc_id in enumerate(ids)})
+
+    @staticmethod
+    def _batched(documents: Iterable[Document], size: int) -> Iterator[List[Document]]:
+        iterator = iter(documents)
+        while batch := list(itertools.islice(iterator, size)):
+            yield batch
+
+    @staticmethod
+    def _path_of(vector_store, index_path: str = None) -> str:
+        """Explicit path, else the directory the store was loaded from, else the default index."""
+        return index_path or getattr(vector_store, "index_path", None) or VectorDB.INDEX_PATH
+
+    @staticmethod
+    def _base_exists(index_path: str = None):
+        return os.path.exists(os.path.join(index_path or VectorDB.INDEX_PATH, "index.faiss"))
+
+    @staticmethod
+    def _index_version(index_path: str = None):
+        """Cheap fingerprint of the on-disk index: changes on every save or appended delta."""
+        index_path = index_path or VectorDB.INDEX_PATH
+        paths = [os.path.join(index_path, "index.faiss")] + VectorDB._list_deltas(index_path)
+        return "|".join(f"{os.path.basename(p)}:{os.stat(p).st_mtime_ns}" for p in paths)
+
+    @staticmethod
+    def _mmap_flags():
+        # IO_FLAG_MMAP_IFC maps flat vector storage (flat/HNSW); older faiss builds only know IO_FLAG_MMAP
+        return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+    @staticmethod
+    def _list_deltas(index_path: str = None):
+        """Returns delta segment index files in the order they were written."""
+        delta_root = os.path.join(index_path or VectorDB.INDEX_PATH, VectorDB.DELTA_DIR)
+        if not os.path.isdir(delta_root):
+            return []
+        return [os.path.join(delta_root, name) for name in sorted(os.listdir(delta_root)) if name.endswith(".faiss")]
+
+    @staticmethod
+    def _drop_orphan_segments(index_path: str):
+        """
+        A delta's chunks are committed before its index file is written; if the writer died
+        in between, they would shift the positions of the next delta. Such segments are dropped.
+        """
+        written = {os.path.splitext(os.path.basename(path))[0] for path in VectorDB._list_deltas(index_path)}
+        chunk_store = ChunkStore(index_path)
+        orphans = [name for name in chunk_store.segments() if name != ChunkStore.BASE_SEGMENT and name not in written]
+        if orphans:
+            logging.warning(f"Dropping unfinished delta segments {orphans} of {index_path}")
+            chunk_store.drop_segments(orphans)
+        chunk_store.close()
+
+    @staticmethod
+    def _save_delta(delta_store, index_path: str = None):
+        """
+        Persists a delta segment: its vectors as a small index file, its chunks in the chunk store.
+        Returns the global position of the segment's first vector. Call with IndexWriteLock held.
+        """
+        index_path = index_path or VectorDB.INDEX_PATH
+        VectorDB._drop_orphan_segments(index_path)
+        deltas = VectorDB._list_deltas(index_path)
+        next_id = int(os.path.splitext(os.path.basename(deltas[-1]))[0]) + 1 if deltas else 1
+        segment = f"{next_id:06d}"
+
+        ids = [delta_store.index_to_docstore_id[i] for i in range(delta_store.index.ntotal)]
+        chunk_store = ChunkStore(index_path)
+        # Delta chunks take the global positions they will have once replayed onto the base
+        offset = chunk_store.next_offset()
+        chunk_store.write_segment(segment, offset, ids, [delta_store.docstore.search(i) for i in ids])
+        chunk_store.close()
+
+        # The index file is written last: its presence is what makes the delta visible
+        delta_root = os.path.join(index_path, VectorDB.DELTA_DIR)
+        os.makedirs(delta_root, exist_ok=True)
+        faiss.write_index(delta_store.index, os.path.join(delta_root, f"{segment}.faiss"))
+        return offset
@@ -0,0 +1,78 @@
+"""
+Warm start: loads the heavy dependencies, the embedding model and the indexes into the
+process-wide caches before the first query needs them.
+
+    python -m src.warmup                  # pre-fetch model weights (e.g. at image build)
+    WARMUP_ON_START=1 streamlit run app.py  # warm the server process in the background
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+from typing import Dict, List
+import streamlit as st
+
+class Warmup:
+    ENABLED = os.getenv("WARMUP_ON_START", "0") == "1"
+    # Collections whose indexes are preloaded (comma separated)
+    COLLECTIONS = [name.strip() for name in os.getenv("WARMUP_COLLECTIONS", "default").split(",") if name.strip()]
+
+    @staticmethod
+    @st.cache_resource(show_spinner=False)
+    def start():
+        """Runs the warm-up once per process on a background thread, if enabled; never blocks a page."""
+        if not Warmup.ENABLED:
+            return None
+        thread = threading.Thread(target=Warmup._run_logged, name="rag-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    @staticmethod
+    def run(collections: List[str] = None, query_engine: bool = True) -> Dict[str, float]:
+        """Preloads everything the first query would otherwise pay for; returns seconds per step."""
+        timings = {}
+
+        started = time.perf_counter()
+        from src.vector_db import VectorDB
+        from src.rag_chain import RAGChain
+        timings["imports"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        # Building the engine loads the weights; one query embedding runs the first forward pass
+        VectorDB.get_embedding_model().embed_query("warm-up")
+        timings["embedding_model"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        stores = VectorDB.load_collections(collections or Warmup.COLLECTIONS)
+        timings["indexes"] = time.perf_counter() - started
+
+        if query_engine and stores:
+            started = time.perf_counter()
+            target = stores[0] if len(stores) == 1 else stores
+            RAGChain.get_query_engine(target, VectorDB.get_index_version(target), k=3)
+            timings["query_engine"] = time.perf_counter() - started
+
+        return timings
+
+    @staticmethod
+    def _run_logged():
+        try:
+            timings = Warmup.run()
+            logging.info("Warm-up done: " + ", ".join(f"{step} {seconds:.1f}s" for step, seconds in timings.items()))
+        except Exception as e:
+            # A failed warm-up only means the first query pays the cost itself
+            logging.warning(f"Warm-up failed: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collections", nargs="+", help="collections to preload (default: WARMUP_COLLECTIONS)")
+    parser.add_argument("--no-query-engine", action="store_true", help="skip building the LLM client")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    timings = Warmup.run(args.collections, query_engine=not args.no_query_engine)
+    logging.info("Warm-up done: " + ", ".join(f"{step} {seconds:.1f}s" for step, seconds in timings.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+from src.llm_backend import FakeBackend, LLMBackends
+from src.pdf_handler import PDFHandler
+from src.vector_db import VectorDB
+
+@pytest.fixture
+def embedding_model(tmp_path, monkeypatch):
+    """Deterministic embeddings behind a private cache, installed as the process-wide model."""
+    model = CachedEmbeddings(DeterministicFakeEmbedding(size=64), "fake", EmbeddingCache(str(tmp_path / "embeddings.sqlite")))
+    monkeypatch.setattr(VectorDB, "get_embedding_model", staticmethod(lambda: model))
+    return model
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch, embedding_model):
+    """An empty knowledge base with deterministic embeddings and character chunks (no model files)."""
+    monkeypatch.setattr(VectorDB, "INDEX_PATH", str(tmp_path / "faiss_index"))
+    monkeypatch.setattr(PDFHandler, "CHUNK_UNIT", "chars")
+    monkeypatch.setattr(PDFHandler, "EXTRACTION_WORKERS", 1)
+    return VectorDB.INDEX_PATH
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Answers come from the offline fake backend, with no artificial latency."""
+    monkeypatch.setattr(LLMBackends, "DEFAULT", "fake")
+    monkeypatch.setattr(FakeBackend, "FIRST_TOKEN_LATENCY", 0.0)
@@ -0,0 +1,29 @@
+from langchain_core.documents import Document
+from src.context_builder import ContextBuilder
+
+TEXT = " ".join(f"clause{i} requires torque {i * 3} Nm" for i in range(40))
+
+def chunk(text: str, page: int = 1, source: str = "a.pdf") -> Document:
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+def test_join_stitches_the_splitter_overlap_in_either_order():
+    head, tail = TEXT[:400], TEXT[340:]
+    assert ContextBuilder._join(head, tail) == TEXT
+    assert ContextBuilder._join(tail, head) == TEXT
+    # Contained chunks collapse into the longer one
+    assert ContextBuilder._join(TEXT, TEXT[100:200]) == TEXT
+
+def test_join_rejects_short_or_missing_overlaps():
+    assert ContextBuilder._join(TEXT[:400], TEXT[390:]) is None  # 10 shared characters: coincidence
+    assert ContextBuilder._join(TEXT[:300], TEXT[500:]) is None
+
+def test_merge_keeps_the_rank_of_the_best_part_and_stays_on_its_page():
+    ranked = [chunk(TEXT[340:]), chunk("unrelated text of page two", page=2), chunk(TEXT[:400]), chunk(TEXT[:400], page=3)]
+    merged = ContextBuilder._merge_overlapping(ranked)
+    assert [doc.metadata["page"] for doc in merged] == [1, 2, 3]
+    assert merged[0].page_content == TEXT and merged[0].metadata["merged_chunks"] == 2
+
+def test_build_drops_near_duplicates_from_other_pages():
+    ranked = [chunk(TEXT[:400]), chunk(TEXT[:400] + " again", page=5), chunk("a different topic entirely", page=6)]
+    packed = ContextBuilder(token_budget=1000).build(ranked)
+    assert [doc.metadata["page"] for doc in packed] == [1, 6]
@@ -0,0 +1,23 @@
+from src.conversation_store import ConversationStore
+
+def test_recent_returns_the_newest_window_in_order(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite"))
+    for i in range(5):
+        store.append("c1", {"role": "user", "content": f"question {i}"})
+        store.append("c1", {"role": "assistant", "content": f"answer {i}", "sources": [f"a.pdf p{i}"]})
+    store.append("c2", {"role": "user", "content": "another conversation"})
+
+    messages, has_older = store.recent("c1", 4)
+    assert [m["content"] for m in messages] == ["question 3", "answer 3", "question 4", "answer 4"]
+    assert messages[-1]["sources"] == ["a.pdf p4"]
+    assert has_older
+
+    messages, has_older = store.recent("c1", 10)
+    assert len(messages) == 10 and not has_older
+    assert store.recent("c2", 4) == ([{"role": "user", "content": "another conversation"}], False)
+
+def test_cleared_conversation_is_empty(tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.sqlite"))
+    store.append("c1", {"role": "user", "content": "question"})
+    store.clear("c1")
+    assert store.recent("c1", 4) == ([], False)
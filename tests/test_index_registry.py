@@ -0,0 +1,63 @@
+import gc
+import threading
+import weakref
+from collections import OrderedDict
+from types import SimpleNamespace
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+from src.index_registry import IndexRegistry
+from src.rag_chain import RAGChain
+from src.vector_db import VectorDB
+
+def flat_store(count: int, memory_mapped: bool = False):
+    index = faiss.IndexFlatL2(16)
+    index.add(np.zeros((count, 16), dtype=np.float32))
+    return SimpleNamespace(index=index, memory_mapped=memory_mapped)
+
+def test_memory_mapped_indexes_count_towards_the_ceiling():
+    assert IndexRegistry.estimate_bytes(flat_store(100, memory_mapped=True)) == 100 * 16 * 4
+
+def test_resident_lookups_do_not_wait_for_a_slow_load():
+    registry = IndexRegistry(max_resident=4)
+    resident = registry.get("a", "v1", lambda path: flat_store(1))
+
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_loader(path):
+        loading.set()
+        release.wait(5)
+        return flat_store(1)
+
+    loader_thread = threading.Thread(target=registry.get, args=("b", "v1", slow_loader))
+    loader_thread.start()
+    found = []
+    try:
+        assert loading.wait(5)
+        lookup = threading.Thread(target=lambda: found.append(registry.get("a", "v1", lambda path: flat_store(1))))
+        lookup.start()
+        lookup.join(1)
+        # Answered while "b" is still loading
+        assert found == [resident]
+    finally:
+        release.set()
+        loader_thread.join()
+    assert registry.loads == 2
+
+def test_evicted_stores_are_not_kept_alive_by_query_engines(index_path, fake_llm, tmp_path, monkeypatch):
+    registry = IndexRegistry(max_resident=1)
+    monkeypatch.setattr(VectorDB, "get_registry", staticmethod(lambda: registry))
+    monkeypatch.setattr(RAGChain, "_engines", OrderedDict())
+
+    docs = [Document(page_content=f"clause {i}", metadata={"source": "a.pdf", "page": 1}) for i in range(10)]
+    first = VectorDB.rebuild_vector_store(docs, index_path=str(tmp_path / "first"))
+    RAGChain.get_query_engine(first, VectorDB.get_index_version(first), k=3)
+    first_ref = weakref.ref(first)
+
+    second = VectorDB.rebuild_vector_store(docs, index_path=str(tmp_path / "second"))
+    RAGChain.get_query_engine(second, VectorDB.get_index_version(second), k=3)
+
+    assert [engine.pipeline.stores for engine in RAGChain._engines.values()] == [[second]]
+    del first
+    gc.collect()
+    assert first_ref() is None
@@ -0,0 +1,117 @@
+import gc
+import io
+import os
+import pytest
+import threading
+import time
+from benchmarks.synthetic_pdf import make_pdf
+from src.chunk_store import ChunkStore
+from src.ingest_jobs import IngestJobs, run_job
+from src.vector_db import VectorDB
+
+class WorkerDied(BaseException):
+    """Stands in for the worker process being killed (run_job only handles Exception)."""
+
+def upload(name: str, pages: int, seed: int):
+    buf = io.BytesIO(make_pdf(num_pages=pages, seed=seed))
+    buf.name = name
+    return buf
+
+def submit(tmp_path, monkeypatch, uploads, mode="append"):
+    """Creates the job on disk without starting a worker; the test runs it in-process."""
+    monkeypatch.setattr(IngestJobs, "_start", lambda self, job_dir: None)
+    jobs = IngestJobs(jobs_dir=str(tmp_path / "jobs"), workers=1)
+    job_id = jobs.submit(uploads, mode=mode)
+    return jobs, str(tmp_path / "jobs" / job_id)
+
+def chunk_pages(index_path: str, source: str):
+    chunk_store = ChunkStore(index_path)
+    rows = chunk_store._reader().execute(
+        "SELECT json_extract(metadata, '$.page') FROM chunks WHERE source = ? ORDER BY position", (source,)
+    ).fetchall()
+    chunk_store.close()
+    return [row[0] for row in rows]
+
+def test_restart_after_a_delta_write_resumes_mid_file(index_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(IngestJobs, "CHECKPOINT_CHUNKS", 4)
+    jobs, job_dir = submit(tmp_path, monkeypatch, [upload("big.pdf", pages=12, seed=1)])
+
+    write_delta, segments = VectorDB.write_delta, []
+
+    def dies_after_second_segment(documents, **kwargs):
+        written = write_delta(documents, **kwargs)
+        segments.append(written)
+        if len(segments) == 2:
+            raise WorkerDied()  # Delta on disk, nothing else recorded yet
+        return written
+
+    monkeypatch.setattr(VectorDB, "write_delta", staticmethod(dies_after_second_segment))
+    with pytest.raises(WorkerDied):
+        run_job(job_dir)
+    gc.collect()  # Releases the dead run's job lock
+    assert jobs.status(os.path.basename(job_dir))["status"] == "running"
+
+    def records(documents, **kwargs):
+        written = write_delta(documents, **kwargs)
+        segments.append(written)
+        return written
+
+    monkeypatch.setattr(VectorDB, "write_delta", staticmethod(records))
+    run_job(job_dir)
+
+    job = jobs.status(os.path.basename(job_dir))
+    assert job["status"] == "completed"
+    pages = chunk_pages(index_path, "big.pdf")
+    # Every page once: nothing written before the restart was appended again or re-embedded
+    assert sorted(set(pages)) == list(range(1, 13))
+    store = VectorDB.load_vector_store(index_path)
+    assert len(pages) == store.index.ntotal
+    # The job's segments were folded into the base, so the index is memory-mapped again
+    assert VectorDB._list_deltas(index_path) == [] and store.memory_mapped
+    # Both runs together embedded each chunk exactly once
+    assert sum(segments) == len(pages) == job["progress"]["chunks"]
+
+def test_cancelled_append_keeps_whole_files_only(index_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(IngestJobs, "CHECKPOINT_CHUNKS", 4)
+    jobs, job_dir = submit(tmp_path, monkeypatch, [upload("a.pdf", pages=3, seed=1), upload("b.pdf", pages=12, seed=2)])
+
+    write_delta = VectorDB.write_delta
+
+    def cancels_during_b(documents, **kwargs):
+        written = write_delta(documents, **kwargs)
+        if documents[0].metadata["source"] == "b.pdf":
+            jobs.cancel(os.path.basename(job_dir))
+        return written
+
+    monkeypatch.setattr(VectorDB, "write_delta", staticmethod(cancels_during_b))
+    run_job(job_dir)
+
+    job = jobs.status(os.path.basename(job_dir))
+    assert job["status"] == "cancelled" and job["progress"]["files_done"] == 1
+    store = VectorDB.load_vector_store(index_path)
+    assert VectorDB.list_documents(store) == ["a.pdf"]
+    # b.pdf's segments were rolled back, and its manifest entries never committed
+    assert VectorDB.get_manifest(index_path).pages.keys() == {"a.pdf"}
+
+def test_jobs_of_one_collection_run_one_after_another(index_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(IngestJobs, "CHECKPOINT_CHUNKS", 4)
+    jobs, first = submit(tmp_path, monkeypatch, [upload("a1.pdf", pages=3, seed=1), upload("a2.pdf", pages=3, seed=2)])
+    second = os.path.join(jobs.jobs_dir, jobs.submit([upload("b1.pdf", pages=3, seed=3), upload("b2.pdf", pages=3, seed=4)]))
+
+    write_delta, sources = VectorDB.write_delta, []
+
+    def slow(documents, **kwargs):
+        sources.append(documents[0].metadata["source"][0])  # Job: "a" or "b"
+        time.sleep(0.02)  # Leaves the other job time to interleave, were it not waiting
+        return write_delta(documents, **kwargs)
+
+    monkeypatch.setattr(VectorDB, "write_delta", staticmethod(slow))
+    workers = [threading.Thread(target=run_job, args=(job_dir,)) for job_dir in (first, second)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(sources) > 2
+    # Each job wrote all its segments without the other's in between
+    assert sum(1 for prev, cur in zip(sources, sources[1:]) if prev != cur) == 1
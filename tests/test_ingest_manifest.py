@@ -0,0 +1,60 @@
+import json
+import os
+import sqlite3
+from benchmarks.synthetic_pdf import make_pdf
+from src.chunk_store import ChunkStore
+from src.rag_service import RAGService
+from src.vector_db import VectorDB
+
+def pages_of(source):
+    with sqlite3.connect(os.path.join(VectorDB.INDEX_PATH, ChunkStore.FILENAME)) as conn:
+        rows = conn.execute("SELECT metadata FROM chunks WHERE source = ?", (source,)).fetchall()
+    return sorted({json.loads(metadata)["page"] for (metadata,) in rows})
+
+def test_shared_pages_survive_deleting_the_other_file(index_path):
+    service = RAGService()
+    # Same seed: v2 repeats v1's five pages and adds a sixth
+    service.ingest([RAGService.as_upload("spec_v1.pdf", make_pdf(5))])
+    report = service.ingest([RAGService.as_upload("spec_v2.pdf", make_pdf(6))])
+    assert report["skipped_pages"] == 0
+
+    store = RAGService.vector_store()
+    assert pages_of("spec_v2.pdf") == [1, 2, 3, 4, 5, 6]
+
+    VectorDB.delete_documents(store, "spec_v1.pdf")
+    store = RAGService.vector_store()
+    assert VectorDB.list_documents(store) == ["spec_v2.pdf"]
+    assert pages_of("spec_v2.pdf") == [1, 2, 3, 4, 5, 6]
+
+def test_unchanged_pages_of_the_same_file_are_skipped(index_path):
+    service = RAGService()
+    service.ingest([RAGService.as_upload("spec.pdf", make_pdf(5))])
+    report = service.ingest([RAGService.as_upload("spec.pdf", make_pdf(6))])
+    assert report["skipped_pages"] == 5
+    assert pages_of("spec.pdf") == [1, 2, 3, 4, 5, 6]
+
+    assert service.ingest([RAGService.as_upload("spec.pdf", make_pdf(6))])["skipped_files"] == 1
+
+def test_revision_drops_pages_it_no_longer_contains(index_path):
+    service = RAGService()
+    service.ingest([RAGService.as_upload("spec.pdf", make_pdf(6))])
+    report = service.ingest([RAGService.as_upload("spec.pdf", make_pdf(4))])
+    assert report["skipped_pages"] == 4
+    assert pages_of("spec.pdf") == [1, 2, 3, 4]
+
+def test_revision_replaces_changed_pages(index_path):
+    service = RAGService()
+    service.ingest([RAGService.as_upload("spec.pdf", make_pdf(3, seed=0))])
+    service.ingest([RAGService.as_upload("spec.pdf", make_pdf(3, seed=1))])
+    with sqlite3.connect(os.path.join(VectorDB.INDEX_PATH, ChunkStore.FILENAME)) as conn:
+        (stale,) = conn.execute("SELECT COUNT(*) FROM chunks WHERE content LIKE '%PN-000-%'").fetchone()
+    assert stale == 0
+    assert pages_of("spec.pdf") == [1, 2, 3]
+
+    # The first revision is gone from the manifest too, so uploading it again indexes it again
+    assert service.ingest([RAGService.as_upload("spec.pdf", make_pdf(3, seed=0))])["skipped_files"] == 0
+
+def test_unreadable_upload_is_not_recorded(index_path):
+    service = RAGService()
+    service.ingest([RAGService.as_upload("spec.pdf", make_pdf(2)), RAGService.as_upload("broken.pdf", b"not a pdf")])
+    assert VectorDB.get_manifest(index_path).files.keys() == {"spec.pdf"}
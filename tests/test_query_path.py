@@ -0,0 +1,40 @@
+import asyncio
+import numpy as np
+import pytest
+from langchain.docstore.document import Document
+from src.answer_cache import SemanticAnswerCache
+from src.rag_service import RAGService
+from src.vector_db import VectorDB
+
+@pytest.fixture
+def knowledge_base(index_path, fake_llm):
+    """Twenty small chunks answered by the offline fake LLM."""
+    VectorDB.rebuild_vector_store([Document(page_content=f"clause {i}", metadata={"source": "a.pdf", "page": 1}) for i in range(20)])
+    return index_path
+
+def test_uncached_question_is_embedded_once(knowledge_base, embedding_model, monkeypatch):
+    calls = []
+    model_class = type(embedding_model.embeddings)
+    embed_query = model_class.embed_query
+    monkeypatch.setattr(model_class, "embed_query", lambda self, text: calls.append(text) or embed_query(self, text))
+
+    response = asyncio.run(RAGService().aquery("What does clause 7 say?"))
+    assert response["cached"] is False
+    # Answer cache lookup and dense retrieval share one forward pass
+    assert calls == ["What does clause 7 say?"]
+
+def test_pipeline_construction_is_reported_by_the_first_query_only(knowledge_base):
+    service = RAGService()
+    first = asyncio.run(service.aquery("What does clause 3 say?"))
+    second = asyncio.run(service.aquery("What does clause 9 say?"))
+    assert "pipeline_construction" in first["trace"]["stages_ms"]
+    assert first["timings"]["pipeline_construction"] > 0
+    assert "pipeline_construction" not in second["trace"]["stages_ms"]
+    assert second["timings"]["pipeline_construction"] == 0
+
+def test_cached_answer_needs_the_same_identifiers():
+    cache = SemanticAnswerCache()
+    vector = np.ones(8)  # Same embedding: only the part numbers tell the questions apart
+    cache.store("What is the tolerance for part PN-001-00003?", vector, "v1", "0.1 mm", [], 1.0)
+    assert cache.lookup("What is the tolerance for part PN-001-00004?", vector, "v1") is None
+    assert cache.lookup("what is the tolerance for part pn-001-00003", vector, "v1").answer == "0.1 mm"
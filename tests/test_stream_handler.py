@@ -0,0 +1,45 @@
+from src.stream_handler import StreamHandler
+
+class Element:
+    def __init__(self):
+        self.text = None
+
+    def markdown(self, text: str):
+        self.text = text
+
+class Container:
+    """Stands in for a Streamlit container: records each element's last render."""
+    def __init__(self):
+        self.elements = []
+
+    def empty(self) -> Element:
+        self.elements.append(Element())
+        return self.elements[-1]
+
+ANSWER = "Intro paragraph.\n\n```python\nx = 1\n\ny = 2\n```\n\nClosing paragraph."
+
+def stream(answer: str, frame_interval_ms: float = 0, frame_chars: int = 1):
+    container = Container()
+    handler = StreamHandler(container, frame_interval_ms=frame_interval_ms, frame_chars=frame_chars)
+    for char in answer:
+        handler.on_llm_new_token(char)
+    handler.finish()
+    return handler, [element.text for element in container.elements]
+
+def test_paragraph_end_skips_blank_lines_inside_code_fences():
+    assert StreamHandler._paragraph_end("a\n\n```\nx\n\ny") == 1
+    assert StreamHandler._paragraph_end("a\n\n```\nx\n\ny\n```\n\nb") == len("a\n\n```\nx\n\ny\n```")
+    assert StreamHandler._paragraph_end("```\nx\n\ny") == -1
+
+def test_finished_paragraphs_are_frozen_once_and_fences_stay_whole():
+    handler, rendered = stream(ANSWER)
+    assert rendered == ["Intro paragraph.", "```python\nx = 1\n\ny = 2\n```", "Closing paragraph."]
+    assert handler.text == ANSWER
+    assert not handler.text.endswith(StreamHandler.CURSOR)
+
+def test_tokens_are_coalesced_into_frames():
+    handler, rendered = stream(ANSWER, frame_interval_ms=60_000, frame_chars=10)
+    assert handler.tokens == len(ANSWER)
+    # One render per 10 pending characters (plus the final flush), not one per token
+    assert handler.renders <= len(ANSWER) // 10 + len(rendered) + 1
+    assert rendered == ["Intro paragraph.", "```python\nx = 1\n\ny = 2\n```", "Closing paragraph."]
@@ -0,0 +1,148 @@
+import threading
+import pytest
+from langchain.docstore.document import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from src.chunk_store import ChunkStore
+from src.embedding_cache import CachedEmbeddings, EmbeddingCache
+from src.vector_db import VectorDB
+
+def chunks(source: str, count: int):
+    return [Document(page_content=f"{source} chunk {i} clause {i * 7}", metadata={"source": source, "page": i + 1})
+            for i in range(count)]
+
+def top_hit(store, text: str) -> Document:
+    return store.similarity_search(text, k=1)[0]
+
+def test_append_writes_a_delta_and_reloads(index_path):
+    store = VectorDB.rebuild_vector_store(chunks("a.pdf", 10))
+    store = VectorDB.append_to_vector_store(store, chunks("b.pdf", 5))
+
+    assert store.index.ntotal == 15
+    assert len(VectorDB._list_deltas(index_path)) == 1
+    assert VectorDB.list_documents(store) == ["a.pdf", "b.pdf"]
+
+    reloaded = VectorDB._load_from_disk(index_path)
+    assert reloaded.index.ntotal == 15
+    for doc in chunks("a.pdf", 10) + chunks("b.pdf", 5):
+        assert top_hit(reloaded, doc.page_content).page_content == doc.page_content
+
+def test_append_leaves_the_shared_store_untouched(index_path):
+    # Loaded with a delta, so the store is not memory-mapped (and would accept adds)
+    store = VectorDB.append_to_vector_store(VectorDB.rebuild_vector_store(chunks("a.pdf", 10)), chunks("b.pdf", 5))
+    assert VectorDB.load_vector_store(index_path) is store
+
+    updated = VectorDB.append_to_vector_store(store, chunks("c.pdf", 5))
+    assert updated is not store
+    assert store.index.ntotal == 15
+    assert updated.index.ntotal == 20
+
+def test_deleted_chunks_are_never_returned(index_path):
+    store = VectorDB.append_to_vector_store(VectorDB.rebuild_vector_store(chunks("a.pdf", 10)), chunks("b.pdf", 5))
+
+    assert VectorDB.delete_documents(store, "a.pdf") == 10
+    assert store.docstore.tombstones == 10
+    assert VectorDB.list_documents(store) == ["b.pdf"]
+    # Over-fetching past the tombstones still fills k
+    hits = store.similarity_search(chunks("a.pdf", 1)[0].page_content, k=5)
+    assert len(hits) == 5 and all(doc.metadata["source"] == "b.pdf" for doc in hits)
+
+def test_tombstones_do_not_widen_the_chunk_fetch(index_path, monkeypatch):
+    store = VectorDB.rebuild_vector_store(chunks("a.pdf", 200) + chunks("b.pdf", 20))
+    VectorDB.delete_documents(store, "a.pdf")
+
+    fetched = []
+    get_by_positions = ChunkStore.get_by_positions
+    monkeypatch.setattr(ChunkStore, "get_by_positions", lambda self, positions: fetched.append(len(positions)) or get_by_positions(self, positions))
+
+    hits = store.similarity_search(chunks("a.pdf", 1)[0].page_content, k=5)
+    assert len(hits) == 5 and all(doc.metadata["source"] == "b.pdf" for doc in hits)
+    docs = VectorDB.get_retriever(store, k=5, rerank=False, packing=False).invoke("b.pdf chunk 3")
+    assert len(docs) == 5
+    # Only the rows returned are read, not k + 200 tombstoned positions
+    assert fetched and max(fetched) <= 5
+
+def test_delete_in_another_process_changes_the_version(index_path):
+    store = VectorDB.rebuild_vector_store(chunks("a.pdf", 10) + chunks("b.pdf", 5))
+    version = VectorDB.get_index_version(store)
+
+    # A second connection stands in for another worker process sharing the index directory
+    other = ChunkStore(index_path)
+    other.delete_source("a.pdf")
+    other.close()
+
+    assert VectorDB.get_index_version(store) != version
+    assert store.docstore.tombstones == 10
+
+def test_compaction_drops_deleted_vectors(index_path, monkeypatch):
+    monkeypatch.setattr(VectorDB, "MAX_DELTAS", 1)
+    store = VectorDB.rebuild_vector_store(chunks("a.pdf", 10))
+    store = VectorDB.append_to_vector_store(store, chunks("b.pdf", 5))
+    VectorDB.delete_documents(store, "b.pdf")
+    store = VectorDB.append_to_vector_store(store, chunks("c.pdf", 5))
+
+    assert VectorDB._list_deltas(index_path) == []
+    assert store.index.ntotal == 15
+    assert store.docstore.tombstones == 0
+    assert VectorDB.list_documents(store) == ["a.pdf", "c.pdf"]
+
+    reloaded = VectorDB._load_from_disk(index_path)
+    for doc in chunks("a.pdf", 10) + chunks("c.pdf", 5):
+        assert top_hit(reloaded, doc.page_content).page_content == doc.page_content
+
+def test_store_keeps_reading_its_file_after_a_compaction(index_path):
+    old = VectorDB.rebuild_vector_store(chunks("a.pdf", 10))
+    VectorDB.delete_documents(old, "a.pdf")
+    VectorDB.save_vector_store(VectorDB.rebuild_vector_store(chunks("b.pdf", 10)), index_path)
+    assert VectorDB._load_from_disk(index_path).docstore.get_by_positions([0])[0].metadata["source"] == "b.pdf"
+
+    # A thread that opens its reader only now still gets the old store's rows for its positions
+    seen = []
+    reader = threading.Thread(target=lambda: seen.append(old.docstore.live_positions(list(range(10)))))
+    reader.start()
+    reader.join()
+    assert seen == [[]]
+
+def test_unfinished_delta_is_dropped_before_the_next_one(index_path):
+    store = VectorDB.rebuild_vector_store(chunks("a.pdf", 10))
+    # A writer died after committing a delta's chunks but before writing its index file
+    chunk_store = ChunkStore(index_path)
+    orphan = chunks("b.pdf", 5)
+    chunk_store.write_segment("000001", 10, [f"orphan-{i}" for i in range(5)], orphan)
+    chunk_store.close()
+
+    store = VectorDB.append_to_vector_store(store, chunks("c.pdf", 5))
+    assert store.index.ntotal == 15 and store.docstore.tombstones == 0
+    assert VectorDB.list_documents(store) == ["a.pdf", "c.pdf"]
+    for doc in chunks("c.pdf", 5):
+        assert top_hit(store, doc.page_content).page_content == doc.page_content
+
+def test_append_with_another_embedding_model_is_refused(index_path, tmp_path, monkeypatch):
+    VectorDB.rebuild_vector_store(chunks("a.pdf", 5))
+    other = CachedEmbeddings(DeterministicFakeEmbedding(size=64), "other", EmbeddingCache(str(tmp_path / "other.sqlite")))
+    monkeypatch.setattr(VectorDB, "get_embedding_model", staticmethod(lambda: other))
+
+    with pytest.raises(ValueError, match="built with embeddings 'fake'"):
+        VectorDB.write_delta(chunks("b.pdf", 5), index_path=index_path)
+    assert VectorDB._list_deltas(index_path) == []
+
+def test_concurrent_writers_take_distinct_positions(index_path):
+    VectorDB.rebuild_vector_store(chunks("a.pdf", 5))
+
+    def writer(name: str):
+        for i in range(5):
+            VectorDB.write_delta(chunks(f"{name}{i}.pdf", 3), index_path=index_path)
+
+    # Separate threads stand in for API workers and ingestion jobs sharing the index
+    threads = [threading.Thread(target=writer, args=(name,)) for name in "xy"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    store = VectorDB._load_from_disk(index_path)
+    assert store.index.ntotal == 35 and store.docstore.tombstones == 0
+    assert len(VectorDB.list_documents(store)) == 11
+    for name in "xy":
+        for i in range(5):
+            for doc in chunks(f"{name}{i}.pdf", 3):
+                assert top_hit(store, doc.page_content).page_content == doc.page_content